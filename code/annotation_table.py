@@ -0,0 +1,474 @@
+from itertools import islice
+import numpy as np
+
+# Keys of a COCO annotation stored as columns, in the order of the COCO format
+ANNOTATION_FIELDS = ['id', 'image_id', 'category_id', 'bbox', 'area', 'iscrowd', 'segmentation']
+# Number of annotations turned back into dictionaries at a time
+DICT_BATCH_SIZE = 10000
+# Attributes of the columns of a table and the annotation keys they hold
+TABLE_COLUMNS = [
+    ('ids', 'id'), ('image_ids', 'image_id'), ('category_ids', 'category_id'), ('bboxes', 'bbox'),
+    ('areas', 'area'), ('iscrowd', 'iscrowd'), ('coords', 'segmentation')
+]
+
+class AnnotationTable:
+    """
+    Columnar store of COCO annotations
+
+    Every annotation field is a NumPy column instead of a Python dictionary
+    per annotation. Polygon coordinates of all annotations share one flat
+    buffer: coord_offsets gives the range of each polygon in the buffer, and
+    polygon_offsets gives the range of polygons of each annotation, so an
+    annotation with many polygons costs no more than its coordinates.
+
+    Numeric columns keep integers as integers, a column is only stored as
+    floating point if any of its values is a float, and then integers holds
+    which of its values were integers so they are written back as such. Keys
+    outside of the columns, such as RLE segmentations or custom attributes,
+    are kept per annotation in extras, and annotations whose keys differ from
+    fields, such as annotations without a bbox, keep their own keys in
+    key_orders.
+
+    Parameters
+    ----------
+    ids : array_like
+        Annotation IDs
+    image_ids : array_like
+        Image ID of each annotation
+    category_ids : array_like
+        Category ID of each annotation
+    bboxes : array_like
+        Bounding box of each annotation as x, y, width, height
+    areas : array_like
+        Area of each annotation
+    iscrowd : array_like
+        Crowd flag of each annotation
+    coords : array_like
+        Flat x, y coordinates of every polygon
+    coord_offsets : array_like
+        Start of each polygon in coords, followed by the end of the last one
+    polygon_offsets : array_like
+        Start of each annotation in the polygons, followed by the end of the last one
+    fields : list, optional
+        Key order of the annotation dictionaries, ANNOTATION_FIELDS by default
+    extras : list, optional
+        Dictionary of additional keys of each annotation, or None if there are none
+    key_orders : list, optional
+        Keys of each annotation, None for annotations with the keys of fields,
+        or None if every annotation has them
+    integers : dict, optional
+        Mask of the integer values of every floating point column with some,
+        by annotation key
+
+    """
+    def __init__(self, ids, image_ids, category_ids, bboxes, areas, iscrowd,
+                 coords, coord_offsets, polygon_offsets, fields=None, extras=None,
+                 key_orders=None, integers=None):
+        self.ids = as_column(ids, 'id')
+        self.image_ids = as_column(image_ids, 'image_id')
+        self.category_ids = as_column(category_ids, 'category_id')
+        self.bboxes = as_column(bboxes, 'bbox').reshape(-1, 4)
+        self.areas = as_column(areas, 'area')
+        self.iscrowd = as_column(iscrowd, 'iscrowd')
+        self.coords = as_column(coords, 'segmentation')
+        self.coord_offsets = np.asarray(coord_offsets, dtype=np.int64)
+        self.polygon_offsets = np.asarray(polygon_offsets, dtype=np.int64)
+        self.fields = list(fields or ANNOTATION_FIELDS)
+        self.extras = extras
+        self.key_orders = key_orders
+        self.integers = {name: mask for name, mask in (integers or {}).items() if mask is not None}
+        if 'bbox' in self.integers:
+            self.integers['bbox'] = self.integers['bbox'].reshape(-1, 4)
+
+        n = len(self.ids)
+        if any(len(column) != n for column in [self.image_ids, self.category_ids, self.bboxes, self.areas, self.iscrowd]):
+            raise ValueError("Annotation columns must have one value per annotation")
+        if len(self.polygon_offsets) != n + 1 or self.polygon_offsets[-1] + 1 != len(self.coord_offsets):
+            raise ValueError("Annotation polygon offsets do not match the polygons")
+        if self.coord_offsets[-1] != len(self.coords):
+            raise ValueError("Annotation coordinate offsets do not match the coordinates")
+        if extras is not None and len(extras) != n:
+            raise ValueError("Annotation extras must have one entry per annotation")
+        if key_orders is not None and len(key_orders) != n:
+            raise ValueError("Annotation key orders must have one entry per annotation")
+
+    @classmethod
+    def from_dicts(cls, annotations):
+        """
+        Build a table from COCO annotation dictionaries
+
+        Parameters
+        ----------
+        annotations : iterable
+            COCO annotation dictionaries
+
+        Returns
+        -------
+        AnnotationTable
+            Table of the annotations
+
+        """
+        fields = None
+        ids = []
+        image_ids = []
+        category_ids = []
+        bboxes = []
+        areas = []
+        iscrowd = []
+        coords = []
+        coord_offsets = [0]
+        polygon_offsets = [0]
+        extras = []
+        has_extras = False
+        key_orders = []
+        orders = {}
+
+        for ann in annotations:
+            # Annotations with other keys than the first one keep their own, shared between annotations
+            keys = tuple(ann)
+            if fields is None:
+                fields = keys
+            key_orders.append(None if keys == fields else orders.setdefault(keys, keys))
+
+            ids.append(ann['id'])
+            image_ids.append(ann['image_id'])
+            category_ids.append(ann['category_id'])
+            bboxes.extend(ann.get('bbox') or [0, 0, 0, 0])
+            areas.append(ann.get('area', 0))
+            iscrowd.append(ann.get('iscrowd', 0))
+
+            # Polygons go to the shared buffer, other segmentations such as RLE to extras
+            extra = {key: value for key, value in ann.items() if key not in ANNOTATION_FIELDS}
+            segmentation = ann.get('segmentation') or []
+            if isinstance(segmentation, dict):
+                extra['segmentation'] = segmentation
+                segmentation = []
+            elif segmentation and not isinstance(segmentation[0], list):
+                segmentation = [segmentation]
+            for polygon in segmentation:
+                coords.extend(polygon)
+                coord_offsets.append(len(coords))
+            polygon_offsets.append(len(coord_offsets) - 1)
+
+            extras.append(extra or None)
+            has_extras = has_extras or bool(extra)
+
+        integers = {
+            'id': integer_mask(ids),
+            'image_id': integer_mask(image_ids),
+            'category_id': integer_mask(category_ids),
+            'bbox': integer_mask(bboxes),
+            'area': integer_mask(areas),
+            'iscrowd': integer_mask(iscrowd),
+            'segmentation': integer_mask(coords),
+        }
+        return cls(ids, image_ids, category_ids, bboxes, areas, iscrowd, coords,
+                   coord_offsets, polygon_offsets, fields, extras if has_extras else None,
+                   key_orders if orders else None, integers)
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [], [], [], [], [], [0], [0])
+
+    @classmethod
+    def concatenate(cls, tables):
+        """
+        Join tables into one, in order
+
+        Parameters
+        ----------
+        tables : iterable
+            Tables to join, key order and extras are taken from all of them
+
+        Returns
+        -------
+        AnnotationTable
+            Table with the annotations of every table
+
+        """
+        tables = [table for table in tables if len(table)]
+        if not tables:
+            return cls.empty()
+        if len(tables) == 1:
+            return tables[0]
+
+        # Offsets of every table continue from the end of the previous one
+        coord_offsets = [np.zeros(1, dtype=np.int64)]
+        polygon_offsets = [np.zeros(1, dtype=np.int64)]
+        n_coords = n_polygons = 0
+        for table in tables:
+            coord_offsets.append(table.coord_offsets[1:] + n_coords)
+            polygon_offsets.append(table.polygon_offsets[1:] + n_polygons)
+            n_coords += table.coord_offsets[-1]
+            n_polygons += table.polygon_offsets[-1]
+
+        extras = None
+        if any(table.extras is not None for table in tables):
+            extras = []
+            for table in tables:
+                extras += table.extras if table.extras is not None else [None] * len(table)
+
+        # Annotations of tables with other fields than the first keep their keys
+        fields = tables[0].fields
+        key_orders = None
+        if any(table.key_orders is not None or table.fields != fields for table in tables):
+            key_orders = []
+            for table in tables:
+                own = tuple(table.fields) if table.fields != fields else None
+                key_orders += [keys or own for keys in table.key_orders] if table.key_orders is not None else [own] * len(table)
+
+        integers = {}
+        for attribute, name in TABLE_COLUMNS:
+            integers[name] = concatenate_integers([getattr(table, attribute) for table in tables],
+                                                  [table.integers.get(name) for table in tables])
+
+        return cls(
+            np.concatenate([table.ids for table in tables]),
+            np.concatenate([table.image_ids for table in tables]),
+            np.concatenate([table.category_ids for table in tables]),
+            np.concatenate([table.bboxes for table in tables]),
+            np.concatenate([table.areas for table in tables]),
+            np.concatenate([table.iscrowd for table in tables]),
+            np.concatenate([table.coords for table in tables]),
+            np.concatenate(coord_offsets),
+            np.concatenate(polygon_offsets),
+            fields,
+            extras,
+            key_orders,
+            integers
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        """
+        Get the annotations of a slice as a table sharing the columns of this one
+
+        """
+        if not isinstance(index, slice):
+            raise TypeError("AnnotationTable only supports slicing, iterate it for annotation dictionaries")
+        start, stop, step = index.indices(len(self))
+        if step != 1:
+            raise ValueError("AnnotationTable slices must be contiguous")
+        stop = max(start, stop)
+
+        polygon_offsets = self.polygon_offsets[start:stop + 1]
+        coord_offsets = self.coord_offsets[polygon_offsets[0]:polygon_offsets[-1] + 1]
+        return AnnotationTable(
+            self.ids[start:stop],
+            self.image_ids[start:stop],
+            self.category_ids[start:stop],
+            self.bboxes[start:stop],
+            self.areas[start:stop],
+            self.iscrowd[start:stop],
+            self.coords[coord_offsets[0]:coord_offsets[-1]],
+            coord_offsets - coord_offsets[0],
+            polygon_offsets - polygon_offsets[0],
+            self.fields,
+            self.extras[start:stop] if self.extras is not None else None,
+            self.key_orders[start:stop] if self.key_orders is not None else None,
+            self.select_integers(slice(start, stop), slice(coord_offsets[0], coord_offsets[-1]))
+        )
+
+    def take(self, indices):
+        """
+        Get the annotations at the given indices as a new table
+
+        Parameters
+        ----------
+        indices : array_like
+            Indices of the annotations, in the order of the new table
+
+        Returns
+        -------
+        AnnotationTable
+            Table of the selected annotations
+
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+
+        # Gather the polygons of the annotations, then the coordinates of the polygons
+        polygon_starts = self.polygon_offsets[indices]
+        polygon_counts = self.polygon_offsets[indices + 1] - polygon_starts
+        polygons = ranges_to_indices(polygon_starts, polygon_counts)
+        coord_starts = self.coord_offsets[polygons]
+        coord_counts = self.coord_offsets[polygons + 1] - coord_starts
+        coord_indices = ranges_to_indices(coord_starts, coord_counts)
+
+        return AnnotationTable(
+            self.ids[indices],
+            self.image_ids[indices],
+            self.category_ids[indices],
+            self.bboxes[indices],
+            self.areas[indices],
+            self.iscrowd[indices],
+            self.coords[coord_indices],
+            np.concatenate(([0], np.cumsum(coord_counts))),
+            np.concatenate(([0], np.cumsum(polygon_counts))),
+            self.fields,
+            [self.extras[i] for i in indices.tolist()] if self.extras is not None else None,
+            [self.key_orders[i] for i in indices.tolist()] if self.key_orders is not None else None,
+            self.select_integers(indices, coord_indices)
+        )
+
+    def select_integers(self, annotations, coords):
+        """
+        Get the integer masks of a selection of the table
+
+        Parameters
+        ----------
+        annotations : slice or ndarray
+            Selected annotations
+        coords : slice or ndarray
+            Selected coordinates
+
+        Returns
+        -------
+        dict
+            Integer masks of the selected values, by annotation key
+
+        """
+        return {name: mask[coords if name == 'segmentation' else annotations] for name, mask in self.integers.items()}
+
+    def iter_batches(self, batch_size):
+        for start in range(0, len(self), batch_size):
+            yield self[start:start + batch_size]
+
+    def annotation_ranges(self):
+        """
+        Get the range of coordinates of every annotation, all its polygons included
+
+        Returns
+        -------
+        ndarray
+            Start of the coordinates of each annotation
+        ndarray
+            End of the coordinates of each annotation
+
+        """
+        return self.coord_offsets[self.polygon_offsets[:-1]], self.coord_offsets[self.polygon_offsets[1:]]
+
+    def __iter__(self):
+        # Convert back to dictionaries in batches, so only one batch of lists is built at a time
+        for batch in self.iter_batches(DICT_BATCH_SIZE):
+            yield from batch.iter_dicts()
+
+    def iter_dicts(self):
+        """
+        Iterate the annotations as COCO annotation dictionaries
+
+        Keys are in the order of the dictionaries the table was built from,
+        and keys the dictionaries did not have are left out
+
+        Yields
+        ------
+        dict
+            COCO annotation
+
+        """
+        values_of = lambda attribute, name: column_values(getattr(self, attribute), self.integers.get(name))
+        coords = values_of('coords', 'segmentation')
+        coord_offsets = self.coord_offsets.tolist()
+        polygon_offsets = self.polygon_offsets.tolist()
+        extras = self.extras or [None] * len(self)
+        key_orders = self.key_orders or [None] * len(self)
+
+        columns = zip(values_of('ids', 'id'), values_of('image_ids', 'image_id'), values_of('category_ids', 'category_id'),
+                      values_of('bboxes', 'bbox'), values_of('areas', 'area'), values_of('iscrowd', 'iscrowd'), extras, key_orders)
+        for i, (ann_id, image_id, category_id, bbox, area, iscrowd, extra, keys) in enumerate(columns):
+            values = {
+                'id': ann_id,
+                'image_id': image_id,
+                'category_id': category_id,
+                'bbox': bbox,
+                'area': area,
+                'iscrowd': iscrowd,
+                'segmentation': [
+                    coords[coord_offsets[p]:coord_offsets[p + 1]]
+                    for p in range(polygon_offsets[i], polygon_offsets[i + 1])
+                ]
+            }
+            if extra:
+                values.update(extra)
+            if keys is not None:
+                yield {key: values[key] for key in keys if key in values}
+                continue
+
+            ann = {key: values.pop(key) for key in self.fields if key in values}
+            ann.update(values)
+            yield ann
+
+    def nbytes(self):
+        return sum(column.nbytes for column in [
+            self.ids, self.image_ids, self.category_ids, self.bboxes, self.areas,
+            self.iscrowd, self.coords, self.coord_offsets, self.polygon_offsets
+        ])
+
+def ranges_to_indices(starts, counts):
+    # Concatenate the ranges start, start + 1, ..., start + count - 1 without a Python loop
+    ends = np.cumsum(counts)
+    return np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - ends + counts, counts)
+
+def as_column(values, name):
+    # Integers stay integers, any float makes the whole column floating point
+    column = np.asarray(values)
+    if column.size == 0:
+        return column.astype(np.float64 if name in ['bbox', 'area', 'segmentation'] else np.int64)
+    if column.dtype.kind not in 'biuf':
+        raise ValueError(f"Invalid annotation {name} values, expected numbers")
+    return column
+
+def integer_mask(values):
+    # Integers of a list of numbers mixing integers and floats, None unless it mixes them
+    types = set(map(type, values))
+    if int not in types or float not in types:
+        return None
+    return np.fromiter(map(type, values), dtype=object, count=len(values)) == int
+
+def concatenate_integers(columns, masks):
+    # Integer mask of joined columns, where the values of integer columns are integers
+    if np.result_type(*columns).kind != 'f':
+        return None
+    mask = np.concatenate([
+        (mask if mask is not None else np.zeros(column.shape, dtype=bool)) if column.dtype.kind == 'f'
+        else np.ones(column.shape, dtype=bool)
+        for column, mask in zip(columns, masks)
+    ])
+    return mask if mask.any() else None
+
+def column_values(column, mask=None):
+    # Values of a column as lists, with the integers of a mask back as Python integers
+    if mask is None:
+        return column.tolist()
+    values = column.astype(object)
+    values[mask] = column[mask].astype(np.int64).astype(object)
+    return values.tolist()
+
+def iter_annotation_batches(annotations, batch_size):
+    """
+    Iterate annotations in tables of at most batch_size annotations
+
+    Parameters
+    ----------
+    annotations : AnnotationTable or iterable
+        Table of annotations, or annotation dictionaries such as a JsonArrayStream
+    batch_size : int
+        Maximum number of annotations per table
+
+    Yields
+    ------
+    AnnotationTable
+        Next batch of annotations
+
+    """
+    if isinstance(annotations, AnnotationTable):
+        yield from annotations.iter_batches(batch_size)
+        return
+
+    iterator = iter(annotations)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield AnnotationTable.from_dicts(batch)
@@ -0,0 +1,834 @@
+from pathlib import Path
+from random import Random, randint
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import multiprocessing
+import subprocess
+import argparse
+import sys
+import resource
+import tracemalloc
+import json
+import gc
+
+import numpy as np
+
+from converter import (
+    convert_to_yolo,
+    convert_to_cira,
+    convert_split_to_yolo,
+    convert_split_to_cira,
+    group_cira_annotations,
+    ANNOTATION_BATCH_SIZE,
+)
+from converter_utils import process_coco, process_bin, extract_segmentations, extract_label_segmentations
+from contour_cache import ContourCache
+from json_utils import write_json_stream, JSON_FORMATS, orjson
+from annotation_table import AnnotationTable, iter_annotation_batches
+from polygon_utils import simplify_table, SimplifyStats
+from rle_utils import encode_rle, decode_rle, convert_rle_segmentations
+from tile_utils import find_tiled_contours
+from utils import find_dir, ROOT_DIR_NAME
+
+# Times the import of main.py and the root path lookup in a fresh interpreter
+STARTUP_SCRIPT = '''
+import sys, time
+sys.path.insert(0, sys.argv[1])
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from utils import get_root_path
+get_root_path()
+print(imported - start, time.perf_counter() - imported)
+'''
+
+def make_annotations(n_images, n_annotations, n_vertices, n_categories, seed=0):
+    """
+    Generate synthetic COCO images, categories, and polygon annotations
+
+    Parameters
+    ----------
+    n_images : int
+        Number of images
+    n_annotations : int
+        Number of annotations, spread evenly over the images
+    n_vertices : int
+        Number of vertices per polygon
+    n_categories : int
+        Number of categories
+    seed : int, optional
+        Random seed, 0 by default
+
+    Returns
+    -------
+    list
+        List of images
+    list
+        List of categories
+    list
+        List of annotations
+
+    """
+    rng = Random(seed)
+    images = [{'id': i, 'file_name': f'{i:08d}.jpg', 'width': 1920, 'height': 1080} for i in range(n_images)]
+    categories = [{'id': i + 1, 'name': f'class_{i}', 'supercategory': 'none'} for i in range(n_categories)]
+
+    annotations = []
+    for i in range(n_annotations):
+        segmentation = []
+        for _ in range(n_vertices):
+            segmentation += [round(rng.uniform(0, 1920), 2), round(rng.uniform(0, 1080), 2)]
+        x_points = segmentation[::2]
+        y_points = segmentation[1::2]
+        x, y = min(x_points), min(y_points)
+        annotations.append({
+            'id': i + 1,
+            'image_id': i % n_images,
+            'category_id': rng.randint(1, n_categories),
+            'bbox': [x, y, max(x_points) - x, max(y_points) - y],
+            'area': 0,
+            'iscrowd': 0,
+            'segmentation': [segmentation]
+        })
+
+    return images, categories, annotations
+
+def time_call(func, *args, repeat=3):
+    # Best of several runs, with garbage collection paused while timing
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = perf_counter()
+            result = func(*args)
+            best = min(best, perf_counter() - start)
+        finally:
+            gc.enable()
+    return best, result
+
+def benchmark_yolo(images, annotations, task):
+    image_dict = {image['id']: image for image in images}
+
+    def per_annotation():
+        return [convert_to_yolo(ann, image_dict, Path(), '', task)[0] for ann in annotations]
+
+    old_time, old = time_call(per_annotation)
+    new_time, new = time_call(convert_split_to_yolo, AnnotationTable.from_dicts(annotations), image_dict, task)
+    if old != new:
+        raise AssertionError(f"Batched YOLO conversion output differs for task {task}")
+
+    return old_time, new_time
+
+def benchmark_cira(categories, annotations, task):
+    colors = [[randint(0, 255), randint(0, 255), randint(0, 255)] for i in range(len(categories))]
+
+    def per_annotation():
+        return [convert_to_cira(ann, categories, colors, task) for ann in annotations]
+
+    old_time, old = time_call(per_annotation)
+    new_time, new = time_call(convert_split_to_cira, AnnotationTable.from_dicts(annotations), categories, colors, task)
+    if old != new:
+        raise AssertionError(f"Batched CiRA conversion output differs for task {task}")
+
+    return old_time, new_time
+
+def benchmark_cira_scaling(n_annotations, steps=4):
+    """
+    Time grouping CiRA objects by image for growing split sizes
+
+    The linear scaling check is tests/test_cira.py.
+
+    Parameters
+    ----------
+    n_annotations : int
+        Number of annotations of the smallest split, doubled at every step
+    steps : int, optional
+        Number of split sizes to time, 4 by default
+
+    Returns
+    -------
+    list
+        Tuples of number of annotations and time taken
+
+    """
+    timings = []
+    for step in range(steps):
+        n = n_annotations * 2 ** step
+        images, categories, annotations = make_annotations(n // 10, n, 1, 1)
+        converted = [(ann['image_id'], {}) for ann in annotations]
+        elapsed, _ = time_call(group_cira_annotations, images, converted)
+        timings.append((n, elapsed))
+
+    return timings
+
+def measure_allocated(func, *args):
+    # Memory still allocated by the result of func, measured with tracemalloc
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        allocated, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return allocated, result
+
+def benchmark_annotation_memory(n_annotations, n_vertices, min_ratio=3.0):
+    """
+    Compare the memory of annotations as dictionaries and as an AnnotationTable
+
+    Parameters
+    ----------
+    n_annotations : int
+        Number of annotations
+    n_vertices : int
+        Number of vertices per polygon
+    min_ratio : float, optional
+        Smallest allowed ratio of dictionary to table memory, 3.0 by default
+
+    Returns
+    -------
+    int
+        Bytes allocated by the dictionaries
+    int
+        Bytes allocated by the table
+
+    """
+    dict_bytes, annotations = measure_allocated(lambda: json.loads(json.dumps(
+        make_annotations(max(1, n_annotations // 10), n_annotations, n_vertices, 20)[2]
+    )))
+    table_bytes, table = measure_allocated(AnnotationTable.from_dicts, annotations)
+    if list(table) != annotations:
+        raise AssertionError("AnnotationTable does not round trip to the same annotations")
+    if dict_bytes / table_bytes < min_ratio:
+        raise AssertionError(f"AnnotationTable only uses {dict_bytes / table_bytes:.1f}x less memory than dictionaries")
+
+    return dict_bytes, table_bytes
+
+def benchmark_label_masks(n_classes, width=1920, height=1080, n_shapes=200, seed=0):
+    """
+    Compare contour extraction from one binary mask per class and from one indexed mask
+
+    Parameters
+    ----------
+    n_classes : int
+        Number of classes
+    width : int, optional
+        Width of the masks, 1920 by default
+    height : int, optional
+        Height of the masks, 1080 by default
+    n_shapes : int, optional
+        Number of shapes, spread over the classes, 200 by default
+    seed : int, optional
+        Random seed, 0 by default
+
+    Returns
+    -------
+    float
+        Time to extract contours from the binary masks
+    float
+        Time to extract contours from the indexed mask
+
+    """
+    import cv2
+    rng = Random(seed)
+    labels = np.zeros((height, width), dtype=np.uint8)
+    for i in range(n_shapes):
+        center = (rng.randrange(width), rng.randrange(height))
+        axes = (rng.randrange(10, 80), rng.randrange(10, 80))
+        cv2.ellipse(labels, center, axes, rng.randrange(180), 0, 360, i % n_classes + 1, -1)
+
+    with TemporaryDirectory() as tmp_dir:
+        binary_paths = []
+        for class_index in range(1, n_classes + 1):
+            binary_paths.append(Path(tmp_dir) / f'class_{class_index}.png')
+            cv2.imwrite(str(binary_paths[-1]), ((labels == class_index) * 255).astype(np.uint8))
+        indexed_path = Path(tmp_dir) / 'indexed.png'
+        cv2.imwrite(str(indexed_path), labels)
+
+        binary_time, binary = time_call(lambda: [extract_segmentations(path) for path in binary_paths])
+        indexed_time, indexed = time_call(extract_label_segmentations, indexed_path)
+
+    # Every class of the indexed mask has the contours of its binary mask
+    expected = [(class_index, [contour.tolist() for contour in contours]) for class_index, contours in enumerate(binary, 1) if contours]
+    if [(class_index, [contour.tolist() for contour in contours]) for class_index, contours in indexed] != expected:
+        raise AssertionError("Contours of the indexed mask differ from those of the binary masks")
+
+    return binary_time, indexed_time
+
+def benchmark_contour_cache(n_masks, width=1920, height=1080, n_shapes=50, seed=0):
+    """
+    Compare contour extraction of a bin dataset without a cache, into an empty cache, and from a full cache
+
+    Parameters
+    ----------
+    n_masks : int
+        Number of binary masks, one per image
+    width : int, optional
+        Width of the masks, 1920 by default
+    height : int, optional
+        Height of the masks, 1080 by default
+    n_shapes : int, optional
+        Number of shapes per mask, 50 by default
+    seed : int, optional
+        Random seed, 0 by default
+
+    Returns
+    -------
+    float
+        Time to extract contours without a cache
+    float
+        Time to extract contours and fill an empty cache
+    float
+        Time to read the contours from the cache
+
+    """
+    import cv2
+    rng = Random(seed)
+    with TemporaryDirectory() as tmp_dir:
+        images_path = Path(tmp_dir) / 'images'
+        masks_path = Path(tmp_dir) / 'masks'
+        (masks_path / 'shape').mkdir(parents=True)
+        images_path.mkdir()
+        image = np.zeros((height, width), dtype=np.uint8)
+        for index in range(n_masks):
+            mask = np.zeros((height, width), dtype=np.uint8)
+            for _ in range(n_shapes):
+                center = (rng.randrange(width), rng.randrange(height))
+                axes = (rng.randrange(10, 80), rng.randrange(10, 80))
+                cv2.ellipse(mask, center, axes, rng.randrange(180), 0, 360, 255, -1)
+            cv2.imwrite(str(images_path / f'{index}.png'), image)
+            cv2.imwrite(str(masks_path / 'shape' / f'{index}.png'), mask)
+
+        cache = ContourCache(Path(tmp_dir) / 'cache')
+        run = lambda cache: process_bin(None, images_path, masks_path, images_path / '0.png', False, cache=cache)[3]
+        uncached_time, uncached = time_call(run, None, repeat=1)
+        cold_time, cold = time_call(run, cache, repeat=1)
+        warm_time, warm = time_call(run, cache, repeat=1)
+
+    if cache.stats.hits != n_masks or cache.stats.misses != n_masks:
+        raise AssertionError(f"Contour cache had {cache.stats.hits} hits and {cache.stats.misses} misses, "
+                             f"expected {n_masks} of each")
+    if list(cold) != list(uncached) or list(warm) != list(uncached):
+        raise AssertionError("Cached contours differ from extracted contours")
+
+    return uncached_time, cold_time, warm_time
+
+def make_rle_annotations(n_annotations, width=640, height=480, seed=0):
+    """
+    Generate crowd annotations of random ellipses as compressed COCO RLEs
+
+    Parameters
+    ----------
+    n_annotations : int
+        Number of annotations, all on one image
+    width : int, optional
+        Width of the image, 640 by default
+    height : int, optional
+        Height of the image, 480 by default
+    seed : int, optional
+        Random seed, 0 by default
+
+    Returns
+    -------
+    dict
+        The image
+    list
+        List of annotations
+
+    """
+    import cv2
+    rng = Random(seed)
+    image = {'id': 0, 'file_name': 'crowd.jpg', 'width': width, 'height': height}
+    annotations = []
+    for i in range(n_annotations):
+        mask = np.zeros((height, width), dtype=np.uint8)
+        for _ in range(rng.randint(1, 3)):
+            center = (rng.randrange(width), rng.randrange(height))
+            axes = (rng.randrange(5, 60), rng.randrange(5, 60))
+            cv2.ellipse(mask, center, axes, rng.randrange(180), 0, 360, 1, -1)
+        rows, columns = np.nonzero(mask)
+        x, y = int(columns.min()), int(rows.min())
+        annotations.append({
+            'id': i + 1,
+            'image_id': 0,
+            'category_id': 1,
+            'bbox': [x, y, int(columns.max()) + 1 - x, int(rows.max()) + 1 - y],
+            'area': int(mask.sum()),
+            'iscrowd': 1,
+            'segmentation': encode_rle(mask)
+        })
+    return image, annotations
+
+def benchmark_rle(n_annotations):
+    """
+    Compare YOLO conversion of RLE annotations decoded and traced one mask at
+    a time, traced in batches, and of the same annotations as polygons
+
+    Parameters
+    ----------
+    n_annotations : int
+        Number of annotations
+
+    Returns
+    -------
+    float
+        Time to decode and trace every mask, then convert the polygons
+    float
+        Time to convert the RLE annotations in batches
+    float
+        Time to convert the annotations as polygons
+
+    """
+    import cv2
+    image, annotations = make_rle_annotations(n_annotations)
+    image_dict = {image['id']: image}
+
+    def per_mask():
+        polygons = []
+        for ann in annotations:
+            contours = cv2.findContours(decode_rle(ann['segmentation']), cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)[0]
+            polygons.append({**ann, 'segmentation': [contour.ravel().tolist() for contour in contours]})
+        return convert_split_to_yolo(AnnotationTable.from_dicts(polygons), image_dict, 'segment')
+
+    def batched():
+        return [line for batch in iter_annotation_batches(annotations, ANNOTATION_BATCH_SIZE)
+                for line in convert_split_to_yolo(batch, image_dict, 'segment')]
+
+    per_mask_time, expected = time_call(per_mask)
+    batched_time, lines = time_call(batched)
+    if lines != expected:
+        raise AssertionError("Batched RLE conversion output differs from decoding every mask")
+
+    polygons = convert_rle_segmentations(AnnotationTable.from_dicts(annotations))
+    polygon_time, _ = time_call(convert_split_to_yolo, polygons, image_dict, 'segment')
+    return per_mask_time, batched_time, polygon_time
+
+def benchmark_simplify(annotations, tolerance=2.0, max_vertices=64):
+    """
+    Measure polygon simplification of a table and the vertices it removes
+
+    Parameters
+    ----------
+    annotations : list
+        COCO annotations
+    tolerance : float, optional
+        Simplification tolerance in pixels, 2.0 by default
+    max_vertices : int, optional
+        Largest number of vertices per polygon, 64 by default
+
+    Returns
+    -------
+    float
+        Time taken
+    SimplifyStats
+        Vertices and coordinate bytes before and after
+
+    """
+    table = AnnotationTable.from_dicts(annotations)
+    elapsed, simplified = time_call(simplify_table, table, tolerance, max_vertices)
+    if (np.diff(simplified.coord_offsets) > 2 * max_vertices).any():
+        raise AssertionError(f"Simplified polygons have more than {max_vertices} vertices")
+
+    stats = SimplifyStats()
+    stats.add(table, simplified)
+    return elapsed, stats
+
+def benchmark_json_output(images, categories, annotations, task='segment'):
+    """
+    Measure write time and file size of COCO and CiRA files in every JSON format
+
+    Parameters
+    ----------
+    images : list
+        List of images
+    categories : list
+        List of categories
+    annotations : list
+        List of annotations
+    task : str, optional
+        Task of the CiRA objects, 'segment' by default
+
+    Returns
+    -------
+    list
+        Tuples of output, JSON format, time taken, and file size in bytes
+
+    """
+    table = AnnotationTable.from_dicts(annotations)
+    colors = [[randint(0, 255), randint(0, 255), randint(0, 255)] for i in range(len(categories))]
+    converted = zip(table.image_ids.tolist(), convert_split_to_cira(table, categories, colors, task))
+    outputs = {
+        'coco': {'images': images, 'categories': categories, 'annotations': table},
+        'cira': group_cira_annotations(images, converted),
+    }
+
+    results = []
+    with TemporaryDirectory() as tmp_dir:
+        for name, data in outputs.items():
+            expected = None
+            for json_format in JSON_FORMATS:
+                if json_format == 'fast' and orjson is None:
+                    continue
+                json_path = Path(tmp_dir) / f'{name}_{json_format}.json'
+                elapsed, _ = time_call(write_json_stream, json_path, data, json_format)
+
+                # Every format must hold the same data
+                with open(json_path, 'r') as f:
+                    written = json.load(f)
+                if expected is None:
+                    expected = written
+                elif written != expected:
+                    raise AssertionError(f"{name} output in {json_format} format differs from pretty format")
+                results.append((name, json_format, elapsed, json_path.stat().st_size))
+
+    return results
+
+def make_coco_file(json_path, size_mb, n_vertices=32, n_categories=20, seed=0):
+    """
+    Write a synthetic COCO JSON file of about size_mb megabytes without holding it in memory
+
+    Parameters
+    ----------
+    json_path : Path
+        Path to the JSON file
+    size_mb : int
+        Approximate size of the file in megabytes
+    n_vertices : int, optional
+        Number of vertices per polygon, 32 by default
+    n_categories : int, optional
+        Number of categories, 20 by default
+    seed : int, optional
+        Random seed, 0 by default
+
+    Returns
+    -------
+    int
+        Number of annotations written
+
+    """
+    images, categories, annotations = make_annotations(1, 1, n_vertices, n_categories, seed)
+    n_annotations = max(1, size_mb * 1024 ** 2 // len(json.dumps(annotations[0])))
+    n_images = max(1, n_annotations // 10)
+
+    rng = Random(seed)
+    with open(json_path, 'w') as f:
+        f.write('{"categories": ' + json.dumps(categories) + ', "images": [')
+        for i in range(n_images):
+            f.write((', ' if i else '') + json.dumps({'id': i, 'file_name': f'{i:08d}.jpg', 'width': 1920, 'height': 1080}))
+        f.write('], "annotations": [')
+        for i in range(n_annotations):
+            segmentation = [round(rng.uniform(0, 1080), 2) for _ in range(2 * n_vertices)]
+            f.write((', ' if i else '') + json.dumps({
+                'id': i + 1,
+                'image_id': i % n_images,
+                'category_id': i % n_categories + 1,
+                'bbox': [10.0, 20.0, 300.5, 400.5],
+                'area': 120350.25,
+                'iscrowd': 0,
+                'segmentation': [segmentation]
+            }))
+        f.write(']}')
+
+    return n_annotations
+
+def measure_coco_ingestion(json_path, stream):
+    # Runs in a fresh process so peak RSS only covers this ingestion
+    start = perf_counter()
+    _, images, _, annotations = process_coco(None, '', json_path, False, stream)
+    image_dict = {image['id']: image for image in images}
+    n_lines = 0
+    for batch in iter_annotation_batches(annotations, ANNOTATION_BATCH_SIZE):
+        n_lines += len(convert_split_to_yolo(batch, image_dict, 'detect'))
+    elapsed = perf_counter() - start
+    return n_lines, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def benchmark_coco_streaming(size_mb, modes=(False, True)):
+    """
+    Measure time and peak memory of loading and converting a synthetic COCO file
+
+    The check that streaming memory does not grow with the file is
+    tests/test_coco_streaming.py.
+
+    Parameters
+    ----------
+    size_mb : int
+        Approximate size of the synthetic COCO file in megabytes
+    modes : tuple, optional
+        Streaming modes to measure, both by default
+
+    Returns
+    -------
+    list
+        Tuples of streaming mode, time taken, and peak RSS in bytes
+
+    """
+    results = []
+    with TemporaryDirectory() as tmp_dir:
+        json_path = Path(tmp_dir) / '_annotations.coco.json'
+        n_annotations = make_coco_file(json_path, size_mb)
+
+        context = multiprocessing.get_context('spawn')
+        for stream in modes:
+            with context.Pool(1) as pool:
+                n_lines, elapsed, peak_rss = pool.apply(measure_coco_ingestion, (json_path, stream))
+            if n_lines != n_annotations:
+                raise AssertionError(f"Converted {n_lines} of {n_annotations} annotations with stream={stream}")
+            results.append((stream, elapsed, peak_rss))
+
+    return results
+
+# Smallest mask whose whole decoded copies clearly outweigh the interpreter and
+# library pages in peak RSS, smaller masks are measured but not checked
+TILED_RSS_MIN_SIZE = 4096
+
+def make_tiled_mask(mask_path, size, cell=64, tile_rows=1024):
+    # Writes a binary PGM of square rings strip by strip, two contours per cell,
+    # with the size rounded up to whole cells
+    size = -(-size // cell) * cell
+    rows = np.arange(size) % cell
+    columns = np.arange(size) % cell
+    ring = lambda offsets: (offsets >= 8) & (offsets < cell - 8)
+    hole = lambda offsets: (offsets >= 24) & (offsets < cell - 24)
+    with open(mask_path, 'wb') as f:
+        f.write(f'P5\n{size} {size}\n255\n'.encode())
+        for start in range(0, size, tile_rows):
+            strip_rows = rows[start:start + tile_rows, None]
+            strip = ring(strip_rows) & ring(columns) & ~(hole(strip_rows) & hole(columns))
+            f.write((strip * np.uint8(255)).tobytes())
+    return 2 * (size // cell) ** 2
+
+def measure_mask_contours(mask_path, tile_rows):
+    # Runs in a fresh process so peak RSS only covers this extraction
+    start = perf_counter()
+    contours = find_tiled_contours(mask_path, tile_rows) if tile_rows else extract_segmentations(mask_path)
+    elapsed = perf_counter() - start
+    return len(contours), elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def benchmark_tiled_masks(size, tile_rows=256):
+    """
+    Measure time and peak memory of contour extraction from a large binary mask, whole and in strips
+
+    Tiled extraction must lower peak RSS for masks of at least
+    TILED_RSS_MIN_SIZE pixels a side.
+
+    Parameters
+    ----------
+    size : int
+        Width and height of the synthetic mask
+    tile_rows : int, optional
+        Number of rows traced at a time, 256 by default
+
+    Returns
+    -------
+    list
+        Tuples of tile rows, None for the whole mask, time taken, and peak RSS in bytes
+
+    """
+    results = []
+    with TemporaryDirectory() as tmp_dir:
+        mask_path = Path(tmp_dir) / 'mask.pgm'
+        n_contours = make_tiled_mask(mask_path, size)
+
+        context = multiprocessing.get_context('spawn')
+        for rows in [None, tile_rows]:
+            with context.Pool(1) as pool:
+                n, elapsed, peak_rss = pool.apply(measure_mask_contours, (mask_path, rows))
+            if n != n_contours:
+                raise AssertionError(f"Found {n} of {n_contours} contours with tile_rows={rows}")
+            results.append((rows, elapsed, peak_rss))
+
+    if size >= TILED_RSS_MIN_SIZE and results[1][2] >= results[0][2]:
+        raise AssertionError("Tiled contour extraction does not lower peak RSS")
+    return results
+
+# Imports a COCO-only conversion runs and converts a small COCO dataset to COCO and CiRA
+COCO_STARTUP_SCRIPT = '''
+import sys, time
+sys.path.insert(0, sys.argv[1])
+start = time.perf_counter()
+from converter import convert
+imported = time.perf_counter()
+from pathlib import Path
+for dst_format in ['coco', 'cira']:
+    convert({
+        'src_dataset': 'dataset', 'task': 'segment', 'mode': 'convert', 'src_format': 'coco',
+        'dst_format': dst_format, 'src_path': Path(sys.argv[2]), 'dst_path': Path(sys.argv[3]) / dst_format,
+        'transfer': 'skip',
+    }, False)
+print(imported - start, ','.join(name for name in ['cv2', 'yaml'] if name in sys.modules))
+'''
+def benchmark_coco_imports(repeat=3):
+    """
+    Time the converter import of COCO-only conversions, and find the heavy modules they load
+
+    The import budget and the check that OpenCV and YAML stay unloaded are
+    tests/test_imports.py.
+
+    Parameters
+    ----------
+    repeat : int, optional
+        Number of fresh interpreters started, the fastest is kept, 3 by default
+
+    Returns
+    -------
+    float
+        Seconds to import the converter
+    list
+        Names of cv2 and yaml if the conversions imported them
+
+    """
+    code_path = Path(__file__).resolve().parent
+    images, categories, annotations = make_annotations(10, 100, 8, 3)
+    best = float('inf')
+    with TemporaryDirectory() as tmp_dir:
+        src_path = Path(tmp_dir) / 'dataset'
+        src_path.mkdir()
+        with open(src_path / '_annotations.coco.json', 'w') as f:
+            json.dump({'images': images, 'categories': categories, 'annotations': annotations}, f)
+
+        for _ in range(repeat):
+            output = subprocess.run(
+                [sys.executable, '-c', COCO_STARTUP_SCRIPT, str(code_path), str(src_path), tmp_dir],
+                capture_output=True, text=True, check=True
+            ).stdout.split()
+            best = min(best, float(output[0]))
+
+    return best, output[1].split(',') if len(output) > 1 else []
+
+def make_file_tree(root, n_files, files_per_dir=100, dirs_per_dir=10):
+    # Nested directories of empty files, like a dataset mount the program could be started from
+    directories = [root]
+    n_written = 0
+    while n_written < n_files:
+        directory = directories.pop(0)
+        for i in range(dirs_per_dir):
+            directories.append(directory / f'dir_{i}')
+            directories[-1].mkdir()
+        for i in range(min(files_per_dir, n_files - n_written)):
+            (directory / f'file_{i}.jpg').touch()
+        n_written += files_per_dir
+
+def benchmark_startup(n_files, max_root_seconds=0.05, search_timeout=0.2):
+    """
+    Measure startup time when the program is run from a large directory tree
+
+    Parameters
+    ----------
+    n_files : int
+        Number of files in the directory tree the program is started from
+    max_root_seconds : float, optional
+        Largest allowed time to find the root path, 0.05 seconds by default
+    search_timeout : float, optional
+        Timeout of the opt-in directory search, 0.2 seconds by default
+
+    Returns
+    -------
+    float
+        Seconds to import main.py
+    float
+        Seconds to find the root path
+    float
+        Seconds of the opt-in search, which gives up after its timeout
+    float
+        Seconds of a full walk of the tree, as the search without limits did
+
+    """
+    code_path = Path(__file__).resolve().parent
+    with TemporaryDirectory() as tmp_dir:
+        tree_path = Path(tmp_dir)
+        make_file_tree(tree_path, n_files)
+
+        output = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT, str(code_path)],
+            cwd=tree_path, capture_output=True, text=True, check=True
+        ).stdout
+        import_time, root_time = map(float, output.split())
+        if root_time > max_root_seconds:
+            raise AssertionError(f"Finding the root path took {root_time:.3f}s, expected at most {max_root_seconds}s")
+
+        start = perf_counter()
+        find_dir(tree_path, ROOT_DIR_NAME, max_depth=100, timeout=search_timeout)
+        search_time = perf_counter() - start
+        if search_time > search_timeout + 0.1:
+            raise AssertionError(f"Directory search took {search_time:.3f}s with a timeout of {search_timeout}s")
+
+        start = perf_counter()
+        for _ in tree_path.rglob(ROOT_DIR_NAME):
+            pass
+        walk_time = perf_counter() - start
+
+    return import_time, root_time, search_time, walk_time
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark annotation conversion paths')
+    parser.add_argument('--images', type=int, default=1000)
+    parser.add_argument('--annotations', type=int, default=10000)
+    parser.add_argument('--vertices', type=int, default=200)
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--coco-mb', type=int, default=64, help='size of the synthetic COCO file, 0 to skip')
+    parser.add_argument('--stream-only', action='store_true', help='only measure streaming COCO ingestion')
+    parser.add_argument('--mask-size', type=int, default=8192, help='width and height of the tiled mask, 0 to skip')
+    parser.add_argument('--startup-files', type=int, default=50000, help='files in the tree startup is measured from, 0 to skip')
+    args = parser.parse_args()
+
+    import_time, heavy_modules = benchmark_coco_imports()
+    print(f"converter import for COCO-only conversions {import_time:.3f}s, "
+          f"{'imports ' + ', '.join(heavy_modules) if heavy_modules else 'without cv2 or yaml'}")
+
+    if args.startup_files:
+        import_time, root_time, search_time, walk_time = benchmark_startup(args.startup_files)
+        print(f"startup from a tree of {args.startup_files} files: import {import_time:.3f}s, root path {root_time * 1000:.1f} ms, "
+              f"opt-in search {search_time:.3f}s, full rglob walk {walk_time:.3f}s")
+
+    images, categories, annotations = make_annotations(args.images, args.annotations, args.vertices, args.categories)
+
+    print(f"{args.annotations} annotations, {args.vertices} vertices per polygon")
+    print(f"{'path':<16}{'per annotation':>16}{'batched':>12}{'speedup':>10}")
+    for task in ['detect', 'segment']:
+        for name, (old_time, new_time) in [
+            (f'yolo {task}', benchmark_yolo(images, annotations, task)),
+            (f'cira {task}', benchmark_cira(categories, annotations, task)),
+        ]:
+            print(f"{name:<16}{old_time:>15.3f}s{new_time:>11.3f}s{old_time / new_time:>9.1f}x")
+
+    dict_bytes, table_bytes = benchmark_annotation_memory(args.annotations, args.vertices)
+    print(f"annotation memory {dict_bytes / 1024 ** 2:.1f} MB as dictionaries, "
+          f"{table_bytes / 1024 ** 2:.1f} MB as a table, {dict_bytes / table_bytes:.1f}x smaller")
+
+    binary_time, indexed_time = benchmark_label_masks(args.categories)
+    print(f"contours of {args.categories} classes from binary masks {binary_time:.3f}s, "
+          f"from an indexed mask {indexed_time:.3f}s, {binary_time / indexed_time:.1f}x faster")
+
+    uncached_time, cold_time, warm_time = benchmark_contour_cache(100)
+    print(f"contours of 100 binary masks {uncached_time:.3f}s without a cache, "
+          f"{cold_time:.3f}s filling the cache, {warm_time:.3f}s from the cache")
+
+    per_mask_time, batched_time, polygon_time = benchmark_rle(min(args.annotations, 5000))
+    print(f"yolo segment of {min(args.annotations, 5000)} RLE annotations {per_mask_time:.3f}s mask by mask, "
+          f"{batched_time:.3f}s batched, {polygon_time:.3f}s as polygons")
+
+    elapsed, stats = benchmark_simplify(annotations)
+    print(f"simplified {stats.polygons_in} polygons in {elapsed:.3f}s, {stats.vertices_in} to {stats.vertices_out} vertices")
+
+    print(f"{'json output':<16}{'write':>10}{'size':>12}")
+    for name, json_format, elapsed, size in benchmark_json_output(images, categories, annotations):
+        print(f"{name + ' ' + json_format:<16}{elapsed:>9.3f}s{size / 1024 ** 2:>9.1f} MB")
+
+    print("cira grouping scaling")
+    for n, elapsed in benchmark_cira_scaling(args.annotations):
+        print(f"{n:>10} annotations{elapsed:>11.3f}s")
+
+    if args.mask_size:
+        print(f"contours of a {args.mask_size}x{args.mask_size} binary mask")
+        for rows, elapsed, peak_rss in benchmark_tiled_masks(args.mask_size):
+            print(f"{f'{rows} rows' if rows else 'whole':>10}{elapsed:>11.3f}s{peak_rss / 1024 ** 2:>10.0f} MB peak RSS")
+
+    if args.coco_mb:
+        print(f"coco ingestion of a {args.coco_mb} MB file")
+        modes = (True,) if args.stream_only else (False, True)
+        for stream, elapsed, peak_rss in benchmark_coco_streaming(args.coco_mb, modes):
+            print(f"{'streamed' if stream else 'loaded':>10}{elapsed:>11.3f}s{peak_rss / 1024 ** 2:>10.0f} MB peak RSS")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,437 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import argparse
+from statistics import median
+import platform
+import os
+import shutil
+import json
+import sys
+
+import numpy as np
+
+from converter import convert
+from converter_utils import write_yolo_yaml
+
+# Source formats and the destination formats and tasks of each conversion path
+SUITE_PATHS = {
+    'coco': [('coco', 'detect'), ('coco', 'segment'), ('yolo', 'detect'), ('yolo', 'segment'), ('cira', 'detect'), ('cira', 'segment')],
+    'bin': [('coco', 'segment'), ('yolo', 'segment'), ('cira', 'segment')],
+    'yolo': [('coco', 'detect'), ('coco', 'segment'), ('yolo', 'detect'), ('yolo', 'segment'), ('cira', 'detect'), ('cira', 'segment')],
+}
+# Baseline of the suite, recorded with --save-baseline
+BASELINE_PATH = Path(__file__).parent / 'benchmark_baseline.json'
+# The suite regresses when its total time is this much slower than the baseline, and at least
+# MIN_REGRESSION_SECONDS slower. Paths of a fraction of a second are within run to run noise,
+# mostly of disk writes, so the paths slower by as much are only listed
+REGRESSION_TOLERANCE = 0.25
+MIN_REGRESSION_SECONDS = 0.1
+# Runs of every path, the median time is kept
+SUITE_REPEAT = 5
+
+def make_polygons(rng, n_polygons, n_vertices, width, height):
+    """
+    Generate non-overlapping star-shaped polygons, one per cell of a grid
+
+    Parameters
+    ----------
+    rng : numpy.random.Generator
+        Random generator
+    n_polygons : int
+        Number of polygons
+    n_vertices : int
+        Number of vertices per polygon
+    width : int
+        Width of the image
+    height : int
+        Height of the image
+
+    Returns
+    -------
+    ndarray
+        Vertices of every polygon in pixels, of shape (n_polygons, n_vertices, 2)
+
+    """
+    columns = int(np.ceil(np.sqrt(n_polygons)))
+    rows = int(np.ceil(n_polygons / columns))
+    cell_width = width / columns
+    cell_height = height / rows
+    cells = np.arange(n_polygons)
+    centers = np.stack([(cells % columns + 0.5) * cell_width, (cells // columns + 0.5) * cell_height], axis=1)
+
+    # Vertices at increasing angles never cross, the radius jitters to make the outline irregular
+    angles = np.linspace(0, 2 * np.pi, n_vertices, endpoint=False)
+    radii = rng.uniform(0.25, 0.45, size=(n_polygons, n_vertices))
+    offsets = np.stack([np.cos(angles) * cell_width, np.sin(angles) * cell_height], axis=-1)
+    return np.round(centers[:, None, :] + radii[:, :, None] * offsets, 2)
+
+def write_images(image_paths, width, height):
+    # Every image has the same content, so images are encoded once
+    import cv2
+    ok, encoded = cv2.imencode('.png', np.zeros((height, width, 3), dtype=np.uint8))
+    data = encoded.tobytes()
+    for image_path in image_paths:
+        image_path.write_bytes(data)
+
+def make_coco_dataset(src_path, n_images, n_annotations, n_vertices, n_categories, width=640, height=480, seed=0):
+    """
+    Generate a COCO dataset with one JSON file and its images
+
+    Parameters
+    ----------
+    src_path : Path
+        Directory of the dataset, its name is the dataset name
+    n_images : int
+        Number of images
+    n_annotations : int
+        Number of annotations per image
+    n_vertices : int
+        Number of vertices per polygon
+    n_categories : int
+        Number of categories
+    width : int, optional
+        Width of the images, 640 by default
+    height : int, optional
+        Height of the images, 480 by default
+    seed : int, optional
+        Random seed, 0 by default
+
+    """
+    rng = np.random.default_rng(seed)
+    src_path.mkdir(parents=True, exist_ok=True)
+    images = [{'id': i, 'file_name': f'{i:06d}.png', 'width': width, 'height': height} for i in range(n_images)]
+    categories = [{'id': i + 1, 'name': f'class_{i}', 'supercategory': f'class_{i}'} for i in range(n_categories)]
+    write_images([src_path / image['file_name'] for image in images], width, height)
+
+    annotations = []
+    for image in images:
+        polygons = make_polygons(rng, n_annotations, n_vertices, width, height)
+        mins = polygons.min(axis=1)
+        sizes = polygons.max(axis=1) - mins
+        for polygon, (x, y), (w, h) in zip(polygons.tolist(), mins.tolist(), sizes.tolist()):
+            annotations.append({
+                'id': len(annotations) + 1,
+                'image_id': image['id'],
+                'category_id': len(annotations) % n_categories + 1,
+                'bbox': [x, y, w, h],
+                'area': round(w * h, 2),
+                'iscrowd': 0,
+                'segmentation': [sum(polygon, [])]
+            })
+
+    with open(src_path / '_annotations.coco.json', 'w') as f:
+        json.dump({'images': images, 'categories': categories, 'annotations': annotations}, f)
+
+def make_bin_dataset(src_path, n_images, n_annotations, n_vertices, n_categories, width=640, height=480, seed=0):
+    """
+    Generate a binary mask dataset with one mask per image and category
+
+    Annotations of an image are spread over the categories, and images
+    without annotations of a category have no mask of it. Contours are
+    extracted from the masks again, so their vertex counts depend on the
+    outline and not on n_vertices alone.
+
+    Parameters
+    ----------
+    src_path : Path
+        Directory of the dataset, with images and masks directories
+    n_images : int
+        Number of images
+    n_annotations : int
+        Number of annotations per image
+    n_vertices : int
+        Number of vertices per polygon
+    n_categories : int
+        Number of categories
+    width : int, optional
+        Width of the images, 640 by default
+    height : int, optional
+        Height of the images, 480 by default
+    seed : int, optional
+        Random seed, 0 by default
+
+    """
+    import cv2
+    rng = np.random.default_rng(seed)
+    (src_path / 'images').mkdir(parents=True, exist_ok=True)
+    file_names = [f'{i:06d}.png' for i in range(n_images)]
+    write_images([src_path / 'images' / file_name for file_name in file_names], width, height)
+
+    for category in range(n_categories):
+        (src_path / 'masks' / f'class_{category}').mkdir(parents=True, exist_ok=True)
+    for file_name in file_names:
+        polygons = make_polygons(rng, n_annotations, n_vertices, width, height).astype(np.int32)
+        for category in range(min(n_categories, n_annotations)):
+            mask = np.zeros((height, width), dtype=np.uint8)
+            cv2.fillPoly(mask, list(polygons[category::n_categories]), 255)
+            cv2.imwrite(str(src_path / 'masks' / f'class_{category}' / file_name), mask)
+
+def make_yolo_dataset(src_path, n_images, n_annotations, n_vertices, n_categories, width=640, height=480, seed=0):
+    """
+    Generate a YOLO dataset with polygon labels, its images, and its YAML file
+
+    Parameters
+    ----------
+    src_path : Path
+        Directory of the dataset, its name is the dataset name
+    n_images : int
+        Number of images
+    n_annotations : int
+        Number of annotations per image
+    n_vertices : int
+        Number of vertices per polygon
+    n_categories : int
+        Number of categories
+    width : int, optional
+        Width of the images, 640 by default
+    height : int, optional
+        Height of the images, 480 by default
+    seed : int, optional
+        Random seed, 0 by default
+
+    """
+    rng = np.random.default_rng(seed)
+    (src_path / 'images').mkdir(parents=True, exist_ok=True)
+    (src_path / 'labels').mkdir(parents=True, exist_ok=True)
+    file_names = [f'{i:06d}.png' for i in range(n_images)]
+    write_images([src_path / 'images' / file_name for file_name in file_names], width, height)
+
+    classes = np.arange(n_annotations) % n_categories
+    for file_name in file_names:
+        polygons = make_polygons(rng, n_annotations, n_vertices, width, height) / [width, height]
+        lines = [f"{label} " + ' '.join(f'{value:.6f}' for value in polygon.ravel()) + '\n'
+                 for label, polygon in zip(classes.tolist(), polygons)]
+        (src_path / 'labels' / f'{Path(file_name).stem}.txt').write_text(''.join(lines))
+
+    categories = [{'id': i + 1, 'name': f'class_{i}'} for i in range(n_categories)]
+    write_yolo_yaml(src_path, src_path.name, False, categories)
+
+DATASET_GENERATORS = {
+    'coco': make_coco_dataset,
+    'bin': make_bin_dataset,
+    'yolo': make_yolo_dataset,
+}
+
+def run_path(src_path, src_format, dst_format, task, work_path, repeat=SUITE_REPEAT, workers=1, transfer='copy'):
+    """
+    Time one conversion path with the profiling report of convert
+
+    Parameters
+    ----------
+    src_path : Path
+        Path to the source dataset
+    src_format : str
+        Source format
+    dst_format : str
+        Destination format
+    task : str
+        Task, 'detect' or 'segment'
+    work_path : Path
+        Directory for the converted datasets and reports
+    repeat : int, optional
+        Number of runs, the median time is kept, SUITE_REPEAT by default
+    workers : int, optional
+        Number of worker processes, 1 by default
+    transfer : str, optional
+        Image transfer mode, 'copy' by default
+
+    Returns
+    -------
+    dict
+        Median total time, median time of every stage, and largest peak RSS
+        over the runs, the median as the fastest run of a baseline would
+        make every later run look slower
+
+    """
+    runs = []
+    for run in range(repeat):
+        dst_path = work_path / f'{src_format}_{dst_format}_{task}'
+        shutil.rmtree(dst_path, ignore_errors=True)
+        dst_path.mkdir(parents=True)
+        report_path = work_path / 'report.json'
+        convert({
+            'src_dataset': src_path.name,
+            'task': task,
+            'mode': 'convert',
+            'src_format': src_format,
+            'dst_format': dst_format,
+            'root_path': work_path,
+            'src_path': src_path,
+            'dst_path': dst_path,
+            'transfer': transfer,
+            'workers': workers,
+            'copy_threads': 1,
+            'profile': report_path,
+        }, verbose=False)
+        with open(report_path, 'r') as f:
+            report = json.load(f)
+
+        runs.append(report)
+
+    # Stages are timed separately, so the noise of disk writes in one run does not hide the others
+    return {
+        'seconds': median(report['seconds'] for report in runs),
+        'peak_rss_bytes': max(report['peak_rss_bytes'] for report in runs),
+        'stages': {name: median(report['stages'][name]['seconds'] for report in runs) for name in runs[0]['stages']},
+    }
+
+def run_suite(sizes, formats=None, repeat=SUITE_REPEAT, workers=1, transfer='copy', verbose=True):
+    """
+    Generate a dataset of every source format and time every conversion path from it
+
+    Parameters
+    ----------
+    sizes : dict
+        Dataset sizes, with images, annotations, vertices, and categories
+    formats : list, optional
+        Source formats to run, every format of SUITE_PATHS by default
+    repeat : int, optional
+        Number of runs of every path, the median time is kept, SUITE_REPEAT by default
+    workers : int, optional
+        Number of worker processes, 1 by default
+    transfer : str, optional
+        Image transfer mode, 'copy' by default
+    verbose : bool, optional
+        Print the time of every path as it is measured, True by default
+
+    Returns
+    -------
+    dict
+        Results of every path, keyed by 'src->dst task'
+
+    """
+    results = {}
+    with TemporaryDirectory() as tmp_dir:
+        tmp_path = Path(tmp_dir)
+        for src_format in formats or SUITE_PATHS:
+            src_path = tmp_path / 'datasets' / f'synthetic_{src_format}'
+            DATASET_GENERATORS[src_format](src_path, sizes['images'], sizes['annotations'], sizes['vertices'], sizes['categories'])
+            for dst_format, task in SUITE_PATHS[src_format]:
+                name = f'{src_format}->{dst_format} {task}'
+                results[name] = run_path(src_path, src_format, dst_format, task, tmp_path / 'output', repeat, workers, transfer)
+                if verbose:
+                    print_result(name, results[name])
+    return results
+
+def compare_to_baseline(results, baseline, tolerance=REGRESSION_TOLERANCE, min_seconds=MIN_REGRESSION_SECONDS):
+    """
+    Find the paths that got slower than the baseline, and their slower stages
+
+    Paths are compared by their total time, which is less noisy than the
+    time of a single stage, and the stages more than tolerance slower show
+    where a regressed path lost its time.
+
+    Parameters
+    ----------
+    results : dict
+        Results of run_suite
+    baseline : dict
+        Results of a previous run_suite
+    tolerance : float, optional
+        Allowed slowdown as a fraction of the baseline time, REGRESSION_TOLERANCE by default
+    min_seconds : float, optional
+        Smallest slowdown counted as a regression, MIN_REGRESSION_SECONDS by default
+
+    Returns
+    -------
+    list
+        Tuples of path name, 'total' or stage, baseline time, and new time,
+        for the total and the slower stages of every regressed path
+
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old_total, new_total = baseline[name]['seconds'], result['seconds']
+        if not is_slower(old_total, new_total, tolerance, min_seconds):
+            continue
+        regressions.append((name, 'total', old_total, new_total))
+        for stage, new in result['stages'].items():
+            old = baseline[name]['stages'].get(stage)
+            if old is not None and new > old * (1 + tolerance):
+                regressions.append((name, stage, old, new))
+    return regressions
+
+def is_slower(old, new, tolerance=REGRESSION_TOLERANCE, min_seconds=MIN_REGRESSION_SECONDS):
+    return new > old * (1 + tolerance) and new - old >= min_seconds
+
+def get_machine():
+    # Host, architecture, CPUs, and Python of the run, times of another of them are no reference
+    return f"{platform.node()} {platform.machine()} {os.cpu_count()} CPUs Python {platform.python_version()}"
+
+def print_result(name, result):
+    stages = ', '.join(f'{stage} {seconds:.3f}s' for stage, seconds in result['stages'].items())
+    print(f"{name:<24}{result['seconds']:>9.3f}s  ({stages})")
+
+def main(argv=None):
+    """
+    Run the suite, and compare it to the baseline or save it as the baseline
+
+    Returns
+    -------
+    int
+        1 if the suite regressed or there is no baseline to compare to, 0
+        otherwise, regressions against a baseline recorded on another
+        machine are only warnings
+
+    """
+    parser = argparse.ArgumentParser(description='Time every conversion path on synthetic datasets')
+    parser.add_argument('--images', type=int, default=200)
+    parser.add_argument('--annotations', type=int, default=10, help='annotations per image')
+    parser.add_argument('--vertices', type=int, default=32, help='vertices per polygon')
+    parser.add_argument('--categories', type=int, default=5)
+    parser.add_argument('--formats', nargs='+', choices=list(SUITE_PATHS), help='source formats, all by default')
+    parser.add_argument('--repeat', type=int, default=SUITE_REPEAT, help='runs of every path, the median time is kept')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--transfer', default='copy')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH, help='baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='save the results as the baseline instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE, help='allowed slowdown, 0.25 for 25%%')
+    args = parser.parse_args(argv)
+
+    sizes = {'images': args.images, 'annotations': args.annotations, 'vertices': args.vertices, 'categories': args.categories}
+    print(f"{args.images} images, {args.annotations} annotations per image, {args.vertices} vertices, {args.categories} categories")
+    results = run_suite(sizes, args.formats, args.repeat, args.workers, args.transfer)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'sizes': sizes, 'machine': get_machine(), 'paths': results}, f, indent=4)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, run with --save-baseline to record one")
+        return 1
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    if baseline['sizes'] != sizes:
+        print(f"Baseline {args.baseline} was recorded with sizes {baseline['sizes']}, not comparing")
+        return 1
+
+    # Times of another machine are no reference, so its baseline only gives warnings
+    foreign = baseline.get('machine') != get_machine()
+    if foreign:
+        print(f"Baseline {args.baseline} was recorded on {baseline.get('machine')}, not {get_machine()}, "
+              f"regressions are only warnings, run with --save-baseline to record one on this machine")
+
+    slower = compare_to_baseline(results, baseline['paths'], args.tolerance)
+    for name, stage, old, new in slower:
+        print(f"SLOWER {name} {stage}: {old:.3f}s -> {new:.3f}s (+{(new / old - 1) * 100:.0f}%)")
+    n_slower = len({name for name, _, _, _ in slower})
+
+    # The total of the paths in both runs decides, as the noise of single paths mostly cancels out
+    names = [name for name in results if name in baseline['paths']]
+    old_total = sum(baseline['paths'][name]['seconds'] for name in names)
+    new_total = sum(results[name]['seconds'] for name in names)
+    change = f"{old_total:.3f}s -> {new_total:.3f}s ({(new_total / old_total - 1) * 100:+.0f}%)" if old_total > 0 else f"{new_total:.3f}s"
+    if is_slower(old_total, new_total, args.tolerance):
+        print(f"{'WARNING' if foreign else 'REGRESSION'} suite of {len(names)} paths: {change}, "
+              f"{n_slower} paths more than {args.tolerance * 100:.0f}% slower")
+        return 0 if foreign else 1
+    print(f"Suite of {len(names)} paths within {args.tolerance * 100:.0f}% of the baseline: {change}, "
+          f"{n_slower} paths more than {args.tolerance * 100:.0f}% slower")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
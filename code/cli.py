@@ -0,0 +1,425 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from os import cpu_count
+from pathlib import Path
+from time import perf_counter
+import traceback
+import argparse
+import json
+import sys
+
+from converter import convert
+from converter_utils import TRANSFER_MODES, MASK_TYPES, INSTANCE_ID_DIVISOR, check_options
+from json_utils import JSON_FORMATS
+from profiler import PROFILE_STAGES
+from splitter import split, SPLIT_NAMES
+from utils import get_dst_name, prepare_dst_path, get_root_path
+
+# Job settings that can be given on the command line, with their types
+JOB_ARGUMENTS = {
+    'name': str,
+    'src_dataset': str,
+    'src_path': str,
+    'dst_path': str,
+    'task': str,
+    'mode': str,
+    'src_format': str,
+    'dst_format': str,
+    'mask_type': str,
+    'instance_divisor': int,
+    'tile_rows': int,
+    'contour_cache': str,
+    'contour_cache_mb': int,
+    'transfer': str,
+    'json_format': str,
+    'workers': int,
+    'copy_threads': int,
+    'test_train_ratio': float,
+    'val_ratio': float,
+    'seed': int,
+    'simplify_tolerance': float,
+    'max_vertices': int,
+    'min_area': float,
+    'profile': str,
+    'profile_stage': str,
+}
+JOB_CHOICES = {
+    'task': ['classify', 'detect', 'segment'],
+    'mode': ['convert', 'split'],
+    'src_format': ['bin', 'coco', 'yolo'],
+    'dst_format': ['coco', 'yolo', 'cira'],
+    'mask_type': MASK_TYPES,
+    'transfer': TRANSFER_MODES,
+    'json_format': JSON_FORMATS,
+    'profile_stage': PROFILE_STAGES,
+}
+
+def parse_args(argv=None):
+    """
+    Parse command line arguments
+
+    Job settings given on the command line describe a single job, or are the
+    defaults of every job of a config file.
+
+    Parameters
+    ----------
+    argv : list, optional
+        Command line arguments, sys.argv by default
+
+    Returns
+    -------
+    argparse.Namespace
+        Runner arguments
+    dict
+        Job settings given on the command line
+
+    """
+    parser = argparse.ArgumentParser(description='Convert or split datasets without prompts')
+    parser.add_argument('--config', type=Path, help='YAML or JSON file with a list of jobs, or a jobs list and defaults')
+    parser.add_argument('--root', type=Path, help='project root with datasets and output directories, '
+                        'ANNOTATION_CONVERTER_ROOT or the directory of the code package by default')
+    parser.add_argument('--jobs', type=int, default=1, help='number of jobs run at the same time')
+    parser.add_argument('--report', type=Path, help='write the status and timings of every job to this JSON file')
+    parser.add_argument('--verbose', action='store_true', help='print progress messages of every job')
+
+    jobs = parser.add_argument_group('job settings')
+    for key, value_type in JOB_ARGUMENTS.items():
+        flag = '--' + key.replace('_', '-')
+        jobs.add_argument(flag, dest=key, type=value_type, choices=JOB_CHOICES.get(key), default=argparse.SUPPRESS)
+    for key in ['incremental', 'stratify', 'stream']:
+        flag = '--' + key
+        jobs.add_argument(flag, dest=key, action='store_true', default=argparse.SUPPRESS)
+        jobs.add_argument('--no-' + key, dest=key, action='store_false', default=argparse.SUPPRESS)
+
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be a positive integer")
+
+    runner_keys = ['config', 'root', 'jobs', 'report', 'verbose']
+    job_settings = {key: value for key, value in vars(args).items() if key not in runner_keys}
+    return args, job_settings
+
+def load_jobs(config_path, job_settings):
+    """
+    Load the jobs of a config file
+
+    The file is either a list of jobs, or a dictionary with a 'jobs' list and
+    optional 'defaults'. Settings of a job take precedence over the command
+    line, which takes precedence over the defaults of the file.
+
+    Parameters
+    ----------
+    config_path : Path or None
+        Path to the YAML or JSON config file, or None for a single job
+    job_settings : dict
+        Job settings given on the command line
+
+    Returns
+    -------
+    list
+        Settings of every job
+
+    """
+    if config_path is None:
+        return [dict(job_settings)]
+
+    with open(config_path, 'r') as f:
+        if config_path.suffix == '.json':
+            config = json.load(f)
+        else:
+            import yaml
+            config = yaml.safe_load(f)
+
+    if isinstance(config, dict):
+        defaults = config.get('defaults', {}) or {}
+        jobs = config.get('jobs')
+    else:
+        defaults = {}
+        jobs = config
+    if not isinstance(jobs, list) or not all(isinstance(job, dict) for job in jobs):
+        raise ValueError(f"Invalid config file {config_path}. Expected a list of jobs.")
+
+    return [{**defaults, **job_settings, **job} for job in jobs]
+
+def check_job_setting(key, value):
+    """
+    Check the type and value of a job setting, as argparse does for flags
+
+    Parameters
+    ----------
+    key : str
+        Name of the setting
+    value : object
+        Value of the setting, such as read from a config file
+
+    Returns
+    -------
+    object
+        The value, integers of float settings converted to floats
+
+    """
+    value_type = JOB_ARGUMENTS.get(key, bool)
+    if value_type is float and isinstance(value, int) and not isinstance(value, bool):
+        value = float(value)
+    if not isinstance(value, value_type) or (value_type is int and isinstance(value, bool)):
+        raise ValueError(f"Invalid job setting {key} {value!r}. It must be of type {value_type.__name__}.")
+    if key in JOB_CHOICES and value not in JOB_CHOICES[key]:
+        raise ValueError(f"Invalid job setting {key} {value!r}. It must be one of {', '.join(JOB_CHOICES[key])}.")
+    return value
+
+def build_options(job, root_path, n_jobs=1):
+    """
+    Build the options of a job, as get_options does from prompts
+
+    Every setting is checked here, so invalid jobs are reported before
+    anything is written to their destination.
+
+    Parameters
+    ----------
+    job : dict
+        Settings of the job
+    root_path : Path
+        Project root, for datasets and output directories not given as paths
+    n_jobs : int, optional
+        Number of jobs run at the same time, which share the CPUs, 1 by default
+
+    Returns
+    -------
+    dict
+        A dictionary containing the options of the job
+
+    """
+    unknown = set(job) - set(JOB_ARGUMENTS) - {'incremental', 'stratify', 'stream'}
+    if unknown:
+        raise ValueError(f"Unknown job settings: {', '.join(sorted(unknown))}")
+    job = {key: check_job_setting(key, value) for key, value in job.items()}
+    if 'task' not in job:
+        raise ValueError("Missing job setting: task")
+
+    # Set mode and formats based on the selected task, as in the prompts
+    task = job['task']
+    if task == 'classify':
+        mode = 'split'
+        src_format = 'none'
+        dst_format = 'none'
+    else:
+        mode = job.get('mode', 'convert')
+        if mode not in ['convert', 'split']:
+            raise ValueError(f"Invalid mode {mode}. Mode must be 'convert' or 'split'.")
+        if 'src_format' not in job:
+            raise ValueError("Missing job setting: src_format")
+        src_format = job['src_format']
+        if mode == 'convert':
+            if 'dst_format' not in job:
+                raise ValueError("Missing job setting: dst_format")
+            dst_format = job['dst_format']
+        else:
+            dst_format = src_format
+
+    # Paths default to the datasets and output directories of the root
+    if 'src_path' in job:
+        src_path = Path(job['src_path'])
+        src_dataset = job.get('src_dataset', src_path.name)
+    elif 'src_dataset' in job:
+        src_dataset = job['src_dataset']
+        src_path = root_path / 'datasets' / src_dataset
+    else:
+        raise ValueError("Missing job setting: src_path or src_dataset")
+    if not src_path.exists():
+        raise FileNotFoundError(f"Source path {src_path} does not exist.")
+    if 'dst_path' in job:
+        dst_path = Path(job['dst_path'])
+    else:
+        dst_path = root_path / 'output' / get_dst_name(src_dataset, task, mode, src_format, dst_format)
+
+    cpus = cpu_count() or 1
+    options = {
+        'name': job.get('name', dst_path.name),
+        'src_dataset': src_dataset,
+        'task': task,
+        'mode': mode,
+        'src_format': src_format,
+        'dst_format': dst_format,
+        'root_path': root_path,
+        'src_path': src_path,
+        'dst_path': dst_path,
+        'mask_type': job.get('mask_type', 'binary'),
+        'instance_divisor': job.get('instance_divisor', INSTANCE_ID_DIVISOR),
+        'transfer': job.get('transfer', 'copy'),
+        'json_format': job.get('json_format', 'pretty'),
+        'incremental': job.get('incremental', False),
+        'workers': job.get('workers', max(1, cpus // n_jobs)),
+        'copy_threads': job.get('copy_threads', min(32, cpus + 4)),
+    }
+    if 'stream' in job:
+        options['stream'] = job['stream']
+    for key in ['tile_rows', 'contour_cache_mb', 'simplify_tolerance', 'max_vertices', 'min_area']:
+        if key in job:
+            options[key] = job[key]
+    if 'contour_cache' in job:
+        options['contour_cache'] = Path(job['contour_cache'])
+    if 'profile' in job:
+        options['profile'] = Path(job['profile'])
+    if 'profile_stage' in job:
+        options['profile_stage'] = job['profile_stage']
+    if mode == 'split':
+        options['test_train_ratio'] = job.get('test_train_ratio', 0.2)
+        options['val_ratio'] = job.get('val_ratio', 0.0)
+        options['seed'] = job.get('seed', 0)
+        options['stratify'] = job.get('stratify', False)
+        options['split_names'] = SPLIT_NAMES
+
+    # Ranges and combinations of settings, as convert and split check them
+    check_options(options)
+    return options
+
+def run_job(options, verbose=False):
+    """
+    Run a conversion or split job, catching its errors
+
+    Runs in worker processes when jobs are run at the same time
+
+    Parameters
+    ----------
+    options : dict
+        A dictionary containing the options of the job
+    verbose : bool, optional
+        Print progress messages, False by default
+
+    Returns
+    -------
+    dict
+        Name, status, exit code, time taken, and error of the job
+
+    """
+    start = perf_counter()
+    error = None
+    try:
+        prepare_dst_path(options['dst_path'], options['incremental'], verbose)
+        if options['mode'] == 'convert':
+            convert(options, verbose)
+        else:
+            split(options, verbose)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        if verbose:
+            traceback.print_exc()
+
+    return {
+        'name': options['name'],
+        'status': 'failed' if error else 'ok',
+        'exit_code': 1 if error else 0,
+        'seconds': round(perf_counter() - start, 3),
+        'error': error,
+        'src_path': str(options['src_path']),
+        'dst_path': str(options['dst_path']),
+    }
+
+def run_jobs(jobs, root_path, max_jobs=1, verbose=False):
+    """
+    Run jobs with at most max_jobs at the same time
+
+    Jobs with invalid settings fail without running, and so do jobs writing
+    to the destination of an earlier job.
+
+    Parameters
+    ----------
+    jobs : list
+        Settings of every job
+    root_path : Path
+        Project root, for datasets and output directories not given as paths
+    max_jobs : int, optional
+        Number of jobs run at the same time, 1 by default
+    verbose : bool, optional
+        Print progress messages of every job, False by default
+
+    Returns
+    -------
+    list
+        Result of every job, in job order
+
+    """
+    n_jobs = min(max_jobs, len(jobs)) or 1
+    results = [None] * len(jobs)
+    runnable = {}
+    dst_paths = {}
+    for index, job in enumerate(jobs):
+        try:
+            options = build_options(job, root_path, n_jobs)
+            dst_path = options['dst_path'].resolve()
+            if dst_path in dst_paths:
+                raise ValueError(f"Destination {options['dst_path']} is also written by job {dst_paths[dst_path] + 1}")
+            dst_paths[dst_path] = index
+            runnable[index] = options
+        except Exception as e:
+            results[index] = {
+                'name': job.get('name', f'job {index + 1}'),
+                'status': 'invalid',
+                'exit_code': 2,
+                'seconds': 0.0,
+                'error': f"{type(e).__name__}: {e}",
+            }
+            print_result(index, results[index])
+
+    if n_jobs > 1 and len(runnable) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = {executor.submit(run_job, options, verbose): index for index, options in runnable.items()}
+            for future in as_completed(futures):
+                index = futures[future]
+                results[index] = future.result()
+                print_result(index, results[index])
+    else:
+        for index, options in runnable.items():
+            results[index] = run_job(options, verbose)
+            print_result(index, results[index])
+
+    return results
+
+def print_result(index, result):
+    print(f"[{index + 1}] {result['name']}: {result['status']} in {result['seconds']:.2f}s"
+          f"{' - ' + result['error'] if result['error'] else ''}")
+
+def print_report(results, elapsed):
+    """
+    Print the status and time taken of every job
+
+    Parameters
+    ----------
+    results : list
+        Result of every job
+    elapsed : float
+        Total time taken in seconds
+
+    """
+    width = max([len(result['name']) for result in results] + [4])
+    print(f"\n{'job':<{width}}  {'status':<8}{'exit':>5}{'time':>10}")
+    for result in results:
+        print(f"{result['name']:<{width}}  {result['status']:<8}{result['exit_code']:>5}{result['seconds']:>9.2f}s")
+    n_ok = sum(result['exit_code'] == 0 for result in results)
+    print(f"{n_ok} of {len(results)} jobs succeeded in {elapsed:.2f}s")
+
+def main(argv=None):
+    """
+    Run the jobs given on the command line or in a config file
+
+    Returns
+    -------
+    int
+        0 if every job succeeded, 1 otherwise
+
+    """
+    args, job_settings = parse_args(argv)
+    jobs = load_jobs(args.config, job_settings)
+
+    start = perf_counter()
+    results = run_jobs(jobs, get_root_path(args.root), args.jobs, args.verbose)
+    elapsed = perf_counter() - start
+    print_report(results, elapsed)
+
+    if args.report is not None:
+        with open(args.report, 'w') as f:
+            json.dump({'seconds': round(elapsed, 3), 'jobs': results}, f, indent=4)
+
+    return 0 if all(result['exit_code'] == 0 for result in results) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,261 @@
+from pathlib import Path
+import json
+import os
+
+import numpy as np
+
+from logger import LOGGER
+from manifest import hash_file, hash_bytes
+
+# Default size limit of a contour cache in megabytes
+CONTOUR_CACHE_MB = 1024
+# Changes whenever extraction or the entry layout changes, so older entries are never read
+CONTOUR_CACHE_VERSION = 1
+CACHE_ENTRY_SUFFIX = '.npy'
+
+def pack_contours(result, grouped):
+    # One int32 array: contour count, class of every contour, offsets, then coordinates
+    groups = result if grouped else [(0, result)]
+    classes = [class_id for class_id, contours in groups for _ in contours]
+    contours = [contour.ravel() for _, group in groups for contour in group]
+    offsets = np.cumsum([0] + [len(contour) for contour in contours])
+    coords = np.concatenate(contours) if contours else np.empty(0, dtype=np.int32)
+    return np.concatenate(([len(contours)], classes, offsets, coords)).astype(np.int32)
+
+def unpack_contours(packed, grouped):
+    n = int(packed[0])
+    classes = packed[1:n + 1]
+    offsets = packed[n + 1:2 * n + 2]
+    coords = packed[2 * n + 2:]
+    contours = [coords[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+    if not grouped:
+        return contours
+
+    # Contours of a class are consecutive, in the order of the extracted groups
+    groups = []
+    for class_id, contour in zip(classes.tolist(), contours):
+        if not groups or groups[-1][0] != class_id:
+            groups.append((class_id, []))
+        groups[-1][1].append(contour)
+    return groups
+
+def iter_cached_results(cache, keys, missing, masks, extracted, extract, grouped=False):
+    """
+    Merge cached contours and contours extracted from the missing masks
+
+    Cached contours are only loaded when their turn comes, so one entry is
+    in memory at a time, and extracted contours are stored in the cache as
+    they come. Entries evicted by another job since they were found are
+    extracted again with extract.
+
+    Parameters
+    ----------
+    cache : ContourCache
+        Cache the contours are read from and stored in
+    keys : list
+        Key of every mask
+    missing : list
+        Whether every mask is missing from the cache, see ContourCache.find_missing
+    masks : list
+        Path to every mask
+    extracted : iterable
+        Contours extracted from the missing masks, in the same order
+    extract : function
+        Extraction of the contours of a mask
+    grouped : bool, optional
+        Contours are (class index, contours) groups, False by default
+
+    Yields
+    ------
+    list
+        Contours of every mask, in order
+
+    """
+    extracted = iter(extracted)
+    for key, is_missing, mask in zip(keys, missing, masks):
+        result = None if is_missing else cache.get(key, grouped)
+        if result is None:
+            result = next(extracted) if is_missing else extract(mask)
+            cache.put(key, result, grouped)
+        yield result
+
+class ContourCacheStats:
+    """
+    Hits, misses, and evictions of a contour cache
+
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.bytes_written = 0
+        self.evicted = 0
+        self.bytes_evicted = 0
+        self.entries = 0
+        self.size = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def log(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        LOGGER.info(f"Contour cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1%} hit rate), "
+                    f"{self.bytes_written} bytes written, {self.evicted} entries evicted, "
+                    f"{self.entries} entries of {self.size / 1024 ** 2:.1f} MB kept")
+
+class ContourCache:
+    """
+    On-disk cache of the contours extracted from masks
+
+    Entries are keyed by the content hash of the mask and the options of the
+    extraction, so renamed or touched masks still hit and changed masks miss.
+    Every entry is its own file, written atomically, and its modification time
+    is its last use, so jobs can share a cache without a lock. Least recently
+    used entries are evicted when the cache is trimmed to its size limit.
+
+    Parameters
+    ----------
+    cache_path : Path
+        Directory of the cache, created if needed
+    max_mb : int, optional
+        Size limit of the cache in megabytes, CONTOUR_CACHE_MB by default
+
+    """
+    def __init__(self, cache_path, max_mb=CONTOUR_CACHE_MB):
+        self.path = Path(cache_path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_mb * 1024 ** 2
+        self.stats = ContourCacheStats()
+
+    def get_key(self, mask, **params):
+        """
+        Get the key of the contours of a mask extracted with some options
+
+        Parameters
+        ----------
+        mask : Path
+            Path to the mask file
+        **params
+            Options changing the extracted contours
+
+        Returns
+        -------
+        str
+            Hexadecimal key of the entry
+
+        """
+        params = json.dumps(params, sort_keys=True)
+        return hash_bytes(f'{CONTOUR_CACHE_VERSION}:{hash_file(mask)}:{params}'.encode())
+
+    def find_missing(self, keys):
+        """
+        Find the keys without an entry, without loading the others
+
+        Keys without an entry are counted as misses, the others as hits or
+        misses when get loads them.
+
+        Parameters
+        ----------
+        keys : list
+            Keys of the entries
+
+        Returns
+        -------
+        list
+            Whether every key is missing from the cache
+
+        """
+        missing = [not (self.path / f'{key}{CACHE_ENTRY_SUFFIX}').is_file() for key in keys]
+        self.stats.misses += sum(missing)
+        return missing
+
+    def get(self, key, grouped=False):
+        """
+        Load the contours of an entry and mark it as used
+
+        Parameters
+        ----------
+        key : str
+            Key of the entry
+        grouped : bool, optional
+            Contours are (class index, contours) groups, as extracted from
+            indexed and instance masks, rather than a list, False by default
+
+        Returns
+        -------
+        list or None
+            Contours of the entry, None if it is not cached
+
+        """
+        entry_path = self.path / f'{key}{CACHE_ENTRY_SUFFIX}'
+        try:
+            packed = np.load(entry_path)
+            os.utime(entry_path)
+        except (FileNotFoundError, ValueError, OSError):
+            # Missing, evicted by another job, or truncated entries are misses
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return unpack_contours(packed, grouped)
+
+    def put(self, key, result, grouped=False):
+        """
+        Store the contours of an entry
+
+        Parameters
+        ----------
+        key : str
+            Key of the entry
+        result : list
+            Contours extracted from the mask
+        grouped : bool, optional
+            Contours are (class index, contours) groups, False by default
+
+        """
+        entry_path = self.path / f'{key}{CACHE_ENTRY_SUFFIX}'
+        tmp_path = entry_path.with_name(f'{key}.{os.getpid()}.tmp')
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.save(f, pack_contours(result, grouped))
+            self.stats.bytes_written += tmp_path.stat().st_size
+            os.replace(tmp_path, entry_path)
+        finally:
+            # Left behind only if writing or renaming failed
+            tmp_path.unlink(missing_ok=True)
+
+    def trim(self):
+        """
+        Evict the least recently used entries until the cache fits its size limit
+
+        Returns
+        -------
+        ContourCacheStats
+            Statistics of the cache, with the entries and size left
+
+        """
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(CACHE_ENTRY_SUFFIX):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        entries.sort()
+        evicted = 0
+        while evicted < len(entries) and size > self.max_bytes:
+            _, entry_size, entry_path = entries[evicted]
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+            evicted += 1
+            self.stats.bytes_evicted += entry_size
+
+        self.stats.evicted += evicted
+        self.stats.entries = len(entries) - evicted
+        self.stats.size = size
+        return self.stats
@@ -1,19 +1,36 @@
 from random import randint
-import json
+from pathlib import Path
+import numpy as np
 
 from converter_utils import (
     copy_images, 
     write_yolo_yaml, 
-    initialize_yolo_labels,
+    write_yolo_labels,
     process_coco,
     validate_options,
     process_bin,
+    process_yolo,
+    read_yolo_yaml,
+    find_yolo_yaml,
+    find_yolo_splits,
+    find_masks,
+    STREAM_MIN_SIZE,
+    INSTANCE_ID_DIVISOR,
 )
+from annotation_table import AnnotationTable, iter_annotation_batches
+from json_utils import write_json_stream
+from manifest import Manifest
+from contour_cache import ContourCache, CONTOUR_CACHE_MB
+from logger import LOGGER, Progress
+from profiler import Profiler, get_profile_path
+from polygon_utils import simplify_annotations, SimplifyStats
+from rle_utils import convert_rle_segmentations, rle_to_polygons
+
+# Number of annotations converted at a time, bounds memory when annotations are streamed
+ANNOTATION_BATCH_SIZE = 10000
 
 # TODO: ***VERY IMPORTANT***
 #       REFACTOR SOME MORE AND CLEAN UP THE CODE
-#       REDO CONVERTER 
-#           YOLO11 -> COCO
 #       WRITE LOGGING 
 #       WRITE EXCEPTION ONLY FOR USER'S ERROR
 #       WRITE COMMENTS AND DOCSTRING
@@ -23,6 +40,15 @@ def from_bin(opt, verbose=True):
 
     src_path = opt.get('src_path')
     dst_path = opt.get('dst_path')
+    workers = opt.get('workers', 1)
+    mask_type = opt.get('mask_type', 'binary')
+    instance_divisor = opt.get('instance_divisor', INSTANCE_ID_DIVISOR)
+    tile_rows = opt.get('tile_rows')
+
+    # Contours of masks unchanged since a previous conversion are read from the cache
+    cache = None
+    if opt.get('contour_cache') is not None:
+        cache = ContourCache(opt['contour_cache'], opt.get('contour_cache_mb', CONTOUR_CACHE_MB))
 
     # find images and masks directory
     images_path = src_path / 'images'
@@ -34,15 +60,29 @@ def from_bin(opt, verbose=True):
 
     # check if images are split into train, validation, and test sets, and create directory structure
     splits = []
+    sources = {}
     for split in images_path.iterdir(): 
-        key, images, categories, annotations = process_bin(dst_path, images_path, masks_path, split, verbose)
+        key, images, categories, annotations = process_bin(dst_path, images_path, masks_path, split, verbose, workers,
+                                                           mask_type, instance_divisor, tile_rows, cache)
         splits.append({key: {'images': images, 'categories': categories, 'annotations': annotations}})
+
+        # Annotations of a split come from its images and masks
+        split_name = split.name if split.is_dir() else ''
+        sources[key] = [images_path / split_name / image['file_name'] for image in images]
+        sources[key] += [mask for _, mask in find_masks(masks_path, split_name, mask_type)[1]]
+
         if not split.is_dir():
             break
 
+    if cache is not None:
+        cache.trim()
+        if verbose:
+            cache.stats.log()
+
     coco_dict = {
         'options': opt,
-        'splits': splits
+        'splits': splits,
+        'sources': sources
     }
 
     return coco_dict
@@ -51,6 +91,7 @@ def from_coco(opt, verbose=True):
     src_path = opt.get('src_path')
     dst_path = opt.get('dst_path')
     src_dataset = opt.get('src_dataset')
+    stream = opt.get('stream', None)
 
     #find COCO json files
     json_paths = list(src_path.rglob('*.json')) 
@@ -58,21 +99,53 @@ def from_coco(opt, verbose=True):
         raise FileNotFoundError(f"No JSON files found in {src_path}")
 
     splits = []
+    sources = {}
     for json_path in json_paths:
-        key, images, categories, annotations = process_coco(dst_path, src_dataset, json_path, verbose)
+        # Stream large files unless streaming is explicitly set
+        stream_json = stream if stream is not None else json_path.stat().st_size >= STREAM_MIN_SIZE
+        key, images, categories, annotations = process_coco(dst_path, src_dataset, json_path, verbose, stream_json)
         splits.append({key: {'images': images, 'categories': categories, 'annotations': annotations}})
+        sources[key] = [json_path]
 
     coco_dict = {
         'options': opt,
-        'splits': splits
+        'splits': splits,
+        'sources': sources
     }
 
     return coco_dict
 
 def from_yolo(opt, verbose=True):
-    pass
+    src_path = opt.get('src_path')
+    dst_path = opt.get('dst_path')
+    workers = opt.get('workers', 1)
+
+    # find the dataset YAML file for the category names
+    categories = read_yolo_yaml(find_yolo_yaml(src_path))
+
+    # check if images are split into train, validation, and test sets, as written by to_yolo
+    split_paths = find_yolo_splits(src_path)
+
+    splits = []
+    sources = {}
+    for key, split_path in split_paths.items():
+        key, images, categories, annotations = process_yolo(dst_path, split_path, categories, key, verbose, workers)
+        splits.append({key: {'images': images, 'categories': categories, 'annotations': annotations}})
+
+        # Annotations of a split come from its images and label files
+        sources[key] = [split_path / 'images' / image['file_name'] for image in images]
+        if (split_path / 'labels').is_dir():
+            sources[key] += sorted((split_path / 'labels').glob('*.txt'))
 
-def convert_to_yolo(annotation, image_dict, dst_path, split_name, task, verbose):
+    coco_dict = {
+        'options': opt,
+        'splits': splits,
+        'sources': sources
+    }
+
+    return coco_dict
+
+def convert_to_yolo(annotation, image_dict, dst_path, split_name, task):
     
     image_id = annotation.get('image_id')
     cat_id = annotation.get('category_id') - 1
@@ -83,13 +156,10 @@ def convert_to_yolo(annotation, image_dict, dst_path, split_name, task, verbose)
     
     img_width = image['width']
     img_height = image['height']
-    image_name = image['file_name'].stem
+    image_name = Path(image['file_name']).stem
 
     yolo_txt_path = dst_path / split_name / 'labels' / f'{image_name}.txt'
 
-    if verbose:
-        print(f"\r...Converting annotation #{annotation['id']} for image #{image_id}: {image_name}    ", end='')
-
     if task == 'detect':
         # Convert bounding box annotations
         min_x, min_y, ann_width, ann_height = annotation['bbox']
@@ -101,8 +171,10 @@ def convert_to_yolo(annotation, image_dict, dst_path, split_name, task, verbose)
         yolo_ann = f"{cat_id} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}\n"
 
     elif task == 'segment':
-        # Convert segmentation annotations
+        # Convert segmentation annotations, RLEs are traced to their joined contours
         segmentation = annotation['segmentation']
+        if isinstance(segmentation, dict):
+            segmentation = rle_to_polygons([segmentation])[0].tolist()
         if len(segmentation) == 1:
             segmentation = segmentation[0]
         if not segmentation:
@@ -117,10 +189,7 @@ def convert_to_yolo(annotation, image_dict, dst_path, split_name, task, verbose)
 
     return yolo_ann, yolo_txt_path
 
-def convert_to_cira(ann, categories, colors, task, verbose):
-    if verbose:
-        print("\rProcessing annotations " + str(ann.get('id')) + " ...", end='')
-
+def convert_to_cira(ann, categories, colors, task):
     bbox_coords = ann.get('bbox')
     x = int(bbox_coords[0])
     y = int(bbox_coords[1])
@@ -136,13 +205,15 @@ def convert_to_cira(ann, categories, colors, task, verbose):
     color = f"{rgb[0]}, {rgb[1]}, {rgb[2]}"
     if task == 'segment':
         segmentation = ann.get('segmentation')
+        if isinstance(segmentation, dict):
+            segmentation = rle_to_polygons([segmentation])[0].tolist()
         if len(segmentation) == 1:
             segmentation = segmentation[0]
         if not segmentation:
             raise ValueError(f"Segmentation data missing for annotation {ann['id']}")
-        
-        if len(segmentation) % 2 != 0:
-            landmark.append(landmark[-2])
+
+        # An unpaired last coordinate is dropped, as get_polygon_points does
+        segmentation = segmentation[:len(segmentation) - len(segmentation) % 2]
         landmark_len = len(segmentation)//2
         landmark = ",".join([f"{segmentation[i]}:{segmentation[i+1]}" for i in range(0, len(segmentation), 2)]) + ","
     else:
@@ -159,6 +230,240 @@ def convert_to_cira(ann, categories, colors, task, verbose):
         'landmark_len': landmark_len
     }
 
+def convert_split_to_yolo(annotations, image_dict, task):
+    """
+    Convert all annotations of a split to YOLO format in batched NumPy arrays
+
+    Produces the same lines as calling convert_to_yolo on each annotation,
+    the polygons of an annotation with several of them are joined. RLE
+    segmentations are traced to polygons together, see rle_to_polygons.
+
+    Parameters
+    ----------
+    annotations : AnnotationTable
+        Table of COCO annotations in the split
+    image_dict : dict
+        A dictionary mapping image IDs to image data
+    task : str
+        Task to perform, 'detect' or 'segment'
+
+    Returns
+    -------
+    list
+        YOLO annotation lines, in the same order as the annotations
+
+    """
+    if not len(annotations):
+        return []
+
+    # Gather the size of the image of every annotation
+    img_sizes = []
+    for image_id in annotations.image_ids.tolist():
+        image = image_dict.get(image_id, None)
+        if image is None:
+            raise ValueError(f"Image with ID {image_id} not found.")
+        img_sizes.append((image['width'], image['height']))
+
+    img_sizes = np.array(img_sizes, dtype=np.float64)
+    cat_ids = (annotations.category_ids - 1).tolist()
+
+    if task == 'detect':
+        # Clip boxes to the image and normalize to center format
+        min_x, min_y, ann_width, ann_height = annotations.bboxes.astype(np.float64).T
+        img_width, img_height = img_sizes.T
+        width = np.minimum(ann_width, img_width - min_x) / img_width
+        height = np.minimum(ann_height, img_height - min_y) / img_height
+        x_center = min_x / img_width + width / 2
+        y_center = min_y / img_height + height / 2
+
+        rows = np.column_stack((x_center, y_center, width, height)).tolist()
+        return [
+            "%d %.6f %.6f %.6f %.6f\n" % (cat_id, *row)
+            for cat_id, row in zip(cat_ids, rows)
+        ]
+
+    coords, lengths = get_polygon_points(convert_rle_segmentations(annotations))
+
+    # Normalize every polygon point of the split at once
+    points = coords.astype(np.float64).reshape(-1, 2)
+    points /= np.repeat(img_sizes, lengths, axis=0)
+    values = points.ravel().tolist()
+
+    yolo_anns = []
+    offset = 0
+    for cat_id, n_points in zip(cat_ids, lengths.tolist()):
+        end = offset + 2 * n_points
+        yolo_anns.append(f"{cat_id} " + ("%.6f %.6f " * n_points) % tuple(values[offset:end]) + "\n")
+        offset = end
+
+    return yolo_anns
+
+def get_polygon_points(annotations):
+    """
+    Get the polygon coordinates of every annotation of a table as whole points
+
+    Parameters
+    ----------
+    annotations : AnnotationTable
+        Table of COCO annotations
+
+    Returns
+    -------
+    ndarray
+        Flat coordinates of all annotations, without an unpaired last coordinate
+    ndarray
+        Number of points of each annotation
+
+    """
+    starts, ends = annotations.annotation_ranges()
+    lengths = ends - starts
+    if (lengths == 0).any():
+        raise ValueError(f"Segmentation data missing for annotation {annotations.ids[lengths == 0][0]}")
+
+    # Drop the last coordinate of annotations with an odd number of them
+    coords = annotations.coords
+    odd = lengths % 2 == 1
+    if odd.any():
+        keep = np.ones(len(coords), dtype=bool)
+        keep[ends[odd] - 1] = False
+        coords = coords[keep]
+
+    return coords, lengths // 2
+
+def convert_split_to_cira(annotations, categories, colors, task):
+    """
+    Convert all annotations of a split to CiRA format in batched NumPy arrays
+
+    Produces the same objects as calling convert_to_cira on each annotation,
+    the polygons of an annotation with several of them are joined. RLE
+    segmentations are traced to polygons together, see rle_to_polygons.
+
+    Parameters
+    ----------
+    annotations : AnnotationTable
+        Table of COCO annotations in the split
+    categories : list
+        List of categories in the dataset
+    colors : list
+        List of RGB colors, one per category
+    task : str
+        Task to perform, 'detect' or 'segment'
+
+    Returns
+    -------
+    list
+        CiRA objects, in the same order as the annotations
+
+    """
+    if not len(annotations):
+        return []
+
+    # Truncate boxes to integers and compute their centers
+    bboxes = annotations.bboxes.astype(np.int64)
+    centers = bboxes[:, :2] + bboxes[:, 2:] // 2
+
+    labels = [category.get('name') for category in categories]
+    color_strs = [f"{rgb[0]}, {rgb[1]}, {rgb[2]}" for rgb in colors]
+
+    if task == 'segment':
+        coords, lengths = get_polygon_points(convert_rle_segmentations(annotations))
+        values = coords.tolist()
+        landmark_lens = lengths.tolist()
+    else:
+        landmark_lens = [0] * len(annotations)
+
+    cira_anns = []
+    offset = 0
+    for label_index, bbox, center, landmark_len in zip(
+        (annotations.category_ids - 1).tolist(), bboxes.tolist(), centers.tolist(), landmark_lens
+    ):
+        if task == 'segment':
+            end = offset + 2 * landmark_len
+            landmark = ("%s:%s," * landmark_len) % tuple(values[offset:end])
+            offset = end
+        else:
+            landmark = ""
+
+        cira_anns.append({
+            'bbox': "%d, %d, %d, %d" % tuple(bbox),
+            'center': "%d, %d" % tuple(center),
+            'color': color_strs[label_index],
+            'label': labels[label_index],
+            'label_index': label_index,
+            'landmark': landmark,
+            'landmark_len': landmark_len
+        })
+
+    return cira_anns
+
+def iter_converted(annotations, convert_split, *args, progress=None):
+    """
+    Convert annotations in batches with a batched conversion function
+
+    Parameters
+    ----------
+    annotations : AnnotationTable or JsonArrayStream
+        Annotations of the split
+    convert_split : function
+        Batched conversion function, called with a table of a batch and args
+    *args
+        Additional arguments of convert_split
+    progress : Progress, optional
+        Progress of the stage, updated after every batch
+
+    Yields
+    ------
+    int
+        Image ID of the annotation
+    object
+        Converted annotation
+
+    """
+    for batch in iter_annotation_batches(annotations, ANNOTATION_BATCH_SIZE):
+        yield from zip(batch.image_ids.tolist(), convert_split(batch, *args))
+        if progress is not None:
+            progress.update(len(batch))
+
+def group_cira_annotations(images, converted):
+    """
+    Group CiRA objects into per-image entries in a single pass
+
+    Parameters
+    ----------
+    images : list
+        List of images in the dataset
+    converted : iterable
+        Pairs of image IDs and CiRA objects
+
+    Returns
+    -------
+    list
+        CiRA entries with the file name and objects of each image, in image order
+
+    """
+    # Index entries by image ID and by file name, images sharing a file name share objects
+    cira_list = []
+    filename_index = {}
+    image_index = {}
+    for image in images:
+        entry = {
+            'filename': image.get('file_name'),
+            'obj_array': []
+        }
+        cira_list.append(entry)
+        image_index[image['id']] = filename_index.setdefault(entry['filename'], [])
+        image_index[image['id']].append(entry)
+
+    for image_id, cira_ann in converted:
+        entries = image_index.get(image_id, None)
+        if entries is None:
+            raise ValueError(f"Image with ID {image_id} not found.")
+
+        for entry in entries:
+            entry['obj_array'].append(cira_ann)
+
+    return cira_list
+
 def to_yolo(coco_dict, verbose=True):
     opt = coco_dict.get('options')
     splits = coco_dict.get('splits')
@@ -166,6 +471,10 @@ def to_yolo(coco_dict, verbose=True):
     src_format = opt.get('src_format')
     src_path = opt.get('src_path')
     dst_path = opt.get('dst_path')
+    transfer = opt.get('transfer', 'copy')
+    copy_threads = opt.get('copy_threads', 1)
+    manifest = coco_dict.get('manifest')
+    profiler = coco_dict.get('profiler') or Profiler()
     src_dataset = opt.get('src_dataset')
     task = opt.get('task')
 
@@ -179,7 +488,9 @@ def to_yolo(coco_dict, verbose=True):
             else: 
                 split_name = key
 
-            if src_format in ['bin', 'yolo']:
+            if src_format == 'bin':
+                images_path = src_path / 'images' / split_name
+            elif src_format == 'yolo':
                 images_path = src_path / split_name / 'images'
             else:
                 images_path = src_path / split_name
@@ -192,33 +503,45 @@ def to_yolo(coco_dict, verbose=True):
             categories = data.get('categories')
             annotations = data.get('annotations')
 
-            initialize_yolo_labels(dst_path / split_name, images, verbose)
-            
-            copy_images(images_path, dst_path / split_name / 'images', images, verbose)
+            with profiler.stage('copy') as stats:
+                n_bytes = copy_images(images_path, dst_path / split_name / 'images', images, verbose, transfer, copy_threads, manifest)
+                stats.add(len(images) if transfer != 'skip' else 0, n_bytes, n_bytes)
 
             image_dict = {image['id']: image for image in images} # Create a dictionary to map image IDs to image data
 
-            # Convert COCO annotations to YOLO format
-            for ann in annotations:
-                yolo_ann, yolo_txt_path = convert_to_yolo(ann, image_dict, dst_path, split_name, task, verbose)
-
-                # Write YOLO annotation to file
-                with open(yolo_txt_path, 'a') as f:
-                    f.write(yolo_ann)
-            if verbose:
-                print()
-
-    write_yolo_yaml(dst_path, src_dataset, src_split, categories)
+            # Convert COCO annotations to YOLO format, grouped by image
+            labels = {image['id']: [] for image in images}
+            total = len(annotations) if isinstance(annotations, AnnotationTable) else None
+            with profiler.stage('convert') as stats, Progress(f"Converting {key} annotations to YOLO", total, verbose, 'annotations') as progress:
+                for image_id, yolo_ann in iter_converted(annotations, convert_split_to_yolo, image_dict, task, progress=progress):
+                    labels[image_id].append(yolo_ann)
+                stats.add(progress.count)
+
+            # Write every YOLO label file once, including empty ones
+            with profiler.stage('write') as stats:
+                n_files, n_bytes = write_yolo_labels(dst_path / split_name, images, labels, verbose, manifest)
+                stats.add(n_files, bytes_written=n_bytes)
+
+    with profiler.stage('write'):
+        write_yolo_yaml(dst_path, src_dataset, src_split, categories)
+    if manifest is not None:
+        manifest.record_output(dst_path / f'{src_dataset}.yaml')
     if verbose:
-        print("Conversion completed successfully.")
+        LOGGER.info("Conversion completed successfully.")
 
 def to_cira(coco_dict, verbose=True):
     opt = coco_dict.get('options')
     splits = coco_dict.get('splits')
+    sources = coco_dict.get('sources', {})
 
     src_format = opt.get('src_format')
     src_path = opt.get('src_path')
     dst_path = opt.get('dst_path')
+    transfer = opt.get('transfer', 'copy')
+    copy_threads = opt.get('copy_threads', 1)
+    json_format = opt.get('json_format', 'pretty')
+    manifest = coco_dict.get('manifest')
+    profiler = coco_dict.get('profiler') or Profiler()
     src_dataset = opt.get('src_dataset')
     task = opt.get('task')
 
@@ -229,7 +552,9 @@ def to_cira(coco_dict, verbose=True):
             else: 
                 split_name = key
 
-            if src_format in ['bin', 'yolo']:
+            if src_format == 'bin':
+                images_path = src_path / 'images' / split_name
+            elif src_format == 'yolo':
                 images_path = src_path / split_name / 'images'
             else:
                 images_path = src_path / split_name
@@ -243,42 +568,42 @@ def to_cira(coco_dict, verbose=True):
 
             colors = [[randint(0, 255), randint(0, 255), randint(0, 255)] for i in range(len(categories))]
 
-            cira_list = []
-            for image in images:
-                cira_list.append({
-                    'filename': image.get('file_name'),
-                    'obj_array': []
-                })
-
-            copy_images(images_path, dst_path / split_name / 'images', images, verbose)
-
-            image_dict = {image['id']: image for image in images} # Create a dictionary to map image IDs to image data
-
-            for ann in annotations:
-                image_id = ann.get('image_id')
-
-                image = image_dict.get(image_id, None)
-                if image is None:
-                    raise ValueError(f"Image with ID {image_id} not found.")
-                
-                image_name = image['file_name']
-
-                for file in cira_list:
-                    if file['filename'] == image_name:
-                        file['obj_array'].append(convert_to_cira(ann, categories, colors, task, verbose))
-                
-            if verbose:
-                print()
-            with open(dst_path / split_name / f'{src_dataset}.gt', "w") as outfile:
-                json.dump(cira_list, outfile, indent=4)
+            with profiler.stage('copy') as stats:
+                n_bytes = copy_images(images_path, dst_path / split_name / 'images', images, verbose, transfer, copy_threads, manifest)
+                stats.add(len(images) if transfer != 'skip' else 0, n_bytes, n_bytes)
+
+            # Keep the CiRA file of an incremental conversion if its sources did not change
+            gt_path = dst_path / split_name / f'{src_dataset}.gt'
+            split_sources = sources.get(key, [])
+            if manifest is not None:
+                current = manifest.output_current(gt_path, split_sources)
+                manifest.record_output(gt_path, split_sources)
+                if current:
+                    continue
+
+            total = len(annotations) if isinstance(annotations, AnnotationTable) else None
+            with profiler.stage('convert') as stats, Progress(f"Converting {key} annotations to CiRA", total, verbose, 'annotations') as progress:
+                converted = iter_converted(annotations, convert_split_to_cira, categories, colors, task, progress=progress)
+                cira_list = group_cira_annotations(images, converted)
+                stats.add(progress.count)
+
+            with profiler.stage('write') as stats:
+                write_json_stream(gt_path, cira_list, json_format)
+                stats.add(1, bytes_written=gt_path.stat().st_size)
 
 def to_coco(coco_dict, verbose=True):
     opt = coco_dict.get('options')
     splits = coco_dict.get('splits')
+    sources = coco_dict.get('sources', {})
 
     src_format = opt.get('src_format')
     src_path = opt.get('src_path')
     dst_path = opt.get('dst_path')
+    transfer = opt.get('transfer', 'copy')
+    copy_threads = opt.get('copy_threads', 1)
+    json_format = opt.get('json_format', 'pretty')
+    manifest = coco_dict.get('manifest')
+    profiler = coco_dict.get('profiler') or Profiler()
 
     for split in splits:
         for key, data in split.items():
@@ -287,7 +612,9 @@ def to_coco(coco_dict, verbose=True):
             else: 
                 split_name = key
 
-            if src_format in ['bin', 'yolo']:
+            if src_format == 'bin':
+                images_path = src_path / 'images' / split_name
+            elif src_format == 'yolo':
                 images_path = src_path / split_name / 'images'
             else:
                 images_path = src_path / split_name
@@ -296,10 +623,23 @@ def to_coco(coco_dict, verbose=True):
 
             images = data.get('images')
 
-            copy_images(images_path, dst_path / split_name, images, verbose)
+            with profiler.stage('copy') as stats:
+                n_bytes = copy_images(images_path, dst_path / split_name, images, verbose, transfer, copy_threads, manifest)
+                stats.add(len(images) if transfer != 'skip' else 0, n_bytes, n_bytes)
+
+            # Keep the COCO file of an incremental conversion if its sources did not change
+            json_path = dst_path / split_name / f'_annotations.coco.json'
+            split_sources = sources.get(key, [])
+            if manifest is not None:
+                current = manifest.output_current(json_path, split_sources)
+                manifest.record_output(json_path, split_sources)
+                if current:
+                    continue
 
-            with open(dst_path / split_name / f'_annotations.coco.json', "w") as outfile:
-                json.dump(data, outfile, indent=4)
+            # Streamed annotations are read from the source while they are written
+            with profiler.stage('write') as stats:
+                write_json_stream(json_path, data, json_format)
+                stats.add(1, bytes_written=json_path.stat().st_size)
 
 def convert(opt, verbose=True):
 
@@ -318,5 +658,47 @@ def convert(opt, verbose=True):
         }
     }
         
-    converters['to'][opt['dst_format']](converters['from'][opt['src_format']](opt, verbose))
+    # Track sources and outputs to only redo what changed since the previous run
+    manifest = Manifest(opt['dst_path'], opt) if opt.get('incremental', False) else None
+
+    # Time every stage, and profile one of them if asked to
+    report_path = opt.get('profile')
+    profile_stage = opt.get('profile_stage')
+    profiler = Profiler(profile_stage, get_profile_path(report_path, profile_stage) if profile_stage else None)
+
+    with profiler.stage('ingest') as stats:
+        coco_dict = converters['from'][opt['src_format']](opt, verbose)
+        stats.add(sum(len(data['images']) for split in coco_dict['splits'] for data in split.values()),
+                  bytes_read=get_sources_size(coco_dict['sources']))
+
+    # Simplify polygons and drop speckles, streamed annotations are simplified while they are converted
+    tolerance = opt.get('simplify_tolerance', 0.0) or 0.0
+    max_vertices = opt.get('max_vertices')
+    min_area = opt.get('min_area', 0.0) or 0.0
+    simplify_stats = None
+    if tolerance > 0 or max_vertices is not None or min_area > 0:
+        simplify_stats = SimplifyStats()
+        with profiler.stage('simplify') as simplify_stage:
+            for split in coco_dict['splits']:
+                for data in split.values():
+                    data['annotations'] = simplify_annotations(data['annotations'], tolerance, max_vertices, min_area, simplify_stats)
+
+    coco_dict['manifest'] = manifest
+    coco_dict['profiler'] = profiler
+    converters['to'][opt['dst_format']](coco_dict, verbose)
+
+    if simplify_stats is not None:
+        simplify_stage.add(simplify_stats.polygons_in, simplify_stats.bytes_in, simplify_stats.bytes_out)
+        if verbose:
+            simplify_stats.log()
+
+    if manifest is not None:
+        manifest.remove_stale(verbose)
+        manifest.save()
+    if report_path is not None:
+        profiler.write_report(report_path, verbose)
+
+def get_sources_size(sources):
+    # Size of the source files of every split, images count in full even if only their header is read
+    return sum(Path(path).stat().st_size for paths in sources.values() for path in paths)
 
@@ -1,6 +1,51 @@
 from pathlib import Path
 from shutil import copy
-import json, yaml, cv2
+import errno
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from collections import deque
+import json
+import numpy as np
+
+from image_utils import get_image_size
+from json_utils import iter_json_arrays, JsonArrayStream, JSON_FORMATS, orjson
+from manifest import hash_bytes
+from annotation_table import AnnotationTable
+from logger import LOGGER, Progress
+from profiler import PROFILE_STAGES
+from tile_utils import find_tiled_contours
+from contour_cache import iter_cached_results, CONTOUR_CACHE_MB
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# cv2 and yaml are slow to import and only needed for masks and YOLO datasets,
+# so they are imported by the functions using them
+
+# Strategies for transferring images to the destination
+TRANSFER_MODES = ['copy', 'hardlink', 'symlink', 'reflink', 'skip']
+# ioctl request cloning a file on Linux, see ioctl_ficlone(2)
+FICLONE = 0x40049409
+# Errors of linking that fall back to a copy, such as crossing devices
+LINK_FALLBACK_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS}
+
+# COCO JSON files at least this large are streamed unless the stream option is set
+STREAM_MIN_SIZE = 512 * 1024 ** 2
+
+# Kinds of masks of the bin format: one binary mask per category, one mask of
+# class indices per image, or one mask of instance IDs per image
+MASK_TYPES = ['binary', 'indexed', 'instance']
+# Instance IDs of instance masks are class index * INSTANCE_ID_DIVISOR + instance,
+# smaller values are class indices of pixels without instances
+INSTANCE_ID_DIVISOR = 1000
+# Category names of indexed and instance masks, one per line for class indices 1, 2, ...
+MASK_CLASSES_FILE = 'classes.txt'
+
+# Key order of annotations extracted from masks and YOLO labels
+EXTRACTED_ANNOTATION_FIELDS = ['id', 'image_id', 'bbox', 'area', 'iscrowd', 'category_id', 'segmentation']
 
 #this needs reorganizing
 #maybe move process functions back to converter
@@ -35,48 +80,300 @@ def validate_options(opt, verbose=True):
     src_format = opt.get('src_format', '')
     dst_format = opt.get('dst_format', '')
     task = opt.get('task', '')
+    mode = opt.get('mode', 'convert')
 
     # Print initial information if verbose is True
     if verbose:
-        print(f"Starting conversion from {src_format} to {dst_format} format.")
-        print(f"Source path: {src_path}")
-        print(f"Destination path: {dst_path}")
-        print(f"Dataset: {src_dataset}")
-        print(f"Source format: {src_format}")
-        print(f"Task: {task}")
-
-    # Check if source and destination paths exist
+        if mode == 'split':
+            LOGGER.info(f"Starting split of {src_format} dataset.")
+        else:
+            LOGGER.info(f"Starting conversion from {src_format} to {dst_format} format.")
+        LOGGER.info(f"Source path: {src_path}")
+        LOGGER.info(f"Destination path: {dst_path}")
+        LOGGER.info(f"Dataset: {src_dataset}")
+        LOGGER.info(f"Source format: {src_format}")
+        LOGGER.info(f"Task: {task}")
+
+    # Check if the source path exists and the options are valid before creating the destination
     if not src_path.exists():
         raise FileNotFoundError(f"Source path {src_path} does not exist.")
+    check_options(opt)
     if not dst_path.exists():
         dst_path.mkdir(parents=True, exist_ok=True)
         if verbose:
-            print(f"Created destination path: {dst_path}")
-    
+            LOGGER.info(f"Created destination path: {dst_path}")
+
+    # The fast JSON encoder is optional
+    if opt.get('json_format', 'pretty') == 'fast' and orjson is None:
+        LOGGER.warning("orjson is not installed, JSON files will be written in compact format.")
+        opt['json_format'] = 'compact'
+
+    return opt
+
+def check_options(opt):
+    """
+    Check the values of options without touching the file system
+
+    Parameters
+    ----------
+    opt : dict
+        A dictionary containing the selected options
+
+    """
+    task = opt.get('task', '')
+    mode = opt.get('mode', 'convert')
+    src_format = opt.get('src_format', '')
+
     # Check task and format compatibility
-    if task not in ['detect', 'segment']:
+    if mode == 'split':
+        if task not in ['classify', 'detect', 'segment']:
+            raise ValueError(f"Invalid task {task}. Task must be 'classify', 'detect' or 'segment'.")
+        if task != 'classify' and src_format not in ['coco', 'yolo']:
+            raise ValueError(f"Invalid source format {src_format} for split mode. Source format must be 'coco' or 'yolo'.")
+    elif task not in ['detect', 'segment']:
         raise ValueError(f"Invalid task {task}. Task must be 'detect' or 'segment'.")
     elif src_format == 'bin' and task != 'segment':
         raise ValueError(f"Invalid task {task} for source format 'bin'. Task must be 'segment'.")
-     
-    return opt
 
-def copy_images(src_path, dst_path, images, verbose=True):
-    for image in images:
+    # Check split ratios, the rest of the images go to the train set
+    if mode == 'split':
+        test_ratio = opt.get('test_train_ratio', 0.0)
+        val_ratio = opt.get('val_ratio', 0.0)
+        if test_ratio < 0 or val_ratio < 0 or test_ratio + val_ratio >= 1:
+            raise ValueError(f"Invalid split ratios test {test_ratio} and validation {val_ratio}. "
+                             f"They must not be negative and must leave images for the train set.")
+
+    # Check image transfer strategy
+    transfer = opt.get('transfer', 'copy')
+    if transfer not in TRANSFER_MODES:
+        raise ValueError(f"Invalid transfer mode {transfer}. Transfer mode must be one of {', '.join(TRANSFER_MODES)}.")
+
+    # Check the kind of masks of a bin dataset
+    mask_type = opt.get('mask_type', 'binary')
+    if mask_type not in MASK_TYPES:
+        raise ValueError(f"Invalid mask type {mask_type}. Mask type must be one of {', '.join(MASK_TYPES)}.")
+    if not isinstance(opt.get('instance_divisor', INSTANCE_ID_DIVISOR), int) or opt.get('instance_divisor', INSTANCE_ID_DIVISOR) < 1:
+        raise ValueError(f"Invalid instance divisor {opt.get('instance_divisor')}. It must be a positive integer.")
+    tile_rows = opt.get('tile_rows')
+    if tile_rows is not None:
+        if not isinstance(tile_rows, int) or tile_rows < 1:
+            raise ValueError(f"Invalid number of tile rows {tile_rows}. It must be a positive integer.")
+        if mask_type != 'binary':
+            raise ValueError(f"Tiled contour extraction only supports binary masks, not {mask_type} masks.")
+    cache_mb = opt.get('contour_cache_mb', CONTOUR_CACHE_MB)
+    if not isinstance(cache_mb, int) or cache_mb < 1:
+        raise ValueError(f"Invalid contour cache size {cache_mb}. It must be a positive number of megabytes.")
+
+    # Check polygon simplification options
+    tolerance = opt.get('simplify_tolerance', 0.0) or 0.0
+    max_vertices = opt.get('max_vertices')
+    min_area = opt.get('min_area', 0.0) or 0.0
+    if tolerance < 0:
+        raise ValueError(f"Invalid simplification tolerance {tolerance}. It must not be negative.")
+    if max_vertices is not None and (not isinstance(max_vertices, int) or max_vertices < 3):
+        raise ValueError(f"Invalid maximum number of vertices {max_vertices}. It must be an integer of at least 3.")
+    if min_area < 0:
+        raise ValueError(f"Invalid minimum polygon area {min_area}. It must not be negative.")
+
+    # Check JSON output format
+    json_format = opt.get('json_format', 'pretty')
+    if json_format not in JSON_FORMATS:
+        raise ValueError(f"Invalid JSON format {json_format}. JSON format must be one of {', '.join(JSON_FORMATS)}.")
+
+    # Check profiling options, a profiled stage is dumped next to the report
+    profile_stage = opt.get('profile_stage')
+    if profile_stage is not None:
+        if profile_stage not in PROFILE_STAGES:
+            raise ValueError(f"Invalid profile stage {profile_stage}. Profile stage must be one of {', '.join(PROFILE_STAGES)}.")
+        if opt.get('profile') is None:
+            raise ValueError("A profile stage needs a profile report path.")
+
+    # Check number of worker processes and copy threads
+    for name in ['workers', 'copy_threads']:
+        value = opt.get(name, 1)
+        if not isinstance(value, int) or value < 1:
+            raise ValueError(f"Invalid number of {name.replace('_', ' ')} {value}. It must be a positive integer.")
+
+def transfer_file(src_image_path, dst_image_path, transfer='copy'):
+    """
+    Transfer a file with the selected strategy, falling back to a copy
+
+    Hardlinks and reflinks fall back to a copy when the source and destination
+    are on different devices or the filesystem does not support them.
+
+    Parameters
+    ----------
+    src_image_path : Path
+        Path to the source file
+    dst_image_path : Path
+        Path to the destination file, replaced if it exists
+    transfer : str, optional
+        Transfer strategy, 'copy', 'hardlink', 'symlink', or 'reflink', 'copy' by default
+
+    Returns
+    -------
+    str
+        Transfer strategy actually used
+    int
+        Number of bytes copied
+
+    """
+    if not src_image_path.is_file():
+        raise FileNotFoundError(f"No such file: '{src_image_path}'")
+
+    # Replace files left by an earlier run, never write through their links
+    if dst_image_path.is_symlink() or dst_image_path.exists():
+        dst_image_path.unlink()
+
+    if transfer != 'copy':
+        try:
+            if transfer == 'hardlink':
+                os.link(src_image_path, dst_image_path)
+            elif transfer == 'symlink':
+                os.symlink(src_image_path.resolve(), dst_image_path)
+            elif transfer == 'reflink':
+                reflink(src_image_path, dst_image_path)
+            return transfer, 0
+        except OSError as e:
+            if e.errno not in LINK_FALLBACK_ERRNOS:
+                raise
+
+    copy(src_image_path, dst_image_path)
+    return 'copy', dst_image_path.stat().st_size
+
+def reflink(src_image_path, dst_image_path):
+    """
+    Clone a file with a copy-on-write reflink, only supported on Linux
+
+    """
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported on this platform")
+    with open(src_image_path, 'rb') as src, open(dst_image_path, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            dst_image_path.unlink()
+            raise
+
+def iter_bounded(func, items, threads, max_pending):
+    """
+    Map a function over items in a thread pool with bounded in-flight work
+
+    Parameters
+    ----------
+    func : function
+        Function called with each item
+    items : iterable
+        Items to map over
+    threads : int
+        Number of threads
+    max_pending : int
+        Maximum number of submitted items whose results have not been consumed
+
+    Yields
+    ------
+    object
+        Results of func, in the order of items
+
+    """
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        pending = deque()
+        try:
+            for item in items:
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(func, item))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # Cancel queued work if the caller stops early
+            for future in pending:
+                future.cancel()
+
+def copy_images(src_path, dst_path, images, verbose=True, transfer='copy', threads=1, manifest=None):
+    """
+    Transfer image files to the destination directory
+
+    A missing image file raises FileNotFoundError right away, other errors are
+    collected and reported together once every image has been tried.
+
+    Parameters
+    ----------
+    src_path : Path
+        Source path of the images
+    dst_path : Path
+        Destination directory for the images
+    images : list
+        List of images in the dataset
+    verbose : bool, optional
+        Log progress at INFO level instead of DEBUG, True by default
+    transfer : str, optional
+        Transfer strategy, 'copy', 'hardlink', 'symlink', 'reflink', or 'skip' to
+        only write labels, 'copy' by default
+    threads : int, optional
+        Number of threads transferring images concurrently, 1 by default
+    manifest : Manifest, optional
+        Manifest of an incremental conversion, unchanged images are not transferred again
+
+    Returns
+    -------
+    int
+        Number of bytes copied, linked files count as 0
+
+    """
+    if transfer == 'skip':
+        return 0
+
+    def transfer_image(image):
+        src_image_path = src_path / image['file_name']
+        dst_image_path = dst_path / src_image_path.name
         try:
-            src_image_path = src_path / image['file_name']
-            copy(src_image_path, dst_path)
-            if verbose:
-                print(f"\r...Copying image file #{image['id']}: {image['file_name']}    ", end='')
-        except FileNotFoundError as e:
-            raise FileNotFoundError(f"Image file {image['file_name']} not found in {src_path}.") from e
+            if manifest is not None and manifest.output_current(dst_image_path, [src_image_path]):
+                result = 'unchanged', 0
+            else:
+                result = transfer_file(src_image_path, dst_image_path, transfer)
+            if manifest is not None:
+                manifest.record_output(dst_image_path, [src_image_path])
+            return image, result, None
         except Exception as e:
-            print(f"Error copying image file {image['file_name']} to {dst_path}: {e}")
-            return
+            return image, None, e
+
+    if threads > 1:
+        results = iter_bounded(transfer_image, images, threads, threads * 4)
+    else:
+        results = map(transfer_image, images)
+
+    n_bytes = 0
+    used = {}
+    errors = []
+    progress = Progress(f"Transferring images to {dst_path}", len(images), verbose, 'images')
+    try:
+        for image, result, error in results:
+            progress.update()
+            if isinstance(error, FileNotFoundError):
+                raise FileNotFoundError(f"Image file {image['file_name']} not found in {src_path}.") from error
+            elif error is not None:
+                errors.append((image, error))
+                continue
+
+            mode, image_bytes = result
+            n_bytes += image_bytes
+            used[mode] = used.get(mode, 0) + 1
+    finally:
+        if threads > 1:
+            results.close()
+
     if verbose:
-            print()
+        LOGGER.info(f"Transferred {len(images) - len(errors)} images to {dst_path} "
+                    f"({', '.join(f'{mode}: {count}' for mode, count in used.items())}), {n_bytes} bytes copied")
+    if errors:
+        LOGGER.error(f"Error copying {len(errors)} image files to {dst_path}:\n" +
+                     '\n'.join(f"    {image['file_name']}: {error}" for image, error in errors))
 
-def write_yolo_yaml(dst_path, src_dataset, src_split, categories):
+    return n_bytes
+
+def write_yolo_yaml(dst_path, src_dataset, src_split, categories, split_names=('train', 'val', 'test')):
     """
     Write dataset information to YAML file
 
@@ -90,16 +387,18 @@ def write_yolo_yaml(dst_path, src_dataset, src_split, categories):
         True if the dataset is split into train, validation, and test sets
     categories : list
         List of categories in the dataset
+    split_names : tuple, optional
+        Splits listed in the YAML file, train, val, and test by default
 
     """
+    import yaml
+
     # Write categories and split paths to YAML file
     try:
         with open(dst_path / f'{src_dataset}.yaml', 'w') as f:
             if src_split:
                 yaml.dump({
-                        'train': '../train/images',
-                        'val': '../val/images',
-                        'test': '../test/images',
+                        **{split_name: f'../{split_name}/images' for split_name in split_names},
                         'names': {cat['id'] - 1: cat['name'] for cat in categories}
                     }, f)
             else:
@@ -107,43 +406,71 @@ def write_yolo_yaml(dst_path, src_dataset, src_split, categories):
                         'names': {cat['id'] - 1: cat['name'] for cat in categories}
                     }, f)
     except Exception as e:
-        print(f"Error creating YAML file for dataset {src_dataset}: {e}")
+        LOGGER.error(f"Error creating YAML file for dataset {src_dataset}: {e}")
 
-def initialize_yolo_labels(dst_path, images, verbose=True):
+def write_yolo_labels(dst_path, images, labels, verbose=True, manifest=None):
     """
-    Create empty YOLO label files for each image
+    Write YOLO label files, one per image, in a single pass
 
     Parameters
     ----------
     dst_path : Path
-        Destination path for YOLO label files
-    src_split : bool
-        True if the dataset is split into train, validation, and test sets
+        Destination path for the split, label files are written to its labels directory
     images : list
         List of images in the dataset
+    labels : dict
+        A dictionary mapping image IDs to lists of YOLO annotation lines
     verbose : bool, optional
-        Print progress messages, True by default
+        Log progress at INFO level instead of DEBUG, True by default
+    manifest : Manifest, optional
+        Manifest of an incremental conversion, label files whose content did not
+        change are not written again
+
+    Returns
+    -------
+    int
+        Number of label files written
+    int
+        Number of bytes written
 
     """
-    # Create empty YOLO txt files for each image
-    yolo_txt_path = ''
+    # Group lines by label file, images without annotations get an empty file
+    label_files = {}
     for image in images:
-        try:
-            image_name = image['file_name'].stem
-            image_id = image['id']
-            yolo_txt_path = dst_path / 'labels' / f'{image_name}.txt'
-            yolo_txt_path.touch(exist_ok=True)
-            if verbose:
-                print(f"\r...Creating YOLO label file for image #{image_id}: {image_name}    ", end='')
-        except Exception as e:
-            print(f"Error creating YOLO label file for image #{image_id}: {e}")
+        yolo_txt_path = dst_path / 'labels' / f"{Path(image['file_name']).stem}.txt"
+        label_files.setdefault(yolo_txt_path, []).extend(labels.get(image['id'], []))
+
+    # Write each label file exactly once
+    n_files = 0
+    n_bytes = 0
+    progress = Progress(f"Writing YOLO label files to {dst_path / 'labels'}", len(label_files), verbose, 'files')
+    for yolo_txt_path, lines in label_files.items():
+        progress.update()
+        content = ''.join(lines)
+        if manifest is not None:
+            content_hash = hash_bytes(content.encode())
+            current = manifest.output_current(yolo_txt_path, content_hash=content_hash)
+            manifest.record_output(yolo_txt_path, content_hash=content_hash)
+            if current:
+                continue
+        with open(yolo_txt_path, 'w') as f:
+            f.write(content)
+        n_files += 1
+        n_bytes += len(content.encode())
     if verbose:
-        print()
+        LOGGER.info(f"Wrote {n_files} YOLO label files ({n_bytes} bytes) to {dst_path / 'labels'}"
+              f"{f', {len(label_files) - n_files} unchanged' if n_files < len(label_files) else ''}")
 
-def process_coco(dst_path, src_dataset, json_path, verbose=True):
+    return n_files, n_bytes
+
+def process_coco(dst_path, src_dataset, json_path, verbose=True, stream=False):
     """
     Load COCO JSON data and create directory structure
 
+    In streaming mode, images and categories are read incrementally and the
+    annotations are returned as a JsonArrayStream that reads them from the
+    file on every iteration, so they are never all loaded at once.
+
     Parameters
     ----------
     dst_path : Path
@@ -154,6 +481,8 @@ def process_coco(dst_path, src_dataset, json_path, verbose=True):
         Path to the COCO JSON file
     verbose : bool, optional
         Print progress messages, True by default
+    stream : bool, optional
+        Stream the annotations from the file, False by default
 
     Returns
     -------
@@ -165,8 +494,8 @@ def process_coco(dst_path, src_dataset, json_path, verbose=True):
         List of images in the dataset
     list
         List of categories in the dataset
-    list
-        List of annotations in the dataset
+    AnnotationTable or JsonArrayStream
+        Table of annotations in the dataset, or a stream of them
 
     """
     # Create directory structure based on the dataset
@@ -179,7 +508,24 @@ def process_coco(dst_path, src_dataset, json_path, verbose=True):
         key = 'all'
 
     if verbose:
-        print(f"Processing JSON file: {json_path.name} in {json_path.parent.name}")
+        LOGGER.info(f"Processing JSON file: {json_path.name} in {json_path.parent.name}")
+
+    # Stream COCO JSON data, only images and categories are kept in memory
+    if stream:
+        found_keys = set()
+        images = []
+        categories = []
+        for array_key, item in iter_json_arrays(json_path, ['categories', 'images'], found_keys):
+            if array_key == 'images':
+                images.append(item)
+            else:
+                categories.append(item)
+        missing_keys = [key for key in ['categories', 'images', 'annotations'] if key not in found_keys]
+        if missing_keys:
+            raise ValueError(f"Invalid COCO JSON format in {json_path}. Missing keys: {', '.join(missing_keys)}")
+        annotations = JsonArrayStream(json_path, 'annotations')
+
+        return key, images, categories, annotations
 
     # Load COCO JSON data
     with open(json_path, 'r') as f:
@@ -189,16 +535,275 @@ def process_coco(dst_path, src_dataset, json_path, verbose=True):
             raise ValueError(f"Invalid COCO JSON format in {json_path}. Missing keys: {', '.join(missing_keys)}")
         categories = coco_json['categories']
         images = coco_json['images']
-        annotations = coco_json['annotations']
+        annotations = AnnotationTable.from_dicts(coco_json.pop('annotations'))
 
     return key, images, categories, annotations
 
 def find_contours(sub_mask):
+    import cv2
     gray = cv2.cvtColor(sub_mask, cv2.COLOR_BGR2GRAY)
     _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
     return cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)[0]
 
-def process_bin(dst_path, images_path, masks_path, split, verbose=True):
+def extract_segmentations(mask):
+    """
+    Extract contour polygons from a binary mask file
+
+    Runs in worker processes when masks are processed in parallel
+
+    Parameters
+    ----------
+    mask : Path
+        Path to the binary mask file
+
+    Returns
+    -------
+    list
+        Flattened contour coordinates, one array per contour
+
+    """
+    import cv2
+    contours = find_contours(cv2.imread(mask))
+    return [contour.ravel() for contour in contours]
+
+def read_png_palette(mask):
+    # The PLTE chunk comes before the image data, so only the start of the file is parsed
+    with open(mask, 'rb') as f:
+        if f.read(8) != b'\x89PNG\r\n\x1a\n':
+            return None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return None
+            length = int.from_bytes(header[:4], 'big')
+            chunk_type = header[4:]
+            if chunk_type == b'PLTE':
+                return np.frombuffer(f.read(length), dtype=np.uint8).reshape(-1, 3)
+            if chunk_type in [b'IDAT', b'IEND']:
+                return None
+            f.seek(length + 4, os.SEEK_CUR)
+
+def read_label_mask(mask):
+    """
+    Decode a mask of class indices or instance IDs into a 2D array of labels
+
+    Grayscale masks of 8 or 16 bits hold the labels as they are. OpenCV expands
+    palette PNGs to colors, which are mapped back to their palette indices.
+
+    Parameters
+    ----------
+    mask : Path
+        Path to the mask file
+
+    Returns
+    -------
+    ndarray
+        Label of every pixel, 0 for the background
+
+    """
+    import cv2
+    labels = cv2.imread(str(mask), cv2.IMREAD_UNCHANGED)
+    if labels is None:
+        raise ValueError(f"Unable to read mask {mask}")
+    if labels.ndim == 2:
+        return labels
+
+    palette = read_png_palette(mask)
+    if palette is None:
+        raise ValueError(f"Mask {mask} has color pixels but no palette, expected class indices or instance IDs")
+
+    # Match packed RGB colors to the palette, OpenCV returns BGR
+    pixels = labels[..., 2::-1].astype(np.uint32)
+    colors = (pixels[..., 0] << 16) | (pixels[..., 1] << 8) | pixels[..., 2]
+    keys = (palette[:, 0].astype(np.uint32) << 16) | (palette[:, 1].astype(np.uint32) << 8) | palette[:, 2]
+    order = np.argsort(keys, kind='stable')
+    positions = np.minimum(np.searchsorted(keys[order], colors), len(keys) - 1)
+    if not (keys[order][positions] == colors).all():
+        raise ValueError(f"Mask {mask} has colors outside of its palette")
+    return order[positions].astype(np.uint16 if len(keys) > 256 else np.uint8)
+
+def find_label_boxes(labels):
+    """
+    Find every label of a mask and its bounding box in one pass over the pixels
+
+    Parameters
+    ----------
+    labels : ndarray
+        Label of every pixel, 0 for the background
+
+    Returns
+    -------
+    ndarray
+        Labels in increasing order
+    ndarray
+        Bounding box of each label as x0, y0, x1, y1, with exclusive ends
+
+    """
+    flat = labels.ravel()
+    pixels = np.flatnonzero(flat)
+    if not len(pixels):
+        return np.empty(0, dtype=flat.dtype), np.empty((0, 4), dtype=np.int64)
+
+    # Group foreground pixels by label, then reduce the rows and columns of each group
+    values = flat[pixels]
+    order = np.argsort(values, kind='stable')
+    values = values[order]
+    rows, columns = np.divmod(pixels[order], labels.shape[1])
+    starts = np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+    boxes = np.column_stack((
+        np.minimum.reduceat(columns, starts),
+        np.minimum.reduceat(rows, starts),
+        np.maximum.reduceat(columns, starts) + 1,
+        np.maximum.reduceat(rows, starts) + 1,
+    ))
+    return values[starts], boxes
+
+def extract_label_segmentations(mask, mask_type='indexed', instance_divisor=INSTANCE_ID_DIVISOR):
+    """
+    Extract contour polygons of every class or instance from a mask file
+
+    The mask is decoded once, and contours of each label are found in its
+    bounding box only. They are the same contours as those of a binary mask
+    of the label.
+
+    Runs in worker processes when masks are processed in parallel
+
+    Parameters
+    ----------
+    mask : Path
+        Path to the mask file
+    mask_type : str, optional
+        'indexed' for class indices or 'instance' for instance IDs, 'indexed' by default
+    instance_divisor : int, optional
+        Instance IDs are class index * instance_divisor + instance, INSTANCE_ID_DIVISOR by default
+
+    Returns
+    -------
+    list
+        Pairs of class index and flattened contour coordinates of each of its
+        contours, in label order
+
+    """
+    import cv2
+    labels = read_label_mask(mask)
+    values, boxes = find_label_boxes(labels)
+
+    segmentations = []
+    for value, (x0, y0, x1, y1) in zip(values.tolist(), boxes.tolist()):
+        if mask_type == 'instance' and value >= instance_divisor:
+            class_index = value // instance_divisor
+        else:
+            class_index = value
+        region = (labels[y0:y1, x0:x1] == value).view(np.uint8)
+        contours = cv2.findContours(region, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE, offset=(x0, y0))[0]
+        segmentations.append((class_index, [contour.ravel() for contour in contours]))
+    return segmentations
+
+def read_mask_classes(masks_path):
+    # Category names of indexed and instance masks, None if the dataset has no classes file
+    classes_path = masks_path / MASK_CLASSES_FILE
+    if not classes_path.is_file():
+        return None
+    with open(classes_path, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+def find_masks(masks_path, split_name, mask_type='binary'):
+    """
+    Find the masks of a split and the categories they are labeled with
+
+    Binary masks are in one directory per category, masks/<category>/<split>.
+    Indexed and instance masks are one per image in masks/<split>, and their
+    categories are the names of the classes file, or found from the masks
+    if there is none.
+
+    Parameters
+    ----------
+    masks_path : Path
+        Path to the masks directory
+    split_name : str
+        Name of the split, '' if the dataset is not split
+    mask_type : str, optional
+        'binary', 'indexed', or 'instance', 'binary' by default
+
+    Returns
+    -------
+    list or None
+        List of categories, None if they are found from the masks
+    list
+        Pairs of category ID, None for indexed and instance masks, and mask path
+
+    """
+    if mask_type == 'binary':
+        categories = []
+        masks = []
+        # Sorted, as directory order depends on the file system and would reorder category and annotation IDs
+        for category in sorted(masks_path.iterdir()):
+            if category.is_dir():
+                category_id = len(categories) + 1
+                categories.append({
+                    'id': category_id,
+                    'name': category.name,
+                    'supercategory': category.name
+                })
+                masks += [(category_id, mask) for mask in sorted((category / split_name).iterdir())]
+        return categories, masks
+
+    names = read_mask_classes(masks_path)
+    categories = None
+    if names is not None:
+        categories = [{'id': index + 1, 'name': name, 'supercategory': name} for index, name in enumerate(names)]
+    masks = [(None, mask) for mask in sorted((masks_path / split_name).iterdir())
+             if mask.is_file() and mask.name != MASK_CLASSES_FILE]
+    return categories, masks
+
+def process_bin(dst_path, images_path, masks_path, split, verbose=True, workers=1,
+                mask_type='binary', instance_divisor=INSTANCE_ID_DIVISOR, tile_rows=None, cache=None):
+    """
+    Load images and masks of a split and extract polygon annotations
+
+    Every contour becomes an annotation, whatever the kind of masks. Binary
+    masks are matched to images by file name, indexed and instance masks by
+    file name without extension, as they are usually PNG files of JPEG images.
+    With tile_rows, binary masks are read and traced in strips by
+    find_tiled_contours, and are also matched by file name without extension
+    if no image has their name, for masks in formats such as .npy.
+
+    Parameters
+    ----------
+    dst_path : Path
+        Destination path for the dataset
+    images_path : Path
+        Path to the images directory
+    masks_path : Path
+        Path to the masks directory, see find_masks
+    split : Path
+        Path to the split directory, or to an image file if the dataset is not split
+    verbose : bool, optional
+        Print progress messages, True by default
+    workers : int, optional
+        Number of processes extracting contours from masks, 1 by default
+    mask_type : str, optional
+        'binary', 'indexed', or 'instance', 'binary' by default
+    instance_divisor : int, optional
+        Instance IDs are class index * instance_divisor + instance, INSTANCE_ID_DIVISOR by default
+    tile_rows : int, optional
+        Number of rows of binary masks traced at a time, whole masks by default
+    cache : ContourCache, optional
+        Cache of the contours of masks, only masks missing from it are
+        extracted, no cache by default
+
+    Returns
+    -------
+    str
+        Name of the split, 'all' if the dataset is not split
+    list
+        List of images in the dataset
+    list
+        List of categories in the dataset
+    AnnotationTable
+        Table of annotations in the dataset
+
+    """
     if split.is_dir():
         split_name = split.name
         key = split_name
@@ -207,73 +812,382 @@ def process_bin(dst_path, images_path, masks_path, split, verbose=True):
         key = 'all'
 
     images = []
-    for image in (images_path / split_name).iterdir():
-        if verbose:
-            print(f"\rProcessing image file: {image.name} in {key}", end='')
-        height, width, _ = cv2.imread(image).shape
+    progress = Progress(f"Reading image sizes in {key}", verbose=verbose, unit='images')
+    for image in sorted((images_path / split_name).iterdir()):
+        progress.update()
+        width, height = get_image_size(image)
         images.append({
             'id': len(images),
             'file_name': image.name,
             'width' : width,
             'height' : height
         })
+    progress.close()
+
+    # Index images by file name to match masks to their images
+    stem_index = {Path(image['file_name']).stem: image['id'] for image in images}
+    if mask_type == 'binary':
+        image_index = {image['file_name']: image['id'] for image in images}
+    else:
+        image_index = stem_index
 
-    categories = []
-    annotations = []
-    for category in (masks_path).iterdir():
-        if category.is_dir():
-            category_id = len(categories) + 1
-
-            categories.append({
-                'id': category_id,
-                'name': category.name,
-                'supercategory': category.name
-            })
-
-            for mask in (masks_path / category / split_name).iterdir():
-                mask_image_name = mask.name
-
-                for image in images:
-                    if image.get('file_name') == mask_image_name:
-                        image_id = image.get('id')
-
-                contours = find_contours(cv2.imread(mask))
-                for contour in contours:
-                    segmentation = contour.flatten().tolist()
-
-                    if not segmentation:
-                        raise ValueError(f"Segmentation data missing for {category} binary mask {mask_image_name}")
-                    elif len(segmentation) % 2 != 0:
-                        segmentation.pop()
-
-                    x_points = segmentation[::2]
-                    y_points = segmentation[1::2]
-                    x = int(min(x_points))
-                    y = int(min(y_points))
-                    width = int(max(x_points) - min(x_points))
-                    height = int(max(y_points) - min(y_points))
-
-                    annotations.append({
-                        "id": len(annotations) + 1,
-                        "image_id": image_id,
-                        "bbox": [
-                            x,
-                            y,
-                            width,
-                            height
-                        ],
-                        "area": width*height,
-                        "iscrowd": 0,
-                        "category_id": category_id,
-                        "segmentation": [
-                            segmentation
-                        ]
-                    })
+    # Collect (category, mask) jobs in a fixed order so annotation IDs are deterministic
+    categories, masks = find_masks(masks_path, split_name, mask_type)
+    jobs = []
+    orphan_masks = []
+    for category_id, mask in masks:
+        if mask_type != 'binary':
+            image_id = image_index.get(mask.stem, None)
+        elif tile_rows:
+            image_id = image_index.get(mask.name, stem_index.get(mask.stem))
+        else:
+            image_id = image_index.get(mask.name, None)
+        if image_id is None:
+            orphan_masks.append(mask)
+            continue
+        jobs.append((category_id, image_id, mask))
 
-    if verbose:
-        print()
+    # Report masks without images and images without masks
+    masked_image_ids = {image_id for _, image_id, _ in jobs}
+    unmasked_images = [image['file_name'] for image in images if image['id'] not in masked_image_ids]
+    if orphan_masks:
+        LOGGER.warning(f"Skipped {len(orphan_masks)} masks in {key} with no matching image: "
+                       f"{', '.join(str(mask.relative_to(masks_path)) for mask in orphan_masks[:10])}"
+                       f"{', ...' if len(orphan_masks) > 10 else ''}")
+    if unmasked_images and verbose:
+        LOGGER.info(f"{len(unmasked_images)} images in {key} have no masks: "
+                    f"{', '.join(unmasked_images[:10])}{', ...' if len(unmasked_images) > 10 else ''}")
+
+    # Look up masks in the contour cache, only the masks missing from it are extracted
+    masks = [mask for _, _, mask in jobs]
+    grouped = mask_type != 'binary'
+    keys = []
+    missing_masks = [True] * len(masks)
+    if cache is not None:
+        params = {
+            'mask_type': mask_type,
+            'instance_divisor': instance_divisor if mask_type == 'instance' else None,
+        }
+        keys = [cache.get_key(mask, **params) for mask in masks]
+        missing_masks = cache.find_missing(keys)
+    missing = [mask for mask, is_missing in zip(masks, missing_masks) if is_missing]
+
+    # Extract contours, results come back in job order as they are done
+    if mask_type == 'binary':
+        extract = partial(find_tiled_contours, tile_rows=tile_rows) if tile_rows else extract_segmentations
+    else:
+        extract = partial(extract_label_segmentations, mask_type=mask_type, instance_divisor=instance_divisor)
+    executor = None
+    if workers > 1 and len(missing) > 1:
+        if verbose:
+            LOGGER.info(f"Extracting contours from {len(missing)} masks with {workers} workers")
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(extract, missing, chunksize=max(1, len(missing) // (workers * 4)))
+    else:
+        results = map(extract, missing)
+    if cache is not None:
+        results = iter_cached_results(cache, keys, missing_masks, masks, results, extract, grouped)
+
+    # Gather the contours of every mask into one coordinate buffer
+    image_ids = []
+    category_ids = []
+    coords = []
+    coord_offsets = [0]
+    try:
+        with Progress(f"Extracting contours in {key}", len(masks), verbose, 'masks') as progress:
+            for (category_id, image_id, mask), result in zip(jobs, results):
+                progress.update()
+                # Binary masks have the contours of their category, other masks those of every class
+                groups = [(category_id, result)] if mask_type == 'binary' else result
+                for class_id, segmentations in groups:
+                    for segmentation in segmentations:
+                        if not len(segmentation):
+                            raise ValueError(f"Segmentation data missing for mask {mask}")
+                        segmentation = segmentation[:len(segmentation) - len(segmentation) % 2]
+
+                        image_ids.append(image_id)
+                        category_ids.append(class_id)
+                        coords.append(segmentation)
+                        coord_offsets.append(coord_offsets[-1] + len(segmentation))
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    # Categories of masks without a classes file are the classes found in them
+    if categories is None:
+        categories = [{'id': index, 'name': f'class_{index}', 'supercategory': f'class_{index}'}
+                      for index in range(1, max(category_ids, default=0) + 1)]
+    elif category_ids and max(category_ids) > len(categories):
+        raise ValueError(f"Masks in {key} have class index {max(category_ids)}, "
+                         f"but {masks_path / MASK_CLASSES_FILE} only names {len(categories)} classes")
+
+    # Bounding boxes from the extent of every contour at once
+    n = len(image_ids)
+    coords = np.concatenate(coords).astype(np.int64) if coords else np.empty(0, dtype=np.int64)
+    points = coords.reshape(-1, 2)
+    if n:
+        starts = np.array(coord_offsets[:-1]) // 2
+        min_xy = np.minimum.reduceat(points, starts)
+        sizes = np.maximum.reduceat(points, starts) - min_xy
+    else:
+        min_xy = sizes = np.empty((0, 2), dtype=np.int64)
+
+    annotations = AnnotationTable(
+        ids=np.arange(1, n + 1),
+        image_ids=image_ids,
+        category_ids=category_ids,
+        bboxes=np.column_stack((min_xy, sizes)),
+        areas=sizes[:, 0] * sizes[:, 1],
+        iscrowd=np.zeros(n, dtype=np.int64),
+        coords=coords,
+        coord_offsets=coord_offsets,
+        polygon_offsets=np.arange(n + 1),
+        fields=EXTRACTED_ANNOTATION_FIELDS
+    )
 
     return key, images, categories, annotations
 
-def process_yolo():
-    pass
\ No newline at end of file
+def read_yolo_yaml(yaml_path):
+    """
+    Read category names from a YOLO dataset YAML file
+
+    Parameters
+    ----------
+    yaml_path : Path
+        Path to the YAML file
+
+    Returns
+    -------
+    list
+        List of categories in the dataset
+
+    """
+    import yaml
+    with open(yaml_path, 'r') as f:
+        dataset = yaml.safe_load(f) or {}
+    names = dataset.get('names')
+    if not names:
+        raise ValueError(f"Invalid YOLO YAML format in {yaml_path}. Missing key: names")
+
+    # Names are either a list or a dictionary of class indices to names, which may skip
+    # indices, so classes keep their index and skipped ones are named class_<index>
+    if isinstance(names, dict):
+        if not all(isinstance(index, int) and index >= 0 for index in names):
+            raise ValueError(f"Invalid YOLO YAML format in {yaml_path}. Class indices of names must be non-negative integers")
+        names = [names.get(index, f'class_{index}') for index in range(max(names) + 1)]
+
+    return [{'id': index + 1, 'name': name, 'supercategory': name} for index, name in enumerate(names)]
+
+def find_yolo_splits(src_path):
+    """
+    Find the split directories of a YOLO dataset, as written by to_yolo
+
+    Parameters
+    ----------
+    src_path : Path
+        Path to the YOLO dataset
+
+    Returns
+    -------
+    dict
+        A dictionary mapping split names to their directories, 'all' if the dataset is not split
+
+    """
+    if (src_path / 'images').is_dir():
+        split_paths = {'all': src_path}
+    else:
+        split_paths = {split.name: split for split in sorted(src_path.iterdir()) if (split / 'images').is_dir()}
+    if not split_paths:
+        raise FileNotFoundError(f"No images directory found in {src_path}")
+    return split_paths
+
+def find_yolo_yaml(src_path):
+    # The dataset YAML file holds the category names
+    yaml_paths = list(src_path.glob('*.yaml')) + list(src_path.glob('*.yml'))
+    if not yaml_paths:
+        raise FileNotFoundError(f"No YAML file found in {src_path}")
+    return yaml_paths[0]
+
+def parse_yolo_labels(jobs):
+    """
+    Read image sizes and parse YOLO label files of a chunk of images
+
+    Runs in worker processes when labels are parsed in parallel. Boxes are kept
+    as two points, the center and the size, so boxes and polygons are
+    denormalized the same way.
+
+    Parameters
+    ----------
+    jobs : list
+        Tuples of image path and label path
+
+    Returns
+    -------
+    ndarray
+        Width and height of each image
+    ndarray
+        Index of the image in the chunk of each annotation
+    ndarray
+        Class index of each annotation
+    ndarray
+        True for each annotation that is a box
+    ndarray
+        Number of points of each annotation
+    ndarray
+        Normalized points of all annotations
+
+    """
+    sizes = []
+    image_indices = []
+    classes = []
+    is_box = []
+    counts = []
+    coords = []
+    for index, (image_path, label_path) in enumerate(jobs):
+        sizes.append(get_image_size(image_path))
+        if not label_path.is_file():
+            continue
+
+        with open(label_path, 'r') as f:
+            for line_number, line in enumerate(f, 1):
+                values = line.split()
+                if not values:
+                    continue
+                if len(values) < 5 or len(values) % 2 == 0:
+                    raise ValueError(f"Invalid YOLO label in {label_path} line {line_number}: expected a box or a polygon")
+                image_indices.append(index)
+                classes.append(int(values[0]))
+                is_box.append(len(values) == 5)
+                counts.append((len(values) - 1) // 2)
+                coords += map(float, values[1:])
+
+    return (
+        np.array(sizes, dtype=np.float64).reshape(-1, 2),
+        np.array(image_indices, dtype=np.int64),
+        np.array(classes, dtype=np.int64),
+        np.array(is_box, dtype=bool),
+        np.array(counts, dtype=np.int64),
+        np.array(coords, dtype=np.float64).reshape(-1, 2)
+    )
+
+def process_yolo(dst_path, split_path, categories, key, verbose=True, workers=1):
+    """
+    Load images and YOLO labels of a split and denormalize them to COCO annotations
+
+    Parameters
+    ----------
+    dst_path : Path
+        Destination path for the dataset
+    split_path : Path
+        Path to the split directory, containing images and labels directories
+    categories : list
+        List of categories in the dataset
+    key : str
+        Name of the split, 'all' if the dataset is not split
+    verbose : bool, optional
+        Print progress messages, True by default
+    workers : int, optional
+        Number of processes parsing label files, 1 by default
+
+    Returns
+    -------
+    str
+        Name of the split, 'all' if the dataset is not split
+    list
+        List of images in the dataset
+    list
+        List of categories in the dataset
+    AnnotationTable
+        Table of annotations in the dataset
+
+    """
+    image_paths = sorted(path for path in (split_path / 'images').iterdir() if path.is_file())
+    jobs = [(image_path, split_path / 'labels' / f'{image_path.stem}.txt') for image_path in image_paths]
+    if verbose:
+        LOGGER.info(f"Processing {len(jobs)} images and labels in {key}")
+
+    # Parse label files in chunks, results come back in image order
+    chunk_size = max(1, len(jobs) // (workers * 4))
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+    with Progress(f"Parsing YOLO labels in {key}", len(jobs), verbose, 'labels') as progress:
+        if workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = []
+                for result in executor.map(parse_yolo_labels, chunks):
+                    results.append(result)
+                    progress.update(len(result[0]))
+        else:
+            results = []
+            for chunk in chunks:
+                results.append(parse_yolo_labels(chunk))
+                progress.update(len(chunk))
+
+    images = [{
+        'id': image_id,
+        'file_name': image_path.name,
+        'width': 0,
+        'height': 0
+    } for image_id, image_path in enumerate(image_paths)]
+    if not images:
+        return key, images, categories, AnnotationTable.empty()
+
+    # Merge the chunks, offsetting image indices by the chunk position
+    offsets = np.cumsum([0] + [len(chunk) for chunk in chunks[:-1]])
+    sizes = np.concatenate([result[0] for result in results])
+    image_ids = np.concatenate([result[1] + offset for result, offset in zip(results, offsets)])
+    classes = np.concatenate([result[2] for result in results])
+    is_box = np.concatenate([result[3] for result in results])
+    counts = np.concatenate([result[4] for result in results])
+    points = np.concatenate([result[5] for result in results])
+
+    for image, (width, height) in zip(images, sizes.astype(np.int64).tolist()):
+        image['width'] = width
+        image['height'] = height
+    if not len(classes):
+        return key, images, categories, AnnotationTable.empty()
+
+    if (classes < 0).any() or (classes >= len(categories)).any():
+        raise ValueError(f"YOLO labels in {key} have class indices outside of the {len(categories)} categories")
+
+    # Denormalize every point of the split at once
+    points = points * np.repeat(sizes[image_ids], counts, axis=0)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    # Polygon boxes from the extent of their points, box points are the center and the size
+    min_x = np.minimum.reduceat(points[:, 0], starts)
+    min_y = np.minimum.reduceat(points[:, 1], starts)
+    max_x = np.maximum.reduceat(points[:, 0], starts)
+    max_y = np.maximum.reduceat(points[:, 1], starts)
+    box_points = points[starts[is_box]]
+    box_sizes = points[starts[is_box] + 1]
+    min_x[is_box] = box_points[:, 0] - box_sizes[:, 0] / 2
+    min_y[is_box] = box_points[:, 1] - box_sizes[:, 1] / 2
+    max_x[is_box] = min_x[is_box] + box_sizes[:, 0]
+    max_y[is_box] = min_y[is_box] + box_sizes[:, 1]
+    bboxes = np.column_stack((min_x, min_y, max_x - min_x, max_y - min_y))
+
+    # Boxes become rectangular polygons, polygons keep their points
+    n = len(classes)
+    polygon_counts = np.where(is_box, 4, counts)
+    polygon_is_box = np.repeat(is_box, polygon_counts)
+    polygon_points = np.empty((polygon_counts.sum(), 2))
+    polygon_points[~polygon_is_box] = points[np.repeat(~is_box, counts)]
+    x, y, width, height = bboxes[is_box].T
+    polygon_points[polygon_is_box] = np.column_stack(
+        (x, y, x + width, y, x + width, y + height, x, y + height)
+    ).reshape(-1, 2)
+
+    annotations = AnnotationTable(
+        ids=np.arange(1, n + 1),
+        image_ids=image_ids,
+        category_ids=classes + 1,
+        bboxes=bboxes,
+        areas=bboxes[:, 2] * bboxes[:, 3],
+        iscrowd=np.zeros(n, dtype=np.int64),
+        coords=polygon_points.ravel(),
+        coord_offsets=np.concatenate(([0], np.cumsum(2 * polygon_counts))),
+        polygon_offsets=np.arange(n + 1),
+        fields=EXTRACTED_ANNOTATION_FIELDS
+    )
+
+    return key, images, categories, annotations
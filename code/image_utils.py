@@ -0,0 +1,182 @@
+from io import BytesIO
+from struct import unpack, error as StructError
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+TIFF_SIGNATURES = (b'II*\x00', b'MM\x00*')
+TIFF_ORIENTATION = 274
+TIFF_IMAGE_WIDTH = 256
+TIFF_IMAGE_LENGTH = 257
+
+def get_image_size(image_path):
+    """
+    Get the width and height of an image by reading only its header
+
+    PNG, JPEG, BMP, and TIFF headers are parsed directly, other formats and
+    files whose header cannot be parsed are fully decoded with OpenCV.
+    The size accounts for EXIF orientation the same way cv2.imread does.
+
+    Parameters
+    ----------
+    image_path : Path
+        Path to the image file
+
+    Returns
+    -------
+    int
+        Width of the image
+    int
+        Height of the image
+
+    """
+    size = None
+    with open(image_path, 'rb') as f:
+        head = f.read(26)
+        try:
+            if head.startswith(PNG_SIGNATURE):
+                size = read_png_size(f, head)
+            elif head.startswith(b'\xff\xd8'):
+                size = read_jpeg_size(f)
+            elif head.startswith(b'BM'):
+                size = read_bmp_size(head)
+            elif head[:4] in TIFF_SIGNATURES:
+                size = read_tiff_size(f)
+        except (StructError, ValueError):
+            size = None
+
+    # Fall back to a full decode for formats that could not be parsed, only then is OpenCV needed
+    if size is None:
+        import cv2
+        image = cv2.imread(str(image_path))
+        if image is None:
+            raise ValueError(f"Unable to read image file {image_path}")
+        height, width = image.shape[:2]
+        size = width, height
+
+    return size
+
+def read_png_size(f, head):
+    """
+    Read the size of a PNG image from its IHDR chunk
+
+    Returns None if the image has an eXIf chunk, as its orientation may rotate the image
+
+    """
+    if head[12:16] != b'IHDR':
+        return None
+    width, height = unpack('>II', head[16:24])
+
+    # Check the chunks before the image data for EXIF metadata
+    f.seek(8)
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return None
+        length, chunk_type = unpack('>I4s', chunk)
+        if chunk_type == b'eXIf':
+            return None
+        if chunk_type in (b'IDAT', b'IEND'):
+            return width, height
+        f.seek(length + 4, 1)
+
+def read_jpeg_size(f):
+    """
+    Read the size of a JPEG image from its start of frame segment
+
+    """
+    orientation = 1
+    f.seek(2)
+    while True:
+        # Find the next marker, skipping fill bytes
+        byte = f.read(1)
+        while byte and byte != b'\xff':
+            byte = f.read(1)
+        while byte == b'\xff':
+            byte = f.read(1)
+        if not byte:
+            return None
+
+        marker = byte[0]
+        if marker == 0xd9:
+            return None
+        if marker == 0x01 or 0xd0 <= marker <= 0xd8:
+            continue
+
+        length = unpack('>H', f.read(2))[0]
+        if marker == 0xe1:
+            data = f.read(length - 2)
+            if data.startswith(b'Exif\x00\x00'):
+                orientation = read_tiff_tags(BytesIO(data[6:]), [TIFF_ORIENTATION]).get(TIFF_ORIENTATION, orientation)
+        elif 0xc0 <= marker <= 0xcf and marker not in (0xc4, 0xc8, 0xcc):
+            _, height, width = unpack('>BHH', f.read(5))
+            # Orientations 5 to 8 rotate the image by 90 degrees
+            if orientation in (5, 6, 7, 8):
+                width, height = height, width
+            return width, height
+        else:
+            f.seek(length - 2, 1)
+
+def read_bmp_size(head):
+    """
+    Read the size of a BMP image from its DIB header
+
+    """
+    header_size = unpack('<I', head[14:18])[0]
+    if header_size == 12:
+        width, height = unpack('<HH', head[18:22])
+    else:
+        width, height = unpack('<ii', head[18:26])
+    return abs(width), abs(height)
+
+def read_tiff_size(f):
+    """
+    Read the size of a TIFF image from its first IFD
+
+    Returns None if the image is not in the default orientation
+
+    """
+    tags = read_tiff_tags(f, [TIFF_IMAGE_WIDTH, TIFF_IMAGE_LENGTH, TIFF_ORIENTATION])
+    if tags.get(TIFF_ORIENTATION, 1) != 1:
+        return None
+    if TIFF_IMAGE_WIDTH not in tags or TIFF_IMAGE_LENGTH not in tags:
+        return None
+    return tags[TIFF_IMAGE_WIDTH], tags[TIFF_IMAGE_LENGTH]
+
+def read_tiff_tags(f, tags):
+    """
+    Read integer tags from the first IFD of a TIFF structure starting at offset 0 of f
+
+    Parameters
+    ----------
+    f : file object
+        Binary file object containing the TIFF structure
+    tags : list
+        Tags to read
+
+    Returns
+    -------
+    dict
+        A dictionary mapping the tags found to their values
+
+    """
+    f.seek(0)
+    header = f.read(8)
+    if header[:4] not in TIFF_SIGNATURES:
+        raise ValueError("Invalid TIFF header")
+    byte_order = '<' if header[:2] == b'II' else '>'
+
+    f.seek(unpack(byte_order + 'I', header[4:8])[0])
+    count = unpack(byte_order + 'H', f.read(2))[0]
+    entries = f.read(12 * count)
+
+    values = {}
+    for i in range(count):
+        tag, value_type = unpack(byte_order + 'HH', entries[12 * i:12 * i + 4])
+        if tag not in tags:
+            continue
+        # Values of SHORT and LONG types fit in the entry itself
+        if value_type == 3:
+            values[tag] = unpack(byte_order + 'H', entries[12 * i + 8:12 * i + 10])[0]
+        elif value_type == 4:
+            values[tag] = unpack(byte_order + 'I', entries[12 * i + 8:12 * i + 12])[0]
+
+    return values
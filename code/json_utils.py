@@ -0,0 +1,360 @@
+from collections.abc import Iterable
+from contextlib import contextmanager
+from itertools import islice
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+DELIMITERS = ' \t\n\r,:]}'
+CHUNK_SIZE = 1 << 20
+
+# Output formats of JSON files, 'fast' needs orjson and is otherwise written as 'compact'
+JSON_FORMATS = ['pretty', 'compact', 'fast']
+# Number of array items encoded at a time when writing JSON files
+JSON_BATCH_SIZE = 1000
+INDENT = '    '
+
+class JsonStreamReader:
+    """
+    Incremental reader for JSON values of a text file
+
+    Values are decoded one at a time with the standard library decoder, so
+    only the value being decoded and one chunk of the file are kept in memory.
+
+    Parameters
+    ----------
+    f : file object
+        Text file object to read from
+    chunk_size : int, optional
+        Number of characters read at a time, 1 MiB by default
+
+    """
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        # Drop consumed data and read the next chunk
+        chunk = self.f.read(self.chunk_size)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+        return not self.eof
+
+    def peek(self):
+        # Return the next non-whitespace character without consuming it
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def next_char(self):
+        char = self.peek()
+        self.pos += 1
+        return char
+
+    def expect(self, char):
+        found = self.next_char()
+        if found != char:
+            raise ValueError(f"Invalid JSON, expected '{char}' but found '{found}'")
+
+    def decode(self):
+        # Decode the next value, a value is only complete once a delimiter follows it
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                if self.eof or (end < len(self.buf) and self.buf[end] in DELIMITERS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    def skip_value(self):
+        # Skip the next value, arrays are decoded and dropped item by item to bound memory
+        if self.peek() == '[':
+            for _ in self.iter_array():
+                pass
+        else:
+            self.decode()
+
+    def iter_array(self):
+        # Yield the items of the array starting at the current position
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.decode()
+            char = self.next_char()
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f"Invalid JSON, expected ',' or ']' but found '{char}'")
+
+def iter_json_arrays(json_path, keys, found_keys=None, chunk_size=CHUNK_SIZE):
+    """
+    Iterate the items of top-level arrays of a JSON object file
+
+    Parameters
+    ----------
+    json_path : Path
+        Path to the JSON file
+    keys : list
+        Keys of the top-level arrays to yield items from, other values are skipped
+    found_keys : set, optional
+        If given, every top-level key of the file is added to it
+    chunk_size : int, optional
+        Number of characters read at a time, 1 MiB by default
+
+    Yields
+    ------
+    str
+        Key of the array
+    object
+        Decoded item of the array
+
+    """
+    with open(json_path, 'r', encoding='utf-8') as f:
+        reader = JsonStreamReader(f, chunk_size)
+        reader.expect('{')
+        if reader.peek() == '}':
+            return
+
+        while True:
+            key = reader.decode()
+            reader.expect(':')
+            if found_keys is not None:
+                found_keys.add(key)
+
+            if key in keys and reader.peek() == '[':
+                for item in reader.iter_array():
+                    yield key, item
+            else:
+                reader.skip_value()
+
+            char = reader.next_char()
+            if char == '}':
+                return
+            if char != ',':
+                raise ValueError(f"Invalid JSON, expected ',' or '}}' but found '{char}'")
+
+class JsonArrayStream:
+    """
+    Re-iterable stream over the items of a top-level array of a JSON file
+
+    Every iteration reads the file again, so the items are never all in memory.
+
+    Parameters
+    ----------
+    json_path : Path
+        Path to the JSON file
+    key : str
+        Key of the top-level array
+
+    """
+    def __init__(self, json_path, key):
+        self.json_path = json_path
+        self.key = key
+
+    def __iter__(self):
+        for _, item in iter_json_arrays(self.json_path, [self.key]):
+            yield item
+
+def encode_json(value, json_format='pretty', depth=0):
+    """
+    Encode a JSON value in the selected output format
+
+    Parameters
+    ----------
+    value : object
+        JSON value to encode
+    json_format : str, optional
+        'pretty' for an indent of 4, 'compact' for no whitespace, or 'fast'
+        for compact output with orjson, 'pretty' by default
+    depth : int, optional
+        Indentation level the value is written at, 0 by default
+
+    Returns
+    -------
+    bytes
+        UTF-8 encoded JSON
+
+    """
+    if json_format == 'pretty':
+        return json.dumps(value, indent=4).replace('\n', '\n' + INDENT * depth).encode()
+    if json_format == 'fast' and orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode()
+
+def encode_json_items(items, json_format='pretty', depth=1):
+    # Encode a batch of array items at depth as they appear inside the array, without brackets
+    if json_format == 'pretty':
+        return json.dumps(items, indent=4)[1:-2].replace('\n', '\n' + INDENT * (depth - 1)).encode()
+    return encode_json(items, json_format)[1:-1]
+
+class JsonArrayWriter:
+    """
+    Writer of the items of an array to a binary file, as they are given
+
+    Parameters
+    ----------
+    f : file object
+        Binary file object to write to
+    json_format : str, optional
+        Output format, 'pretty' by default
+    depth : int, optional
+        Indentation level of the array, 0 by default
+    batch_size : int, optional
+        Number of items encoded at a time
+
+    """
+    def __init__(self, f, json_format='pretty', depth=0, batch_size=JSON_BATCH_SIZE):
+        self.f = f
+        self.json_format = json_format
+        self.depth = depth
+        self.batch_size = batch_size
+        self.empty = True
+
+    def write(self, items):
+        """
+        Write the next items of the array, one batch of items at a time
+
+        Parameters
+        ----------
+        items : iterable
+            Items of the array, such as a list, JsonArrayStream, or AnnotationTable
+
+        """
+        iterator = iter(items)
+        while batch := list(islice(iterator, self.batch_size)):
+            self.f.write(b'[' if self.empty else b',')
+            self.f.write(encode_json_items(batch, self.json_format, self.depth + 1))
+            self.empty = False
+
+    def close(self):
+        newline = ('\n' + INDENT * self.depth).encode() if self.json_format == 'pretty' else b''
+        self.f.write(b'[]' if self.empty else newline + b']')
+
+def write_json_array(f, items, json_format='pretty', depth=0, batch_size=JSON_BATCH_SIZE):
+    """
+    Write the items of an array to a binary file, one batch of items at a time
+
+    Parameters
+    ----------
+    f : file object
+        Binary file object to write to
+    items : iterable
+        Items of the array, such as a list, JsonArrayStream, or AnnotationTable
+    json_format : str, optional
+        Output format, 'pretty' by default
+    depth : int, optional
+        Indentation level of the array, 0 by default
+    batch_size : int, optional
+        Number of items encoded at a time
+
+    """
+    writer = JsonArrayWriter(f, json_format, depth, batch_size)
+    writer.write(items)
+    writer.close()
+
+def write_json_members(f, members, json_format='pretty', batch_size=JSON_BATCH_SIZE, first=True):
+    # Write key: value pairs of an object, arrays one batch of items at a time, and return whether none was written
+    pretty = json_format == 'pretty'
+    for key, value in members:
+        f.write(b'' if first else b',')
+        f.write(b'\n    ' if pretty else b'')
+        f.write(json.dumps(key).encode() + (b': ' if pretty else b':'))
+        first = False
+        if value is None:
+            # The caller writes the value
+            continue
+        if isinstance(value, Iterable) and not isinstance(value, (str, bytes, dict)):
+            write_json_array(f, value, json_format, 1, batch_size)
+        else:
+            f.write(encode_json(value, json_format, 1))
+    return first
+
+def write_json_stream(json_path, data, json_format='pretty', batch_size=JSON_BATCH_SIZE):
+    """
+    Write a dictionary or an array to a JSON file, one batch of array items at a time
+
+    In pretty format the output is identical to json.dump(data, f, indent=4),
+    but arrays, array streams, and annotation tables are written in batches
+    instead of building the whole string in memory.
+
+    Parameters
+    ----------
+    json_path : Path
+        Path to the JSON file
+    data : dict or iterable
+        A dictionary of JSON values and arrays, such as lists, JsonArrayStream
+        and AnnotationTable objects, or the items of a top-level array
+    json_format : str, optional
+        'pretty' for an indent of 4, 'compact' for no whitespace, or 'fast'
+        for compact output with orjson, 'pretty' by default
+    batch_size : int, optional
+        Number of array items encoded at a time
+
+    """
+    with open(json_path, 'wb') as f:
+        if not isinstance(data, dict):
+            write_json_array(f, data, json_format, 0, batch_size)
+            return
+
+        f.write(b'{')
+        write_json_members(f, data.items(), json_format, batch_size)
+        f.write(b'\n}' if json_format == 'pretty' and data else b'}')
+
+@contextmanager
+def open_json_stream(json_path, data, key, json_format='pretty', batch_size=JSON_BATCH_SIZE):
+    """
+    Write a dictionary to a JSON file, with the items of one array given as they come
+
+    The output is the same as write_json_stream with the items of the array
+    in data, for arrays whose items are only known one batch at a time, such
+    as when one stream of annotations is split into several files.
+
+    Parameters
+    ----------
+    json_path : Path
+        Path to the JSON file
+    data : dict
+        A dictionary of JSON values and arrays, the value of key is ignored
+    key : str
+        Key of the array whose items are written through the yielded writer
+    json_format : str, optional
+        Output format, 'pretty' by default
+    batch_size : int, optional
+        Number of array items encoded at a time
+
+    Yields
+    ------
+    JsonArrayWriter
+        Writer of the items of the array
+
+    """
+    members = list(data.items())
+    index = list(data).index(key)
+    with open(json_path, 'wb') as f:
+        f.write(b'{')
+        first = write_json_members(f, members[:index], json_format, batch_size)
+        write_json_members(f, [(key, None)], json_format, batch_size, first)
+        writer = JsonArrayWriter(f, json_format, 1, batch_size)
+        yield writer
+        writer.close()
+        write_json_members(f, members[index + 1:], json_format, batch_size, False)
+        f.write(b'\n}' if json_format == 'pretty' else b'}')
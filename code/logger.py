@@ -1,3 +1,4 @@
+from time import monotonic
 import logging
 
 # Configure the logger
@@ -5,3 +6,90 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 
 # Create a logger instance
 LOGGER = logging.getLogger('annotation_converter')
+
+# Seconds between two progress events of a stage
+PROGRESS_INTERVAL = 1.0
+
+def format_duration(seconds):
+    if seconds == float('inf'):
+        return '?'
+    minutes, seconds = divmod(int(seconds + 0.5), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f'{hours}h{minutes:02d}m{seconds:02d}s'
+    if minutes:
+        return f'{minutes}m{seconds:02d}s'
+    return f'{seconds}s'
+
+class Progress:
+    """
+    Throttled progress of a stage, sent to LOGGER at most once per interval
+
+    Updates only count items and check the clock, so a stage can update its
+    progress for every item at almost no cost. Every event carries the stage,
+    count, total, rate, and ETA as record attributes for structured handlers.
+    Events are logged at INFO level in verbose mode and at DEBUG level otherwise.
+
+    Parameters
+    ----------
+    stage : str
+        Name of the stage
+    total : int, optional
+        Number of items of the stage, if known
+    verbose : bool, optional
+        Log at INFO level instead of DEBUG, True by default
+    unit : str, optional
+        Name of the items, 'items' by default
+    interval : float, optional
+        Seconds between two progress events, PROGRESS_INTERVAL by default
+
+    """
+    def __init__(self, stage, total=None, verbose=True, unit='items', interval=PROGRESS_INTERVAL):
+        self.stage = stage
+        self.total = total
+        self.unit = unit
+        self.level = logging.INFO if verbose else logging.DEBUG
+        self.interval = interval
+        self.enabled = LOGGER.isEnabledFor(self.level)
+        self.count = 0
+        self.start = monotonic()
+        self.next_event = self.start + interval
+
+    def update(self, n=1):
+        self.count += n
+        if self.enabled:
+            now = monotonic()
+            if now >= self.next_event:
+                self.next_event = now + self.interval
+                self.log(now)
+
+    def log(self, now, done=False):
+        elapsed = now - self.start
+        rate = self.count / elapsed if elapsed > 0 else 0.0
+        if done:
+            eta = 0.0
+        elif self.total is not None and rate > 0:
+            eta = max(0.0, (self.total - self.count) / rate)
+        else:
+            eta = float('inf')
+
+        fields = {'stage': self.stage, 'count': self.count, 'total': self.total, 'rate': rate, 'eta': eta}
+        count = f"{self.count}/{self.total}" if self.total is not None else str(self.count)
+        if done:
+            LOGGER.log(self.level, "%s: %s %s in %s (%.1f %s/s)", self.stage, count, self.unit,
+                       format_duration(elapsed), rate, self.unit, extra=fields)
+        else:
+            LOGGER.log(self.level, "%s: %s %s (%.1f %s/s, ETA %s)", self.stage, count, self.unit,
+                       rate, self.unit, format_duration(eta), extra=fields)
+
+    def close(self):
+        # Final event with the totals of the stage
+        if self.enabled:
+            self.log(monotonic(), done=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
@@ -1,7 +1,10 @@
-from shutil import rmtree
+from os import cpu_count
 from typing import Union
-from utils import get_user_input, get_root_path
+from utils import get_user_input, get_root_path, get_dst_name, prepare_dst_path
 from converter import convert
+from splitter import split, SPLIT_NAMES
+from converter_utils import TRANSFER_MODES, MASK_TYPES
+from json_utils import JSON_FORMATS
 
 def get_options() -> dict[str, Union[float, str]]:
     """
@@ -46,19 +49,34 @@ def get_options() -> dict[str, Union[float, str]]:
         else:
             dst_format = src_format
 
+    # Get user input for the kind of masks of a bin dataset
+    if src_format == 'bin':
+        mask_type = get_user_input('Enter mask type: ', MASK_TYPES)
+    else:
+        mask_type = 'binary'
+
+    # Get user input for simplifying segmentation polygons
+    if task == 'segment' and mode == 'convert':
+        simplify_tolerance = get_user_input('Enter polygon simplification tolerance in pixels, enter 0 for none: ', (0.0, 100.0))
+    else:
+        simplify_tolerance = 0.0
+
+    # Get user input for how images are transferred to the destination
+    transfer = get_user_input('Enter image transfer mode: ', TRANSFER_MODES)
+
+    # Get user input for how JSON annotation files are written
+    if dst_format in ['coco', 'cira']:
+        json_format = get_user_input('Enter JSON output format: ', JSON_FORMATS)
+    else:
+        json_format = 'pretty'
+
     # Define source and destination paths
     src_path = datasets_path / src_dataset
-    dst_path = output_path / f'{src_dataset}_{task[0]}{mode[0]}{src_format[0]}{dst_format[2]}'
+    dst_path = output_path / get_dst_name(src_dataset, task, mode, src_format, dst_format)
 
-    # Create or overwrite the destination directory
-    if not dst_path.exists():
-        dst_path.mkdir()
-        print(f"Created new directory at {dst_path}")
-    else:
-        print(f"Directory {dst_path} already exists, it will be overwritten.")
-        rmtree(dst_path)
-        dst_path.mkdir()
-        print(f"Created new directory at {dst_path}")
+    # Create, update, or overwrite the destination directory
+    incremental = get_user_input('Incremental mode, only convert changed files: ', ['yes', 'no']) == 'yes'
+    prepare_dst_path(dst_path, incremental)
 
     # Store the options in a dictionary and return it
     options = {
@@ -70,6 +88,13 @@ def get_options() -> dict[str, Union[float, str]]:
         'root_path': root_path,
         'src_path': src_path,
         'dst_path': dst_path,
+        'mask_type': mask_type,
+        'simplify_tolerance': simplify_tolerance,
+        'transfer': transfer,
+        'json_format': json_format,
+        'incremental': incremental,
+        'workers': cpu_count() or 1,
+        'copy_threads': min(32, (cpu_count() or 1) + 4),
     }
 
     return options
@@ -103,17 +128,21 @@ def main(options: dict[str, Union[float, str]]):
     elif options['mode'] == 'split':
         test_train_ratio = get_user_input('Enter test/train ratio: ', (0.0, 1.0))
         val_ratio = get_user_input('Enter validation ratio, enter 0 for no validation set: ', (0.0, 1.0)) 
-        seed = get_user_input('Enter random seed: ', (0, 1000))
-        split_names = ['train', 'val', 'test'] 
+        seed = int(get_user_input('Enter random seed: ', (0, 1000)))
+        stratify = get_user_input('Stratify splits by class: ', ['yes', 'no']) == 'yes'
+        split_names = SPLIT_NAMES
 
-        print(f"Splitting {options['src_dataset']} dataset into {', '.join(split_names)} sets with ratios: test/train = {test_train_ratio}, val/test = {val_ratio}...")
+        print(f"Splitting {options['src_dataset']} dataset into {', '.join(split_names)} sets with ratios: test = {test_train_ratio}, val = {val_ratio}...")
 
         options['test_train_ratio'] = test_train_ratio
         options['val_ratio'] = val_ratio
         options['seed'] = seed
+        options['stratify'] = stratify
         options['split_names'] = split_names
         print_options(options)
 
+        split(options, verbose)
+
 if __name__ == '__main__':
     opt = get_options()
     main(opt)
\ No newline at end of file
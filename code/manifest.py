@@ -0,0 +1,173 @@
+from pathlib import Path
+from hashlib import blake2b
+import json
+
+from logger import LOGGER
+
+# Options that change the content of the converted dataset
+MANIFEST_OPTIONS = [
+    'src_path', 'src_format', 'dst_format', 'task', 'transfer', 'json_format',
+    'mode', 'test_train_ratio', 'val_ratio', 'seed', 'stratify', 'mask_type', 'instance_divisor',
+    'tile_rows', 'simplify_tolerance', 'max_vertices', 'min_area'
+]
+HASH_CHUNK_SIZE = 1 << 20
+
+def get_manifest_path(dst_path):
+    """
+    Get the path of the manifest of a destination directory, stored next to it
+
+    """
+    return dst_path.with_name(f'{dst_path.name}.manifest.json')
+
+def hash_file(path):
+    """
+    Hash the content of a file
+
+    Parameters
+    ----------
+    path : Path
+        Path to the file
+
+    Returns
+    -------
+    str
+        Hexadecimal BLAKE2b digest of the file
+
+    """
+    digest = blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def hash_bytes(data):
+    return blake2b(data, digest_size=16).hexdigest()
+
+class Manifest:
+    """
+    Record of the sources and outputs of a conversion, for incremental reruns
+
+    Sources are recorded with their size, modification time, and content hash,
+    and outputs with the sources they were made from or their content hash.
+    The manifest is stored next to the destination directory as
+    <destination>.manifest.json.
+
+    Parameters
+    ----------
+    dst_path : Path
+        Destination path of the converted dataset
+    opt : dict
+        A dictionary containing the selected options, the previous manifest is
+        only trusted if its options match
+
+    """
+    def __init__(self, dst_path, opt):
+        self.path = get_manifest_path(dst_path)
+        self.options = {key: str(opt.get(key, '')) for key in MANIFEST_OPTIONS}
+        self.sources = {}
+        self.changed = {}
+        self.outputs = {}
+
+        previous = {}
+        if self.path.is_file():
+            with open(self.path, 'r') as f:
+                previous = json.load(f)
+
+        # Outputs of the previous run are always known so stale ones can be removed,
+        # but sources and outputs are only reused if the options did not change
+        self.previous_outputs = previous.get('outputs', {})
+        self.trusted = previous.get('options') == self.options
+        self.previous_sources = previous.get('sources', {}) if self.trusted else {}
+
+    def source_changed(self, path):
+        """
+        Record a source file and check if it changed since the previous run
+
+        The content is only hashed when the size or modification time changed.
+
+        Parameters
+        ----------
+        path : Path
+            Path to the source file
+
+        Returns
+        -------
+        bool
+            True if the file is new or its content changed
+
+        """
+        key = str(path)
+        if key in self.changed:
+            return self.changed[key]
+
+        stat = path.stat()
+        previous = self.previous_sources.get(key)
+        if previous and previous['size'] == stat.st_size and previous['mtime_ns'] == stat.st_mtime_ns:
+            entry = previous
+        else:
+            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': hash_file(path)}
+
+        self.sources[key] = entry
+        self.changed[key] = previous is None or previous['hash'] != entry['hash']
+        return self.changed[key]
+
+    def output_current(self, path, sources=(), content_hash=None):
+        """
+        Check if an output file from the previous run can be kept as is
+
+        Parameters
+        ----------
+        path : Path
+            Path to the output file
+        sources : list, optional
+            Paths to the source files of the output, which must be unchanged
+        content_hash : str, optional
+            Hash of the new content of the output, which must match the previous one
+
+        Returns
+        -------
+        bool
+            True if the output exists and neither its sources nor its content changed
+
+        """
+        # Check every source first so they are all recorded
+        changed = [self.source_changed(source) for source in sources]
+
+        previous = self.previous_outputs.get(str(path))
+        if not self.trusted or previous is None or any(changed) or not path.exists():
+            return False
+        if previous.get('sources') != [str(source) for source in sources]:
+            return False
+        return content_hash is None or previous.get('hash') == content_hash
+
+    def record_output(self, path, sources=(), content_hash=None):
+        self.outputs[str(path)] = {'sources': [str(source) for source in sources], 'hash': content_hash}
+
+    def remove_stale(self, verbose=True):
+        """
+        Delete outputs of the previous run that were not produced by this run
+
+        Parameters
+        ----------
+        verbose : bool, optional
+            Log every removed file, True by default
+
+        Returns
+        -------
+        int
+            Number of files deleted
+
+        """
+        n_removed = 0
+        for key in self.previous_outputs.keys() - self.outputs.keys():
+            path = Path(key)
+            if path.is_symlink() or path.is_file():
+                path.unlink()
+                n_removed += 1
+                if verbose:
+                    LOGGER.info(f"Removed stale output {path}")
+        return n_removed
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump({'options': self.options, 'sources': self.sources, 'outputs': self.outputs}, f)
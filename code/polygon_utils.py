@@ -0,0 +1,400 @@
+import numpy as np
+
+from annotation_table import AnnotationTable, iter_annotation_batches, ranges_to_indices
+from logger import LOGGER
+
+# Number of streamed annotations simplified at a time
+SIMPLIFY_BATCH_SIZE = 10000
+
+class SimplifyStats:
+    """
+    Polygons, vertices, and coordinate bytes before and after simplification
+
+    """
+    def __init__(self):
+        self.annotations_in = 0
+        self.annotations_out = 0
+        self.polygons_in = 0
+        self.polygons_out = 0
+        self.vertices_in = 0
+        self.vertices_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def add(self, table, simplified):
+        self.annotations_in += len(table)
+        self.annotations_out += len(simplified)
+        self.polygons_in += len(table.coord_offsets) - 1
+        self.polygons_out += len(simplified.coord_offsets) - 1
+        self.vertices_in += len(table.coords) // 2
+        self.vertices_out += len(simplified.coords) // 2
+        self.bytes_in += table.coords.nbytes
+        self.bytes_out += simplified.coords.nbytes
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def log(self):
+        reduction = 1 - self.vertices_out / self.vertices_in if self.vertices_in else 0.0
+        LOGGER.info(f"Simplified {self.polygons_in} polygons to {self.polygons_out}: {self.vertices_in} to "
+                    f"{self.vertices_out} vertices ({reduction:.1%} fewer), {self.bytes_in} to {self.bytes_out} "
+                    f"coordinate bytes, {self.annotations_in - self.annotations_out} annotations dropped")
+
+class SimplifiedAnnotations:
+    """
+    Re-iterable stream of annotations simplified one batch at a time
+
+    Parameters
+    ----------
+    annotations : iterable
+        Annotation dictionaries, such as a JsonArrayStream
+    stats : SimplifyStats
+        Statistics updated while the stream is iterated
+    **options
+        Options of simplify_table
+
+    """
+    def __init__(self, annotations, stats, **options):
+        self.annotations = annotations
+        self.stats = stats
+        self.options = options
+
+    def __iter__(self):
+        for batch in iter_annotation_batches(self.annotations, SIMPLIFY_BATCH_SIZE):
+            yield from simplify_table(batch, stats=self.stats, **self.options).iter_dicts()
+
+def counts_in_ranges(mask, offsets):
+    # Number of True values of mask in every range of offsets
+    totals = np.concatenate(([0], np.cumsum(mask, dtype=np.int64)))
+    return totals[offsets[1:]] - totals[offsets[:-1]]
+
+def first_in_groups(values, groups):
+    # Position of the first True value of every group, groups are sorted and each has one
+    candidates = np.flatnonzero(values)
+    group_of = groups[candidates]
+    return candidates[np.concatenate(([True], group_of[1:] != group_of[:-1]))]
+
+def polygon_areas(points, offsets):
+    """
+    Compute the area of every polygon with the shoelace formula
+
+    Parameters
+    ----------
+    points : ndarray
+        Points of all polygons, of shape (n, 2)
+    offsets : ndarray
+        Start of each polygon in points, followed by the end of the last one
+
+    Returns
+    -------
+    ndarray
+        Area of each polygon
+
+    """
+    counts = np.diff(offsets)
+    closing = np.arange(1, len(points) + 1)
+    closing[offsets[1:][counts > 0] - 1] = offsets[:-1][counts > 0]
+    points = points.astype(np.float64)
+    cross = points[:, 0] * points[closing, 1] - points[closing, 0] * points[:, 1]
+    totals = np.concatenate(([0.0], np.cumsum(cross)))
+    return np.abs(totals[offsets[1:]] - totals[offsets[:-1]]) / 2
+
+def fit_boxes(points, offsets, polygon_offsets, valid, areas):
+    """
+    Compute the bounding box and area of the valid polygons of every annotation
+
+    Parameters
+    ----------
+    points : ndarray
+        Points of all polygons, of shape (n, 2)
+    offsets : ndarray
+        Start of each polygon in points, followed by the end of the last one
+    polygon_offsets : ndarray
+        Start of each annotation in the polygons, followed by the end of the last one
+    valid : ndarray
+        Mask of the polygons to fit
+    areas : ndarray
+        Area of each polygon
+
+    Returns
+    -------
+    ndarray
+        Bounding box of each annotation as x, y, width, height, zeros if it has no valid polygons
+    ndarray
+        Total area of the valid polygons of each annotation
+
+    """
+    n_annotations = len(polygon_offsets) - 1
+    annotation_of = np.repeat(np.arange(n_annotations), np.diff(polygon_offsets))
+    point_valid = np.repeat(valid, np.diff(offsets))
+    valid_points = points[point_valid].astype(np.float64)
+    point_counts = np.bincount(np.repeat(annotation_of, np.diff(offsets))[point_valid], minlength=n_annotations)
+
+    # Points of an annotation are consecutive, so each box reduces one range
+    bboxes = np.zeros((n_annotations, 4))
+    fitted = point_counts > 0
+    starts = np.concatenate(([0], np.cumsum(point_counts)[:-1]))[fitted]
+    if len(starts):
+        min_xy = np.minimum.reduceat(valid_points, starts)
+        bboxes[fitted] = np.column_stack((min_xy, np.maximum.reduceat(valid_points, starts) - min_xy))
+    return bboxes, np.bincount(annotation_of[valid], weights=areas[valid], minlength=n_annotations)
+
+def replace_rows(column, integers, rows, values):
+    # Column with new values in some rows, which stay integers if they were and are whole
+    was_integer = integers if integers is not None else np.full(column.shape, column.dtype.kind != 'f')
+    integers = was_integer.copy()
+    integers[rows] &= values == np.round(values)
+    column = column.astype(np.float64)
+    column[rows] = values
+    return column, integers if integers.any() else None
+
+def douglas_peucker(points, offsets, tolerances, max_vertices=None):
+    """
+    Select the vertices of closed polygons kept by the Douglas-Peucker algorithm
+
+    Every polygon is split into two chains at the point farthest from its
+    first point, and all chains of all polygons are then refined together,
+    one level of the recursion per round. The chain with the farther point
+    is split once regardless of the tolerance, so polygons keep at least
+    three vertices. With max_vertices, a round only splits the chains with
+    the farthest points of a polygon that still fit in its budget.
+
+    Parameters
+    ----------
+    points : ndarray
+        Points of all polygons, of shape (n, 2)
+    offsets : ndarray
+        Start of each polygon in points, followed by the end of the last one
+    tolerances : ndarray
+        Largest distance of a removed vertex to the simplified outline, per polygon
+    max_vertices : int, optional
+        Largest number of vertices per polygon, at least 3, no limit by default
+
+    Returns
+    -------
+    ndarray
+        True for every kept point
+
+    """
+    points = points.astype(np.float64)
+    counts = np.diff(offsets)
+    keep = np.zeros(len(points), dtype=bool)
+
+    # Polygons of three points or fewer are kept whole
+    small = counts <= 3
+    keep[ranges_to_indices(offsets[:-1][small], counts[small])] = True
+    polygons = np.flatnonzero(~small)
+    if not len(polygons):
+        return keep
+
+    starts = offsets[polygons]
+    lengths = counts[polygons]
+    keep[starts] = True
+
+    # The point farthest from the first one splits each polygon into two chains
+    rest = ranges_to_indices(starts + 1, lengths - 1)
+    groups = np.repeat(np.arange(len(polygons)), lengths - 1)
+    distances = ((points[rest] - points[starts][groups]) ** 2).sum(axis=1)
+    group_starts = np.concatenate(([0], np.cumsum(lengths - 1)[:-1]))
+    farthest = rest[first_in_groups(distances == np.maximum.reduceat(distances, group_starts)[groups], groups)]
+    keep[farthest] = True
+
+    # Chains run from a first to a last index, the last point of the second chain is the first point again
+    chain_first = np.concatenate((starts, farthest))
+    chain_last = np.concatenate((farthest, starts + lengths))
+    chain_end_point = np.concatenate((farthest, starts))
+    chain_polygon = np.tile(np.arange(len(polygons)), 2)
+    chain_tolerance = np.tile(tolerances[polygons], 2)
+    kept_counts = np.full(len(polygons), 2)
+
+    first_round = True
+    while len(chain_first):
+        interior_counts = chain_last - chain_first - 1
+        has_interior = interior_counts > 0
+        chain_first, chain_last, chain_end_point, chain_polygon, chain_tolerance, interior_counts = (
+            column[has_interior] for column in
+            [chain_first, chain_last, chain_end_point, chain_polygon, chain_tolerance, interior_counts]
+        )
+        if not len(chain_first):
+            break
+
+        # Distance of every interior point to the line through the ends of its chain
+        interior = ranges_to_indices(chain_first + 1, interior_counts)
+        chains = np.repeat(np.arange(len(chain_first)), interior_counts)
+        first_points = points[chain_first][chains]
+        direction = points[chain_end_point][chains] - first_points
+        offset = points[interior] - first_points
+        norms = np.hypot(direction[:, 0], direction[:, 1])
+        cross = np.abs(direction[:, 0] * offset[:, 1] - direction[:, 1] * offset[:, 0])
+        distances = np.where(norms > 0, cross / np.where(norms > 0, norms, 1), np.hypot(offset[:, 0], offset[:, 1]))
+
+        chain_starts = np.concatenate(([0], np.cumsum(interior_counts)[:-1]))
+        max_distances = np.maximum.reduceat(distances, chain_starts)
+        split = max_distances > chain_tolerance
+        if first_round:
+            # Split the chain with the farther point of every polygon, for at least three vertices
+            polygon_max = np.zeros(len(polygons))
+            np.maximum.at(polygon_max, chain_polygon, max_distances)
+            split |= max_distances == polygon_max[chain_polygon]
+            first_round = False
+        if max_vertices is not None:
+            # Rank the splits of every polygon by distance and keep those within its budget
+            candidates = np.flatnonzero(split)
+            candidates = candidates[np.lexsort((-max_distances[candidates], chain_polygon[candidates]))]
+            candidate_polygons = chain_polygon[candidates]
+            group_starts = np.flatnonzero(np.concatenate(([True], candidate_polygons[1:] != candidate_polygons[:-1])))
+            ranks = np.arange(len(candidates)) - np.repeat(group_starts, np.diff(np.append(group_starts, len(candidates))))
+            split[candidates[ranks >= max_vertices - kept_counts[candidate_polygons]]] = False
+            kept_counts += np.bincount(chain_polygon[split], minlength=len(polygons))
+
+        middle = interior[first_in_groups(distances == max_distances[chains], chains)][split]
+        keep[middle] = True
+
+        chain_first, chain_last, chain_end_point, chain_polygon, chain_tolerance = (
+            np.concatenate((chain_first[split], middle)),
+            np.concatenate((middle, chain_last[split])),
+            np.concatenate((middle, chain_end_point[split])),
+            np.tile(chain_polygon[split], 2),
+            np.tile(chain_tolerance[split], 2),
+        )
+
+    return keep
+
+def simplify_polygons(points, offsets, tolerance=0.0, max_vertices=None):
+    """
+    Simplify closed polygons to a tolerance and a largest number of vertices
+
+    Polygons that would keep more than max_vertices vertices at the
+    tolerance keep the vertices found first, the farthest ones of each
+    level of the recursion.
+
+    Parameters
+    ----------
+    points : ndarray
+        Points of all polygons, of shape (n, 2)
+    offsets : ndarray
+        Start of each polygon in points, followed by the end of the last one
+    tolerance : float, optional
+        Largest distance of a removed vertex to the simplified outline, 0 by default
+    max_vertices : int, optional
+        Largest number of vertices per polygon, at least 3, no limit by default
+
+    Returns
+    -------
+    ndarray
+        True for every kept point
+
+    """
+    tolerances = np.full(len(offsets) - 1, float(tolerance))
+    return douglas_peucker(points, offsets, tolerances, max_vertices)
+
+def simplify_table(table, tolerance=0.0, max_vertices=None, min_area=0.0, stats=None):
+    """
+    Simplify the polygons of a table and drop speckles
+
+    Polygons smaller than min_area are dropped first, then the others are
+    simplified. Annotations left without polygons are dropped, annotations
+    that never had any, such as boxes or RLE masks, are kept. Annotations
+    left with some of their polygons get the bounding box and total area of
+    those, others keep their boxes and areas, as simplification only moves
+    outlines by less than the tolerance.
+
+    Parameters
+    ----------
+    table : AnnotationTable
+        Table of annotations
+    tolerance : float, optional
+        Largest distance of a removed vertex to the simplified outline in pixels, 0 by default
+    max_vertices : int, optional
+        Largest number of vertices per polygon, no limit by default
+    min_area : float, optional
+        Smallest area of a kept polygon in square pixels, 0 by default
+    stats : SimplifyStats, optional
+        Statistics to add the table to
+
+    Returns
+    -------
+    AnnotationTable
+        Table of the simplified annotations
+
+    """
+    # Points of every polygon, a trailing odd coordinate is dropped
+    point_counts = np.diff(table.coord_offsets) // 2
+    coord_indices = ranges_to_indices(table.coord_offsets[:-1], point_counts * 2).reshape(-1, 2)
+    points = table.coords[coord_indices]
+    offsets = np.concatenate(([0], np.cumsum(point_counts)))
+
+    valid = np.ones(len(point_counts), dtype=bool)
+    if min_area > 0:
+        areas = polygon_areas(points, offsets)
+        valid = areas >= min_area
+
+    keep = np.zeros(len(points), dtype=bool)
+    indices = ranges_to_indices(offsets[:-1][valid], point_counts[valid])
+    if tolerance > 0 or max_vertices is not None:
+        sub_offsets = np.concatenate(([0], np.cumsum(point_counts[valid])))
+        keep[indices] = simplify_polygons(points[indices], sub_offsets, tolerance, max_vertices)
+    else:
+        keep[indices] = True
+
+    # Drop annotations whose polygons were all dropped
+    kept_counts = counts_in_ranges(keep, offsets)[valid]
+    polygon_counts = counts_in_ranges(valid, table.polygon_offsets)
+    annotations = np.flatnonzero((polygon_counts > 0) | (np.diff(table.polygon_offsets) == 0))
+
+    # Annotations that lost some of their polygons are fitted to the others
+    bboxes = table.bboxes[annotations]
+    areas_kept = table.areas[annotations]
+    integers = table.select_integers(annotations, coord_indices[keep].ravel())
+    reduced = np.flatnonzero((polygon_counts < np.diff(table.polygon_offsets))[annotations])
+    if len(reduced):
+        fitted_boxes, fitted_areas = fit_boxes(points, offsets, table.polygon_offsets, valid, areas)
+        bboxes, integers['bbox'] = replace_rows(bboxes, integers.get('bbox'), reduced, fitted_boxes[annotations[reduced]])
+        areas_kept, integers['area'] = replace_rows(areas_kept, integers.get('area'), reduced, fitted_areas[annotations[reduced]])
+
+    simplified = AnnotationTable(
+        table.ids[annotations],
+        table.image_ids[annotations],
+        table.category_ids[annotations],
+        bboxes,
+        areas_kept,
+        table.iscrowd[annotations],
+        points[keep].ravel(),
+        np.concatenate(([0], np.cumsum(kept_counts * 2))),
+        np.concatenate(([0], np.cumsum(polygon_counts[annotations]))),
+        table.fields,
+        [table.extras[i] for i in annotations.tolist()] if table.extras is not None else None,
+        [table.key_orders[i] for i in annotations.tolist()] if table.key_orders is not None else None,
+        integers
+    )
+    if stats is not None:
+        stats.add(table, simplified)
+    return simplified
+
+def simplify_annotations(annotations, tolerance=0.0, max_vertices=None, min_area=0.0, stats=None):
+    """
+    Simplify a table of annotations, or wrap a stream to simplify it while it is read
+
+    Parameters
+    ----------
+    annotations : AnnotationTable or iterable
+        Table of annotations, or annotation dictionaries such as a JsonArrayStream
+    tolerance : float, optional
+        Largest distance of a removed vertex to the simplified outline in pixels, 0 by default
+    max_vertices : int, optional
+        Largest number of vertices per polygon, no limit by default
+    min_area : float, optional
+        Smallest area of a kept polygon in square pixels, 0 by default
+    stats : SimplifyStats, optional
+        Statistics to add the annotations to, streams add them when they are read
+
+    Returns
+    -------
+    AnnotationTable or SimplifiedAnnotations
+        Simplified annotations
+
+    """
+    if isinstance(annotations, AnnotationTable):
+        return simplify_table(annotations, tolerance, max_vertices, min_area, stats)
+    return SimplifiedAnnotations(annotations, stats if stats is not None else SimplifyStats(),
+                                 tolerance=tolerance, max_vertices=max_vertices, min_area=min_area)
@@ -0,0 +1,203 @@
+from contextlib import contextmanager
+from pathlib import Path
+from time import perf_counter
+import cProfile
+import json
+import sys
+
+from logger import LOGGER
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Stages of a conversion, in pipeline order
+PROFILE_STAGES = ['ingest', 'simplify', 'copy', 'convert', 'write']
+
+class StageStats:
+    """
+    Totals of a stage over every split it ran for
+
+    """
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+        self.items = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.peak_rss = 0
+
+    def add(self, items=0, bytes_read=0, bytes_written=0):
+        self.items += items
+        self.bytes_read += bytes_read
+        self.bytes_written += bytes_written
+
+    def as_dict(self):
+        return {
+            'seconds': round(self.seconds, 6),
+            'calls': self.calls,
+            'items': self.items,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'peak_rss_bytes': self.peak_rss,
+        }
+
+class Profiler:
+    """
+    Per-stage wall time, item counts, bytes read and written, and peak RSS
+
+    Every stage is timed each time it runs, once per split for most stages,
+    and its counts add up over the runs. Peak RSS is the high-water mark of
+    the process resident set size during the stage where Linux allows
+    resetting it, and the high-water mark of the process so far otherwise.
+    Worker processes are not included, the peak of the largest one is
+    reported separately for the whole conversion.
+
+    Timing a stage costs two clock reads, so a profiler is always used and
+    only writes a report when asked to.
+
+    Parameters
+    ----------
+    profile_stage : str, optional
+        Stage to run under cProfile, None by default
+    profile_path : Path, optional
+        Path of the cProfile dump of profile_stage
+
+    """
+    def __init__(self, profile_stage=None, profile_path=None):
+        self.stages = {}
+        self.start = perf_counter()
+        self.peak_rss = 0
+        self.profile_stage = profile_stage
+        self.profile_path = profile_path
+        self.cprofile = cProfile.Profile() if profile_stage is not None else None
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time a stage, and run it under cProfile if it is the profiled stage
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage, one of PROFILE_STAGES
+
+        Yields
+        ------
+        StageStats
+            Totals of the stage, for the stage to add its items and bytes to
+
+        """
+        stats = self.stages.setdefault(name, StageStats())
+        profiled = name == self.profile_stage
+        # Keep the peak so far before resetting it for the stage
+        self.peak_rss = max(self.peak_rss, get_peak_rss())
+        reset_peak_rss()
+        start = perf_counter()
+        if profiled:
+            self.cprofile.enable()
+        try:
+            yield stats
+        finally:
+            if profiled:
+                self.cprofile.disable()
+            stats.seconds += perf_counter() - start
+            stats.calls += 1
+            stats.peak_rss = max(stats.peak_rss, get_peak_rss())
+
+    def report(self):
+        """
+        Build the report of every stage that ran
+
+        Returns
+        -------
+        dict
+            Total time, peak RSS of the process and of its workers, and the
+            totals of every stage in pipeline order
+
+        """
+        names = sorted(self.stages, key=lambda name: PROFILE_STAGES.index(name) if name in PROFILE_STAGES else len(PROFILE_STAGES))
+        return {
+            'seconds': round(perf_counter() - self.start, 6),
+            'peak_rss_bytes': max(self.peak_rss, get_peak_rss()),
+            'peak_worker_rss_bytes': get_peak_rss(children=True),
+            'stages': {name: self.stages[name].as_dict() for name in names},
+            'cprofile': str(self.profile_path) if self.cprofile is not None else None,
+        }
+
+    def write_report(self, report_path, verbose=True):
+        """
+        Write the JSON report, and the cProfile dump of the profiled stage
+
+        Parameters
+        ----------
+        report_path : Path
+            Path of the JSON report
+        verbose : bool, optional
+            Log the time of every stage, True by default
+
+        Returns
+        -------
+        dict
+            The report
+
+        """
+        report = self.report()
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(self.profile_path)
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=4)
+
+        if verbose:
+            for name, stats in report['stages'].items():
+                LOGGER.info(f"Stage {name}: {stats['seconds']:.3f}s, {stats['items']} items, "
+                            f"{stats['bytes_read']} bytes read, {stats['bytes_written']} bytes written, "
+                            f"peak RSS {stats['peak_rss_bytes'] / 1024 ** 2:.1f} MB")
+            LOGGER.info(f"Wrote profiling report to {report_path}")
+        return report
+
+def get_profile_path(report_path, stage):
+    # The cProfile dump goes next to the report, named after the stage
+    report_path = Path(report_path)
+    return report_path.with_name(f'{report_path.stem}.{stage}.prof')
+
+def reset_peak_rss():
+    # Writing 5 to clear_refs resets the VmHWM high-water mark on Linux
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def get_peak_rss(children=False):
+    """
+    Get the peak resident set size in bytes, since the last reset_peak_rss if
+    it is supported
+
+    Parameters
+    ----------
+    children : bool, optional
+        Peak of the largest finished worker process instead of this process,
+        False by default
+
+    Returns
+    -------
+    int
+        Peak resident set size in bytes, 0 if it is not available
+
+    """
+    if not children:
+        try:
+            with open('/proc/self/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+    if resource is None:
+        return 0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
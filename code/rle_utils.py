@@ -0,0 +1,407 @@
+import numpy as np
+
+from annotation_table import AnnotationTable, ranges_to_indices
+
+# Largest number of pixels of a canvas RLE masks are traced on together
+RLE_CANVAS_PIXELS = 1 << 22
+
+def decode_counts(counts):
+    """
+    Decode the run lengths of a COCO RLE, compressed or not
+
+    Parameters
+    ----------
+    counts : str, bytes, or list
+        Compressed string or list of run lengths, starting with a background run
+
+    Returns
+    -------
+    ndarray
+        Run lengths
+
+    """
+    if not isinstance(counts, (str, bytes)):
+        return np.asarray(counts, dtype=np.int64).ravel()
+    return decode_count_strings([counts])[0]
+
+def decode_count_strings(strings):
+    """
+    Decode many compressed COCO RLE count strings at once
+
+    Compressed counts are the LEB128-like strings of the COCO API: every
+    count is written in 5 bit groups as characters from '0', with a
+    continuation bit and a sign bit in its last group, and counts after the
+    third are differences to the count two before. The strings are joined
+    and decoded without a loop over their characters or counts.
+
+    Parameters
+    ----------
+    strings : list
+        Compressed counts as str or bytes
+
+    Returns
+    -------
+    ndarray
+        Run lengths of all strings, one after the other
+    ndarray
+        Number of run lengths of each string
+
+    """
+    strings = [string.encode('ascii') if isinstance(string, str) else string for string in strings]
+    string_ends = np.cumsum([len(string) for string in strings], dtype=np.int64)
+    chars = np.frombuffer(b''.join(strings), dtype=np.uint8).astype(np.int64) - 48
+
+    # Characters must be in range, and the last one of a string must end a count
+    invalid = (chars < 0) | (chars > 63)
+    last_chars = string_ends[np.diff(np.concatenate(([0], string_ends))) > 0] - 1
+    invalid[last_chars] |= (chars[last_chars] & 0x20) != 0
+    if invalid.any():
+        string = strings[np.searchsorted(string_ends, np.flatnonzero(invalid)[0], 'right')]
+        raise ValueError(f"Invalid compressed RLE counts {string[:32]!r}")
+
+    # Every count ends with a character without the continuation bit
+    ends = np.flatnonzero((chars & 0x20) == 0)
+    starts = np.concatenate(([0], ends + 1))[:len(ends)]
+    shifts = 5 * (np.arange(len(chars)) - np.repeat(starts, ends - starts + 1))
+    values = np.add.reduceat((chars & 0x1f) << shifts, starts) if len(chars) else np.empty(0, dtype=np.int64)
+    negative = (chars[ends] & 0x10) != 0
+    values[negative] -= np.int64(1) << (shifts[ends][negative] + 5)
+
+    # Undo the differences to the count two before, within each string
+    lengths = np.diff(np.concatenate(([0], np.searchsorted(ends, string_ends))))
+    firsts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    positions = np.arange(len(values)) - firsts
+    last = max(len(values) - 1, 0)
+    evens = np.cumsum(np.where((positions >= 2) & (positions % 2 == 0), values, 0))
+    odds = np.cumsum(np.where((positions >= 3) & (positions % 2 == 1), values, 0))
+    values = np.where(
+        positions < 2, values,
+        np.where(positions % 2 == 0,
+                 evens - evens[np.minimum(firsts + 1, last)],
+                 odds - odds[np.minimum(firsts + 2, last)] + values[np.minimum(firsts + 1, last)])
+    )
+    return values, lengths
+
+def encode_counts(counts):
+    """
+    Encode run lengths as a compressed COCO RLE string
+
+    Parameters
+    ----------
+    counts : array_like
+        Run lengths, starting with a background run
+
+    Returns
+    -------
+    str
+        Compressed counts, as written by the COCO API
+
+    """
+    counts = np.asarray(counts, dtype=np.int64).ravel()
+    values = counts.copy()
+    values[3:] -= counts[1:-2]
+
+    # Write 5 bits of every count per round until none has bits left
+    rounds = []
+    active = np.ones(len(values), dtype=bool)
+    while active.any():
+        chars = values & 0x1f
+        values = values >> 5
+        more = np.where(chars & 0x10, values != -1, values != 0) & active
+        rounds.append(np.where(active, (chars | (more << 5)) + 48, 0))
+        active = more
+
+    if not rounds:
+        return ''
+    chars = np.stack(rounds, axis=1).ravel()
+    return chars[chars > 0].astype(np.uint8).tobytes().decode('ascii')
+
+def decode_rle(rle):
+    """
+    Decode a COCO RLE into a mask
+
+    Parameters
+    ----------
+    rle : dict
+        RLE with the 'size' of the mask as height, width and its 'counts',
+        compressed or not, over the pixels in column-major order
+
+    Returns
+    -------
+    ndarray
+        Mask of shape (height, width), 1 for the foreground
+
+    """
+    height, width = get_rle_size(rle)
+    counts = decode_counts(rle['counts'])
+    if counts.sum() != height * width:
+        raise ValueError(f"RLE counts add up to {counts.sum()} pixels instead of {height} x {width}")
+
+    values = np.zeros(len(counts), dtype=np.uint8)
+    values[1::2] = 1
+    return np.repeat(values, counts).reshape(width, height).T
+
+def encode_rle(mask, compressed=True):
+    """
+    Encode a mask as a COCO RLE
+
+    Parameters
+    ----------
+    mask : ndarray
+        Mask of shape (height, width), any non-zero value is foreground
+    compressed : bool, optional
+        Compressed string counts instead of a list, True by default
+
+    Returns
+    -------
+    dict
+        RLE with the 'size' and the 'counts' of the mask
+
+    """
+    height, width = mask.shape
+    pixels = mask.T.ravel() != 0
+
+    # Runs end where the value changes, the first run is background, possibly empty
+    changes = np.flatnonzero(pixels[1:] != pixels[:-1]) + 1
+    counts = np.diff(np.concatenate(([0], changes, [len(pixels)])))
+    if len(pixels) and pixels[0]:
+        counts = np.concatenate(([0], counts))
+
+    return {
+        'size': [height, width],
+        'counts': encode_counts(counts) if compressed else counts.tolist()
+    }
+
+def get_rle_size(rle):
+    # Height and width of an RLE, which must have both counts and size
+    if not isinstance(rle, dict) or 'counts' not in rle or 'size' not in rle:
+        raise ValueError("Invalid RLE segmentation, expected a dictionary with 'size' and 'counts'")
+    height, width = rle['size']
+    return int(height), int(width)
+
+def decode_runs(rles):
+    """
+    Decode the foreground runs of many COCO RLEs at once
+
+    Compressed strings are decoded together with decode_count_strings, and
+    the start of every run is found with one cumulative sum over all counts.
+
+    Parameters
+    ----------
+    rles : list
+        COCO RLE dictionaries
+
+    Returns
+    -------
+    ndarray
+        Column-major pixel index of the start of every foreground run
+    ndarray
+        Length of every foreground run
+    ndarray
+        RLE of every foreground run
+    ndarray
+        Height of each RLE
+
+    """
+    sizes = np.array([get_rle_size(rle) for rle in rles], dtype=np.int64).reshape(-1, 2)
+
+    # Compressed counts are decoded together, uncompressed ones are put back in RLE order
+    compressed = [isinstance(rle['counts'], (str, bytes)) for rle in rles]
+    string_counts, string_lengths = decode_count_strings([rle['counts'] for rle, c in zip(rles, compressed) if c])
+    if all(compressed):
+        counts, lengths = string_counts, string_lengths
+    else:
+        parts = np.split(string_counts, np.cumsum(string_lengths)[:-1]) if len(string_lengths) else []
+        parts = iter(parts)
+        counts = [next(parts) if c else decode_counts(rle['counts']) for rle, c in zip(rles, compressed)]
+        lengths = np.array([len(c) for c in counts], dtype=np.int64)
+        counts = np.concatenate(counts) if counts else np.empty(0, dtype=np.int64)
+
+    # Position of every run in its RLE and of its first pixel
+    groups = np.repeat(np.arange(len(rles)), lengths)
+    first_runs = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(rles) else lengths
+    totals = np.concatenate(([0], np.cumsum(counts)))
+    pixel_starts = totals[:-1] - totals[first_runs][groups]
+
+    ends = totals[first_runs + lengths] - totals[first_runs]
+    wrong = np.flatnonzero(ends != sizes[:, 0] * sizes[:, 1])
+    if len(wrong):
+        height, width = sizes[wrong[0]].tolist()
+        raise ValueError(f"RLE counts add up to {ends[wrong[0]]} pixels instead of {height} x {width}")
+
+    # Foreground runs are every second run, empty ones are skipped
+    foreground = ((np.arange(len(counts)) - first_runs[groups]) % 2 == 1) & (counts > 0)
+    return pixel_starts[foreground], counts[foreground], groups[foreground], sizes[:, 0]
+
+def rle_to_polygons(rles, max_pixels=RLE_CANVAS_PIXELS):
+    """
+    Trace the contour polygons of many COCO RLEs in batches
+
+    Runs are split into column segments and painted straight into the
+    bounding box of their mask, without decoding the whole mask. Boxes are
+    placed side by side on shared canvases, one column apart, and all
+    contours of a canvas are found with one OpenCV call. Contours are the
+    same as those extract_segmentations finds in a binary mask of the RLE.
+
+    Parameters
+    ----------
+    rles : list
+        COCO RLE dictionaries
+    max_pixels : int, optional
+        Largest number of pixels of a canvas, RLE_CANVAS_PIXELS by default
+
+    Returns
+    -------
+    ndarray
+        Flat x, y coordinates of every polygon
+    ndarray
+        Start of each polygon in the coordinates, followed by the end of the last one
+    ndarray
+        Start of the polygons of each RLE, followed by the end of the last one
+
+    """
+    import cv2
+    starts, lengths, groups, heights = decode_runs(rles)
+
+    # Split runs into the segments they cover in each column
+    heights = heights[groups]
+    ends = starts + lengths
+    first_columns = starts // heights
+    n_columns = (ends - 1) // heights - first_columns + 1
+    segments = np.repeat(np.arange(len(starts)), n_columns)
+    steps = np.arange(len(segments)) - np.repeat(np.cumsum(n_columns) - n_columns, n_columns)
+    columns = first_columns[segments] + steps
+    rows = np.where(steps == 0, starts[segments] % heights[segments], 0)
+    row_ends = np.where(steps == n_columns[segments] - 1, (ends[segments] - 1) % heights[segments] + 1, heights[segments])
+    segment_groups = groups[segments]
+
+    # Bounding box of every RLE with a foreground, segments are in RLE order
+    boxes = np.zeros((len(rles), 4), dtype=np.int64)
+    present = np.unique(segment_groups)
+    if len(present):
+        first = np.searchsorted(segment_groups, present)
+        boxes[present] = np.column_stack((
+            np.minimum.reduceat(columns, first),
+            np.minimum.reduceat(rows, first),
+            np.maximum.reduceat(columns, first) + 1,
+            np.maximum.reduceat(row_ends, first),
+        ))
+    box_widths = boxes[:, 2] - boxes[:, 0]
+    box_heights = boxes[:, 3] - boxes[:, 1]
+
+    # Place boxes from left to right on canvases of at most max_pixels, by height so canvases are filled
+    canvas_of = np.zeros(len(rles), dtype=np.int64)
+    canvas_x = np.zeros(len(rles), dtype=np.int64)
+    canvas, x, height = 0, 0, 0
+    by_height = present[np.argsort(box_heights[present], kind='stable')]
+    for i, width, box_height in zip(by_height.tolist(), box_widths[by_height].tolist(), box_heights[by_height].tolist()):
+        if x and (x + width) * max(height, box_height) > max_pixels:
+            canvas, x, height = canvas + 1, 0, 0
+        canvas_of[i] = canvas
+        canvas_x[i] = x
+        x += width + 1
+        height = max(height, box_height)
+
+    contours = []
+    contour_groups = []
+    segment_canvases = canvas_of[segment_groups]
+    for canvas in range(canvas + 1 if len(present) else 0):
+        members = by_height[canvas_of[by_height] == canvas]
+        width = int((canvas_x[members] + box_widths[members]).max())
+        height = int(box_heights[members].max())
+
+        # Paint the segments of the canvas transposed, where each is a contiguous range
+        selected = np.flatnonzero(segment_canvases == canvas)
+        owners = segment_groups[selected]
+        canvas_columns = columns[selected] - boxes[owners, 0] + canvas_x[owners]
+        canvas_rows = rows[selected] - boxes[owners, 1]
+        pixels = np.zeros((width, height), dtype=np.uint8)
+        pixels.ravel()[ranges_to_indices(canvas_columns * height + canvas_rows, row_ends[selected] - rows[selected])] = 1
+
+        found = cv2.findContours(cv2.transpose(pixels), cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)[0]
+        if not found:
+            continue
+        first_x = np.array([contour[0, 0, 0] for contour in found], dtype=np.int64)
+        contour_groups.append(members[np.searchsorted(canvas_x[members], first_x, 'right') - 1])
+        contours += found
+
+    if not contours:
+        return np.empty(0, dtype=np.int64), np.zeros(1, dtype=np.int64), np.zeros(len(rles) + 1, dtype=np.int64)
+
+    # Move contours back into their images and group them by RLE, keeping their order
+    contour_groups = np.concatenate(contour_groups)
+    order = np.argsort(contour_groups, kind='stable')
+    contour_lengths = np.array([len(contour) for contour in contours], dtype=np.int64)
+    points = np.concatenate([contour.reshape(-1, 2) for contour in contours]).astype(np.int64)
+    point_groups = np.repeat(contour_groups, contour_lengths)
+    points[:, 0] += boxes[point_groups, 0] - canvas_x[point_groups]
+    points[:, 1] += boxes[point_groups, 1]
+
+    point_starts = np.concatenate(([0], np.cumsum(contour_lengths)[:-1]))
+    points = points[ranges_to_indices(point_starts[order], contour_lengths[order])]
+    coord_offsets = np.concatenate(([0], np.cumsum(2 * contour_lengths[order])))
+    polygon_offsets = np.concatenate(([0], np.cumsum(np.bincount(contour_groups, minlength=len(rles)))))
+    return points.ravel(), coord_offsets, polygon_offsets
+
+def convert_rle_segmentations(table, max_pixels=RLE_CANVAS_PIXELS):
+    """
+    Replace the RLE segmentations of a table by their contour polygons
+
+    All RLEs of the table are traced together with rle_to_polygons, the
+    polygons of other annotations are kept as they are.
+
+    Parameters
+    ----------
+    table : AnnotationTable
+        Table of annotations, RLE segmentations are in its extras
+    max_pixels : int, optional
+        Largest number of pixels of a canvas, RLE_CANVAS_PIXELS by default
+
+    Returns
+    -------
+    AnnotationTable
+        Table with polygons instead of RLEs, the same table if it has none
+
+    """
+    if table.extras is None:
+        return table
+    indices = [i for i, extra in enumerate(table.extras) if extra and isinstance(extra.get('segmentation'), dict)]
+    if not indices:
+        return table
+
+    rle_coords, rle_coord_offsets, rle_polygon_offsets = rle_to_polygons(
+        [table.extras[i]['segmentation'] for i in indices], max_pixels
+    )
+
+    # Order the polygons of both sources by annotation, then gather their coordinates
+    indices = np.array(indices, dtype=np.int64)
+    polygon_counts = np.diff(table.polygon_offsets)
+    polygon_annotations = np.concatenate((
+        np.repeat(np.arange(len(table)), polygon_counts),
+        np.repeat(indices, np.diff(rle_polygon_offsets)),
+    ))
+    order = np.argsort(polygon_annotations, kind='stable')
+    coords = np.concatenate((table.coords, rle_coords))
+    coord_starts = np.concatenate((table.coord_offsets[:-1], rle_coord_offsets[:-1] + len(table.coords)))[order]
+    coord_counts = np.concatenate((np.diff(table.coord_offsets), np.diff(rle_coord_offsets)))[order]
+    polygon_counts[indices] += np.diff(rle_polygon_offsets)
+
+    extras = list(table.extras)
+    for i in indices.tolist():
+        extras[i] = {key: value for key, value in extras[i].items() if key != 'segmentation'} or None
+
+    return AnnotationTable(
+        table.ids,
+        table.image_ids,
+        table.category_ids,
+        table.bboxes,
+        table.areas,
+        table.iscrowd,
+        coords[ranges_to_indices(coord_starts, coord_counts)],
+        np.concatenate(([0], np.cumsum(coord_counts))),
+        np.concatenate(([0], np.cumsum(polygon_counts))),
+        table.fields,
+        extras if any(extras) else None,
+        table.key_orders,
+        {name: mask for name, mask in table.integers.items() if name != 'segmentation'}
+    )
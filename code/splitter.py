@@ -0,0 +1,401 @@
+from hashlib import blake2b
+from collections import Counter
+from contextlib import ExitStack
+
+import numpy as np
+
+from converter import from_coco, ANNOTATION_BATCH_SIZE
+from converter_utils import (
+    copy_images,
+    write_yolo_yaml,
+    read_yolo_yaml,
+    find_yolo_yaml,
+    find_yolo_splits,
+    validate_options,
+)
+from annotation_table import iter_annotation_batches
+from json_utils import open_json_stream
+from manifest import Manifest
+from logger import LOGGER
+
+SPLIT_NAMES = ['train', 'val', 'test']
+# Class of images without annotations when splits are stratified
+NO_CLASS = -1
+
+def hash_fraction(name, seed):
+    """
+    Map a file name to a position in [0, 1) with a seeded hash
+
+    The position only depends on the name and the seed, so the split of an
+    image does not change when other images are added or removed.
+
+    Parameters
+    ----------
+    name : str
+        File name of the image
+    seed : int
+        Random seed
+
+    Returns
+    -------
+    float
+        Position of the image
+
+    """
+    digest = blake2b(name.encode(), digest_size=8, key=str(seed).encode())
+    return int.from_bytes(digest.digest(), 'big') / 2 ** 64
+
+def assign_splits(names, ratios, seed, classes=None):
+    """
+    Assign images to splits from seeded hashes of their file names
+
+    Without classes, every image is assigned by its own hash position alone.
+    With classes, images of each class are ranked by hash position and the
+    ranks are cut by the ratios, so every class is split in the same
+    proportions. Stratified assignments near a cut may then move when images
+    of the same class are added.
+
+    Parameters
+    ----------
+    names : list
+        File names of the images
+    ratios : list
+        Fraction of the images of each split, summing to 1
+    seed : int
+        Random seed
+    classes : list, optional
+        Class of each image for stratified splits
+
+    Returns
+    -------
+    ndarray
+        Index of the split of each image
+
+    """
+    positions = np.array([hash_fraction(name, seed) for name in names], dtype=np.float64)
+
+    if classes is not None and len(positions):
+        # Rank the images of each class by position and spread the ranks evenly over [0, 1)
+        classes = np.asarray(classes)
+        order = np.lexsort((positions, classes))
+        sorted_classes = classes[order]
+        starts = np.flatnonzero(np.concatenate(([True], sorted_classes[1:] != sorted_classes[:-1])))
+        counts = np.diff(np.append(starts, len(order)))
+        ranks = np.arange(len(order)) - np.repeat(starts, counts)
+        positions[order] = (ranks + 0.5) / np.repeat(counts, counts)
+
+    bounds = np.cumsum(ratios)[:-1]
+    return np.searchsorted(bounds, positions, side='right')
+
+def get_split_ratios(opt):
+    """
+    Get the names and ratios of the non-empty splits
+
+    Parameters
+    ----------
+    opt : dict
+        A dictionary containing the selected options
+
+    Returns
+    -------
+    list
+        Names of the splits
+    list
+        Fraction of the images of each split
+
+    """
+    test_ratio = opt.get('test_train_ratio', 0.0)
+    val_ratio = opt.get('val_ratio', 0.0)
+    split_names = opt.get('split_names', SPLIT_NAMES)
+    ratios = [1 - test_ratio - val_ratio, val_ratio, test_ratio]
+
+    splits = [(name, ratio) for name, ratio in zip(split_names, ratios) if ratio > 0]
+    return [name for name, _ in splits], [ratio for _, ratio in splits]
+
+def rarest_classes(image_classes, counts):
+    # Class of an image is its rarest class in the dataset, the one stratification most needs to spread
+    return [
+        min(classes, key=lambda c: (counts[c], c)) if classes else NO_CLASS
+        for classes in image_classes
+    ]
+
+def split_coco(opt, manifest=None, verbose=True):
+    """
+    Split a COCO dataset into train, validation, and test sets
+
+    Images are assigned to splits first, then the annotations of every source
+    split are read one batch at a time, streamed if the file is large, and
+    every batch goes straight to the files of the splits of its images, so
+    memory does not grow with the number of annotations. Image and annotation
+    IDs of later source files are offset so they stay unique.
+
+    Parameters
+    ----------
+    opt : dict
+        A dictionary containing the selected options
+    manifest : Manifest, optional
+        Manifest of an incremental run
+    verbose : bool, optional
+        Print progress messages, True by default
+
+    """
+    src_path = opt.get('src_path')
+    dst_path = opt.get('dst_path')
+    transfer = opt.get('transfer', 'copy')
+    copy_threads = opt.get('copy_threads', 1)
+    json_format = opt.get('json_format', 'pretty')
+    split_names, ratios = get_split_ratios(opt)
+
+    coco_dict = from_coco(opt, verbose)
+
+    # Merge the images of the source splits, remembering the directory of the images of each one
+    images = []
+    image_dirs = []
+    categories = []
+    sources = []
+    parts = []
+    image_offset = 0
+    for split in coco_dict['splits']:
+        for key, data in split.items():
+            images_path = src_path / ('' if key == 'all' else key)
+            categories = categories or data['categories']
+            sources += coco_dict['sources'][key]
+            for image in data['images']:
+                images.append({**image, 'id': image['id'] + image_offset} if image_offset else image)
+                image_dirs.append(images_path)
+            parts.append((data['annotations'], image_offset))
+            image_offset = max([image_offset - 1] + [image['id'] for image in images]) + 1
+
+    # Stratified splits need the classes of every image, gathered in one pass over the annotations
+    classes = None
+    if opt.get('stratify', False):
+        image_classes = {image['id']: set() for image in images}
+        counts = Counter()
+        for annotations, image_offset in parts:
+            for batch in iter_annotation_batches(annotations, ANNOTATION_BATCH_SIZE):
+                category_ids = batch.category_ids.tolist()
+                for image_id, category_id in zip((batch.image_ids + image_offset).tolist(), category_ids):
+                    image_classes[image_id].add(category_id)
+                counts.update(category_ids)
+        classes = rarest_classes(image_classes.values(), counts)
+
+    image_splits = assign_splits([image['file_name'] for image in images], ratios, opt.get('seed', 0), classes)
+    image_ids = np.array([image['id'] for image in images], dtype=np.int64)
+    order = np.argsort(image_ids)
+    sorted_ids = image_ids[order]
+    sorted_splits = image_splits[order]
+
+    # Transfer images of every split grouped by their source directory, and find the files to write
+    json_paths = {}
+    for index, split_name in enumerate(split_names):
+        split_path = dst_path / split_name
+        split_path.mkdir(parents=True, exist_ok=True)
+        selected = np.flatnonzero(image_splits == index).tolist()
+        if verbose:
+            LOGGER.info(f"Writing {len(selected)} images to {split_name}")
+
+        groups = {}
+        for i in selected:
+            groups.setdefault(image_dirs[i], []).append(images[i])
+        for images_path, group in groups.items():
+            copy_images(images_path, split_path, group, verbose, transfer, copy_threads, manifest)
+
+        json_path = split_path / '_annotations.coco.json'
+        if manifest is not None:
+            current = manifest.output_current(json_path, sources)
+            manifest.record_output(json_path, sources)
+            if current:
+                continue
+        json_paths[index] = json_path
+    if not json_paths:
+        return
+
+    # Send every batch of annotations to the files of the splits of its images
+    with ExitStack() as stack:
+        writers = {}
+        for index, json_path in json_paths.items():
+            split_images = [images[i] for i in np.flatnonzero(image_splits == index).tolist()]
+            data = {'images': split_images, 'categories': categories, 'annotations': None}
+            writers[index] = stack.enter_context(open_json_stream(json_path, data, 'annotations', json_format))
+
+        ann_offset = 0
+        for annotations, image_offset in parts:
+            max_id = max(ann_offset - 1, 0)
+            for batch in iter_annotation_batches(annotations, ANNOTATION_BATCH_SIZE):
+                if image_offset or ann_offset:
+                    batch.ids = batch.ids + ann_offset
+                    batch.image_ids = batch.image_ids + image_offset
+                max_id = max(max_id, int(batch.ids.max(initial=max_id)))
+
+                positions = np.minimum(np.searchsorted(sorted_ids, batch.image_ids), len(order) - 1)
+                found = sorted_ids[positions] == batch.image_ids if len(order) else np.zeros(len(batch), dtype=bool)
+                if not found.all():
+                    raise ValueError(f"Image with ID {batch.image_ids[~found][0]} not found.")
+                ann_splits = sorted_splits[positions]
+                for index, writer in writers.items():
+                    writer.write(batch.take(np.flatnonzero(ann_splits == index)))
+            ann_offset = max_id + 1
+
+def read_label_classes(label_path):
+    # Class indices of the lines of a YOLO label file
+    if not label_path.is_file():
+        return []
+    with open(label_path, 'r') as f:
+        return [int(line.split(maxsplit=1)[0]) for line in f if line.strip()]
+
+def split_yolo(opt, manifest=None, verbose=True):
+    """
+    Split a YOLO dataset into train, validation, and test sets
+
+    Images and their label files are transferred as they are, labels are
+    only read to find the classes of the images when splits are stratified.
+
+    Parameters
+    ----------
+    opt : dict
+        A dictionary containing the selected options
+    manifest : Manifest, optional
+        Manifest of an incremental run
+    verbose : bool, optional
+        Print progress messages, True by default
+
+    """
+    src_path = opt.get('src_path')
+    dst_path = opt.get('dst_path')
+    src_dataset = opt.get('src_dataset')
+    transfer = opt.get('transfer', 'copy')
+    copy_threads = opt.get('copy_threads', 1)
+    split_names, ratios = get_split_ratios(opt)
+
+    categories = read_yolo_yaml(find_yolo_yaml(src_path))
+
+    # Images of every source split, with the split directory they come from
+    entries = []
+    for split_path in find_yolo_splits(src_path).values():
+        for image_path in sorted((split_path / 'images').iterdir()):
+            if image_path.is_file():
+                entries.append((split_path, image_path))
+    if verbose:
+        LOGGER.info(f"Splitting {len(entries)} images")
+
+    classes = None
+    if opt.get('stratify', False):
+        image_classes = [read_label_classes(split_path / 'labels' / f'{image_path.stem}.txt') for split_path, image_path in entries]
+        classes = rarest_classes(image_classes, Counter(c for labels in image_classes for c in labels))
+
+    image_splits = assign_splits([image_path.name for _, image_path in entries], ratios, opt.get('seed', 0), classes)
+
+    for index, split_name in enumerate(split_names):
+        split_path = dst_path / split_name
+        (split_path / 'images').mkdir(parents=True, exist_ok=True)
+        (split_path / 'labels').mkdir(parents=True, exist_ok=True)
+
+        # Transfer images and label files grouped by their source split
+        groups = {}
+        for i in np.flatnonzero(image_splits == index).tolist():
+            src_split_path, image_path = entries[i]
+            groups.setdefault(src_split_path, []).append({'id': i, 'file_name': image_path.name})
+        for src_split_path, images in groups.items():
+            labels = [
+                {'id': image['id'], 'file_name': f"{entries[image['id']][1].stem}.txt"}
+                for image in images
+            ]
+            labels = [label for label in labels if (src_split_path / 'labels' / label['file_name']).is_file()]
+            copy_images(src_split_path / 'images', split_path / 'images', images, verbose, transfer, copy_threads, manifest)
+            # Labels are the annotations of the split, so skip only applies to images
+            label_transfer = 'copy' if transfer == 'skip' else transfer
+            copy_images(src_split_path / 'labels', split_path / 'labels', labels, verbose, label_transfer, copy_threads, manifest)
+
+    write_yolo_yaml(dst_path, src_dataset, True, categories, split_names)
+    if manifest is not None:
+        manifest.record_output(dst_path / f'{src_dataset}.yaml')
+
+def split_classify(opt, manifest=None, verbose=True):
+    """
+    Split a classification dataset of one directory per class into train, validation, and test sets
+
+    Class directories are found directly in the source path, or one level
+    down if the dataset is already split. Splits are written as one
+    directory per class.
+
+    Parameters
+    ----------
+    opt : dict
+        A dictionary containing the selected options
+    manifest : Manifest, optional
+        Manifest of an incremental run
+    verbose : bool, optional
+        Print progress messages, True by default
+
+    """
+    src_path = opt.get('src_path')
+    dst_path = opt.get('dst_path')
+    transfer = opt.get('transfer', 'copy')
+    copy_threads = opt.get('copy_threads', 1)
+    split_names, ratios = get_split_ratios(opt)
+
+    # Class directories are the directories holding files
+    class_dirs = []
+    for path in sorted(src_path.iterdir()):
+        if path.is_dir():
+            children = sorted(path.iterdir())
+            if any(child.is_file() for child in children):
+                class_dirs.append(path)
+            else:
+                class_dirs += [child for child in children if child.is_dir()]
+    if not class_dirs:
+        raise FileNotFoundError(f"No class directories found in {src_path}")
+
+    entries = []
+    for class_dir in class_dirs:
+        for image_path in sorted(class_dir.iterdir()):
+            if image_path.is_file():
+                entries.append((class_dir, image_path))
+    if verbose:
+        LOGGER.info(f"Splitting {len(entries)} images of {len({class_dir.name for class_dir in class_dirs})} classes")
+
+    # Names include the class so images of the same name in different classes are independent
+    names = [f'{class_dir.name}/{image_path.name}' for class_dir, image_path in entries]
+    classes = [class_dir.name for class_dir, _ in entries] if opt.get('stratify', False) else None
+    image_splits = assign_splits(names, ratios, opt.get('seed', 0), classes)
+
+    for index, split_name in enumerate(split_names):
+        groups = {}
+        for i in np.flatnonzero(image_splits == index).tolist():
+            class_dir, image_path = entries[i]
+            groups.setdefault(class_dir, []).append({'id': i, 'file_name': image_path.name})
+        for class_dir, images in groups.items():
+            class_path = dst_path / split_name / class_dir.name
+            class_path.mkdir(parents=True, exist_ok=True)
+            copy_images(class_dir, class_path, images, verbose, transfer, copy_threads, manifest)
+
+def split(opt, verbose=True):
+    """
+    Split a dataset into train, validation, and test sets
+
+    Parameters
+    ----------
+    opt : dict
+        A dictionary containing the selected options
+    verbose : bool, optional
+        Print progress messages, True by default
+
+    """
+    opt = validate_options(opt, verbose)
+
+    splitters = {
+        'coco': split_coco,
+        'yolo': split_yolo,
+    }
+    splitter = split_classify if opt['task'] == 'classify' else splitters[opt['src_format']]
+
+    # Track sources and outputs to only redo what changed since the previous run
+    manifest = Manifest(opt['dst_path'], opt) if opt.get('incremental', False) else None
+
+    splitter(opt, manifest, verbose)
+
+    if manifest is not None:
+        manifest.remove_stale(verbose)
+        manifest.save()
+    if verbose:
+        LOGGER.info("Split completed successfully.")
@@ -0,0 +1,761 @@
+from struct import pack, unpack
+import mmap
+import zlib
+import numpy as np
+
+from annotation_table import ranges_to_indices
+
+# Rows of a mask read and traced at a time in tiled mode
+TILE_ROWS = 1024
+# Smallest probability of a side of the Otsu threshold, FLT_EPSILON as in OpenCV
+OTSU_EPSILON = 1.1920928955078125e-07
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# Channels of every PNG color type: gray, RGB, palette, gray and alpha, RGBA
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# Bit depth and color type of 8 and 16 bit PNGs with every number of bytes per pixel,
+# their rows are unfiltered alike whatever the pixels hold
+PNG_RAW_FORMATS = {1: (8, 0), 2: (16, 0), 3: (8, 2), 4: (8, 6), 6: (16, 2), 8: (16, 6)}
+# Compressed bytes of a PNG read at a time
+PNG_READ_SIZE = 1 << 20
+
+def read_netpbm_header(f):
+    # Magic number, width, height, and maximum value of a binary PGM or PPM, None for other files
+    head = f.read(512)
+    if head[:2] not in [b'P5', b'P6']:
+        return None
+    tokens = []
+    position = 2
+    while len(tokens) < 3:
+        while position < len(head) and head[position:position + 1].isspace():
+            position += 1
+        if head[position:position + 1] == b'#':
+            position = head.index(b'\n', position)
+            continue
+        end = position
+        while end < len(head) and head[end:end + 1].isdigit():
+            end += 1
+        if end == position:
+            return None
+        tokens.append(int(head[position:end]))
+        position = end
+    # A single whitespace character separates the header from the pixels
+    return head[:2], *tokens, position + 1
+
+def read_bmp_header(f):
+    # Pixel offset, width, height, bits per pixel, and palette of an uncompressed BMP, None for other files
+    head = f.read(54)
+    if len(head) < 54 or head[:2] != b'BM':
+        return None
+    offset, dib_size, width, height, _, bits, compression = unpack('<I I i i H H I', head[10:34])
+    if compression != 0 or bits not in [8, 24, 32] or dib_size < 40:
+        return None
+    palette = None
+    if bits == 8:
+        colors = unpack('<I', head[46:50])[0] or 256
+        f.seek(14 + dib_size)
+        palette = np.frombuffer(f.read(4 * colors), dtype=np.uint8).reshape(-1, 4)[:, :3]
+    return offset, width, height, bits, palette
+
+def map_file(path, offset, dtype, shape):
+    # Read-only memory map of an array stored in a file, pages are only read when rows are used
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    count = int(np.prod(shape))
+    if offset + count * np.dtype(dtype).itemsize > len(buffer):
+        raise ValueError(f"Mask {path} is shorter than its header says")
+    return np.frombuffer(buffer, dtype=dtype, count=count, offset=offset).reshape(shape)
+
+def release_pages(pixels):
+    # Unmap the pages of a memory-mapped mask read so far, they are read again from the page cache if needed
+    base = pixels
+    while isinstance(base, np.ndarray):
+        base = base.base
+    if isinstance(base, memoryview):
+        base = base.obj
+    if isinstance(base, mmap.mmap) and hasattr(mmap, 'MADV_DONTNEED'):
+        base.madvise(mmap.MADV_DONTNEED)
+
+def read_npy_header(path):
+    # Offset, dtype, and shape of the array of a .npy file
+    with open(path, 'rb') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        if fortran_order:
+            raise ValueError(f"Mask {path} is stored in column-major order, save it in row-major order")
+        return f.tell(), dtype, shape
+
+def png_chunk(kind, data):
+    return pack('>I', len(data)) + kind + data + pack('>I', zlib.crc32(kind + data))
+
+class PngMask:
+    """
+    PNG mask decoded a strip of rows at a time
+
+    The compressed rows are inflated a strip at a time, and OpenCV reverses
+    the row filters of every strip, given as a PNG of its own that starts
+    with the last row of the previous strip, unfiltered, since filters refer
+    to the row above. Every strip comes back as raw bytes, read as they are
+    for 8 bit grayscale, so pixels match cv2.imread in color then converted
+    to grayscale, as find_contours reads masks. Interlaced PNGs cannot be
+    read in strips.
+
+    Parameters
+    ----------
+    path : Path
+        Path to the PNG file
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self.idat = []
+        palette = None
+        with open(path, 'rb') as f:
+            if f.read(8) != PNG_SIGNATURE:
+                raise ValueError(f"Mask {path} is not a PNG file")
+            while True:
+                head = f.read(8)
+                if len(head) < 8:
+                    raise ValueError(f"Mask {path} ends before its IEND chunk")
+                length, kind = unpack('>I', head[:4])[0], head[4:]
+                if kind == b'IHDR':
+                    width, height, bit_depth, color_type, _, _, interlace = unpack('>I I B B B B B', f.read(13))
+                    f.seek(4, 1)
+                elif kind == b'PLTE':
+                    palette = np.frombuffer(f.read(length), dtype=np.uint8).reshape(-1, 3)
+                    f.seek(4, 1)
+                elif kind == b'IDAT':
+                    self.idat.append((f.tell(), length))
+                    f.seek(length + 4, 1)
+                elif kind == b'IEND':
+                    break
+                else:
+                    f.seek(length + 4, 1)
+
+        if interlace:
+            raise ValueError(f"Interlaced PNG mask {path} cannot be read in strips, "
+                             f"save it without interlacing or convert it without tile_rows")
+        self.shape = (height, width)
+        self.bit_depth = bit_depth
+        self.color_type = color_type
+        channels = PNG_CHANNELS[color_type]
+        self.row_bytes = (width * channels * bit_depth + 7) // 8
+        self.pixel_bytes = max(1, channels * bit_depth // 8)
+
+        # Grayscale of every palette index, as cv2.imread expands them to colors
+        self.lookup = None
+        if color_type == 3:
+            import cv2
+            lookup = np.zeros(256, dtype=np.uint8)
+            if palette is not None:
+                lookup[:len(palette)] = cv2.cvtColor(np.ascontiguousarray(palette[np.newaxis]), cv2.COLOR_RGB2GRAY).ravel()[:256]
+            self.lookup = lookup
+
+    def iter_compressed(self):
+        with open(self.path, 'rb') as f:
+            for offset, length in self.idat:
+                f.seek(offset)
+                while length > 0:
+                    data = f.read(min(length, PNG_READ_SIZE))
+                    if not data:
+                        raise ValueError(f"Mask {self.path} is shorter than its chunks say")
+                    length -= len(data)
+                    yield data
+
+    def unfilter(self, filtered, n_rows, prior):
+        # Raw bytes of n_rows filtered rows, below the raw bytes of the prior row if there is one
+        import cv2
+        bit_depth, color_type = PNG_RAW_FORMATS[self.pixel_bytes]
+        width = self.row_bytes // self.pixel_bytes
+        if prior is not None:
+            filtered = b'\x00' + prior + filtered
+            n_rows += 1
+        image = cv2.imdecode(np.frombuffer(b''.join([
+            PNG_SIGNATURE,
+            png_chunk(b'IHDR', pack('>I I B B B B B', width, n_rows, bit_depth, color_type, 0, 0, 0)),
+            png_chunk(b'IDAT', zlib.compress(filtered, 1)),
+            png_chunk(b'IEND', b''),
+        ]), dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise ValueError(f"Unable to decode the rows of mask {self.path}")
+
+        # OpenCV returns color channels in BGR order and 16 bit values in native byte order
+        if image.ndim == 3:
+            image = image[..., [2, 1, 0, 3][:image.shape[2]]]
+        if bit_depth == 16:
+            image = np.ascontiguousarray(image, dtype='>u2').view(np.uint8)
+        raw = image.reshape(n_rows, self.row_bytes)
+        return raw[1:] if prior is not None else raw
+
+    def to_gray(self, raw):
+        # 8 bit grayscale of raw rows, as cv2.imread reads them in color then converted to grayscale
+        import cv2
+        height, width = len(raw), self.shape[1]
+        channels = PNG_CHANNELS[self.color_type]
+        if self.bit_depth < 8:
+            # Samples packed in bytes, most significant first, grayscale ones scaled to 8 bits
+            bits = np.unpackbits(raw, axis=1).reshape(height, -1, self.bit_depth)
+            weights = 1 << np.arange(self.bit_depth - 1, -1, -1, dtype=np.uint8)
+            samples = (bits * weights).sum(axis=2, dtype=np.uint8)[:, :width]
+            if self.lookup is not None:
+                return self.lookup[samples]
+            return samples * np.uint8(255 // ((1 << self.bit_depth) - 1))
+
+        # The high byte of 16 bit samples
+        samples = raw.reshape(height, width, channels, self.bit_depth // 8)[..., 0]
+        if self.lookup is not None:
+            return self.lookup[samples[..., 0]]
+        if channels < 3:
+            return np.ascontiguousarray(samples[..., 0])
+        return cv2.cvtColor(np.ascontiguousarray(samples[..., :3]), cv2.COLOR_RGB2GRAY)
+
+    def iter_strips(self, tile_rows=TILE_ROWS):
+        """
+        Decode the mask a strip of rows at a time
+
+        Parameters
+        ----------
+        tile_rows : int, optional
+            Number of rows per strip, TILE_ROWS by default
+
+        Yields
+        ------
+        int
+            First row of the strip
+        ndarray
+            8 bit grayscale pixels of the strip
+
+        """
+        # Every row starts with the byte of its filter type
+        stride = self.row_bytes + 1
+        compressed = self.iter_compressed()
+        decompressor = zlib.decompressobj()
+        buffer = bytearray()
+        prior = None
+        for start in range(0, self.shape[0], tile_rows):
+            n_rows = min(tile_rows, self.shape[0] - start)
+            while len(buffer) < n_rows * stride:
+                data = decompressor.unconsumed_tail or next(compressed, b'')
+                if not data:
+                    raise ValueError(f"Mask {self.path} has fewer rows than its header says")
+                buffer += decompressor.decompress(data, n_rows * stride - len(buffer))
+            raw = self.unfilter(bytes(buffer[:n_rows * stride]), n_rows, prior)
+            del buffer[:n_rows * stride]
+            prior = raw[-1].tobytes()
+            yield start, self.to_gray(raw)
+
+def open_mask(mask):
+    """
+    Open a mask for reading in strips of rows
+
+    NumPy arrays, binary PGM and PPM files, and uncompressed BMP files are
+    memory-mapped, so only the rows of a strip are ever read, and PNG files
+    are decoded a strip at a time. Other formats, such as TIFF or JPEG,
+    cannot be decoded in parts with OpenCV, which also refuses images of
+    more than 2^30 pixels, so they cannot be tiled.
+
+    Parameters
+    ----------
+    mask : Path
+        Path to the mask file
+
+    Returns
+    -------
+    ndarray or PngMask
+        Pixels of the mask, possibly memory-mapped, or the PNG decoding them
+    function
+        Conversion of a strip of pixels to 8 bit grayscale, None if they are already
+
+    """
+    import cv2
+    if mask.suffix == '.npy':
+        offset, dtype, shape = read_npy_header(mask)
+        pixels = map_file(mask, offset, dtype, shape)
+        if pixels.dtype == bool:
+            return pixels, lambda strip: strip.view(np.uint8)
+        if pixels.dtype != np.uint8 or pixels.ndim not in [2, 3] or pixels.ndim == 3 and pixels.shape[2] not in [1, 3, 4]:
+            raise ValueError(f"Mask {mask} must be a 2D array of booleans or a 2D or BGR array of 8 bit values")
+        if pixels.ndim == 2 or pixels.shape[2] == 1:
+            return pixels.reshape(pixels.shape[:2]), None
+        return pixels, lambda strip: cv2.cvtColor(np.ascontiguousarray(strip[..., :3]), cv2.COLOR_BGR2GRAY)
+
+    with open(mask, 'rb') as f:
+        netpbm = read_netpbm_header(f)
+        f.seek(0)
+        bmp = read_bmp_header(f) if netpbm is None else None
+        f.seek(0)
+        png = f.read(len(PNG_SIGNATURE)) == PNG_SIGNATURE
+
+    if netpbm is not None and netpbm[3] < 256:
+        magic, width, height, _, offset = netpbm
+        channels = 1 if magic == b'P5' else 3
+        pixels = map_file(mask, offset, np.uint8, (height, width, channels))
+        if channels == 1:
+            return pixels.reshape(height, width), None
+        return pixels, lambda strip: cv2.cvtColor(np.ascontiguousarray(strip), cv2.COLOR_RGB2GRAY)
+
+    if bmp is not None:
+        offset, width, height, bits, palette = bmp
+        channels = bits // 8
+        stride = (bits * width + 31) // 32 * 4
+        rows = map_file(mask, offset, np.uint8, (abs(height), stride))
+        # Rows are stored bottom-up unless the height is negative
+        pixels = rows[::-1] if height > 0 else rows
+        pixels = pixels[:, :width * channels].reshape(abs(height), width, channels)
+        if palette is not None:
+            lookup = cv2.cvtColor(np.ascontiguousarray(palette[np.newaxis]), cv2.COLOR_BGR2GRAY).ravel()
+            lookup = np.concatenate((lookup, np.zeros(256 - len(lookup), dtype=np.uint8)))
+            return pixels.reshape(abs(height), width), lambda strip: lookup[strip]
+        return pixels, lambda strip: cv2.cvtColor(np.ascontiguousarray(strip[..., :3]), cv2.COLOR_BGR2GRAY)
+
+    if png:
+        return PngMask(mask), None
+
+    raise ValueError(f"Mask {mask} cannot be read in strips, tiled masks must be .npy, PNG, 8 bit binary PGM or PPM, "
+                     f"or uncompressed BMP files, convert it to one of them or convert it without tile_rows")
+
+def iter_mask_strips(pixels, to_gray, tile_rows=TILE_ROWS):
+    # Grayscale strips of at most tile_rows rows, only one strip is in memory at a time
+    if isinstance(pixels, PngMask):
+        yield from pixels.iter_strips(tile_rows)
+        return
+    for start in range(0, pixels.shape[0], tile_rows):
+        strip = pixels[start:start + tile_rows]
+        yield start, to_gray(strip) if to_gray is not None else strip
+        release_pages(pixels)
+
+def otsu_threshold(histogram):
+    """
+    Compute the Otsu threshold of a histogram of 8 bit values
+
+    Follows OpenCV step by step, so a mask thresholded in strips gets the
+    threshold cv2.threshold finds for the whole mask.
+
+    Parameters
+    ----------
+    histogram : ndarray
+        Number of pixels of every value from 0 to 255
+
+    Returns
+    -------
+    int
+        Largest value of the background
+
+    """
+    histogram = histogram.tolist()
+    scale = 1.0 / max(sum(histogram), 1)
+    mu = sum(i * float(count) for i, count in enumerate(histogram)) * scale
+    mu1 = q1 = max_sigma = 0.0
+    threshold = 0
+    for i, count in enumerate(histogram):
+        p_i = count * scale
+        mu1 *= q1
+        q1 += p_i
+        q2 = 1.0 - q1
+        if min(q1, q2) < OTSU_EPSILON or max(q1, q2) > 1.0 - OTSU_EPSILON:
+            continue
+        mu1 = (mu1 + i * p_i) / q1
+        mu2 = (mu - q1 * mu1) / q2
+        sigma = q1 * q2 * (mu1 - mu2) * (mu1 - mu2)
+        if sigma > max_sigma:
+            max_sigma = sigma
+            threshold = i
+    return threshold
+
+def find_runs(values):
+    # First and last column of every run of equal non-zero values in each row, with its row and value
+    padded = np.zeros((len(values), values.shape[1] + 2), dtype=values.dtype)
+    padded[:, 1:-1] = values
+    changes = padded[:, 1:] != padded[:, :-1]
+    nonzero = values != 0
+    # Flat indices are much faster to find than row and column pairs
+    rows, starts = np.divmod(np.flatnonzero(changes[:, :-1] & nonzero), max(values.shape[1], 1))
+    ends = np.flatnonzero(changes[:, 1:] & nonzero) % max(values.shape[1], 1)
+    return starts, ends, rows, values[rows, starts]
+
+def get_histogram(strip):
+    # Histogram of 8 bit values, cv2.calcHist counts in float32 so at most 2^24 pixels are counted at a time
+    import cv2
+    histogram = np.zeros(256, dtype=np.int64)
+    rows = max(1, (1 << 24) // max(strip.shape[1], 1))
+    for start in range(0, len(strip), rows):
+        part = np.ascontiguousarray(strip[start:start + rows])
+        histogram += cv2.calcHist([part], [0], None, [256], [0, 256]).ravel().astype(np.int64)
+    return histogram
+
+class BoundaryTracer:
+    """
+    Trace the pixel outlines of a binary mask one strip of rows at a time
+
+    Every strip is turned into boundary segments between foreground and
+    background pixels, merged along rows and columns, with the foreground on
+    their right. Segments are linked at shared corners into chains, chains
+    that close are finished polygons, and chains that reach the last row of
+    the strip are carried over and linked with the segments of the next
+    strip. Besides finished polygons, only the strip, its previous row, and
+    the carried chains are kept.
+
+    Foreground pixels touching diagonally are connected, as in OpenCV, and
+    the outlines are finally mapped to the boundary pixels along them, so
+    polygons, their first vertex, and their order are those of
+    cv2.findContours with RETR_TREE and CHAIN_APPROX_SIMPLE, whatever the
+    strip height.
+
+    Parameters
+    ----------
+    width : int
+        Width of the mask
+
+    """
+    def __init__(self, width):
+        self.width = width
+        self.previous = np.zeros(width, dtype=np.int8)
+        self.row = 0
+
+        # Finished polygons of every strip, with their first two corners to sort them
+        self.polygon_vertices = []
+        self.polygon_counts = []
+
+        # Open chains: vertices but the last, start and end corners, first and last directions
+        self.points = np.empty((0, 2), dtype=np.int64)
+        self.point_offsets = np.zeros(1, dtype=np.int64)
+        self.starts = np.empty((0, 2), dtype=np.int64)
+        self.ends = np.empty((0, 2), dtype=np.int64)
+        self.first_directions = np.empty((0, 2), dtype=np.int64)
+        self.last_directions = np.empty((0, 2), dtype=np.int64)
+
+        # Start of every horizontal segment, and the nearest vertical edge left of it on its row or -1
+        self.segment_keys = []
+        self.left_edges = []
+
+    def add_strip(self, foreground):
+        """
+        Trace the next strip of rows
+
+        Parameters
+        ----------
+        foreground : ndarray
+            True for every foreground pixel of the strip, of shape (rows, width)
+
+        """
+        foreground = foreground.astype(np.int8)
+        above = np.concatenate((self.previous[np.newaxis], foreground[:-1]))
+        self.add_segments(foreground - above, self.row, foreground)
+        self.previous = foreground[-1]
+        self.row += len(foreground)
+
+    def close(self):
+        """
+        Trace the bottom edge of the mask and finish every polygon
+
+        Returns
+        -------
+        list
+            Flat x, y coordinates of every polygon, in the order of cv2.findContours
+
+        """
+        self.add_segments(-self.previous[np.newaxis], self.row, np.zeros((0, self.width), dtype=np.int8))
+        if len(self.starts):
+            raise ValueError("Mask outline has open chains, the mask was not traced to its last row")
+
+        if not self.polygon_vertices:
+            return []
+        vertices = np.concatenate(self.polygon_vertices).astype(np.int64)
+        offsets = np.concatenate(([0], np.cumsum(np.concatenate(self.polygon_counts))))
+        order = self.order_polygons(vertices, offsets)
+        vertices, counts = trace_boundary_pixels(vertices, offsets)
+        self.polygon_vertices = []
+        self.polygon_counts = []
+        self.segment_keys = []
+        self.left_edges = []
+
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        vertices = vertices[ranges_to_indices(offsets[:-1][order], counts[order])].astype(np.int32)
+        return [polygon.ravel() for polygon in np.split(vertices, np.cumsum(counts[order])[:-1])]
+
+    def add_segments(self, horizontal, row, foreground):
+        # Horizontal segments lie on the top edge of their row, they go right with the foreground below
+        xs, xe, ys, values = find_runs(horizontal)
+        columns = self.width + 1
+        segment_keys = (ys + row) * columns + xs
+        right = values > 0
+        starts = [np.column_stack((np.where(right, xs, xe + 1), ys + row))]
+        ends = [np.column_stack((np.where(right, xe + 1, xs), ys + row))]
+        directions = [np.column_stack((np.where(right, 1, -1), np.zeros(len(xs), dtype=np.int64)))]
+
+        # Vertical segments lie on the left edge of their column, they go down with the foreground on the left
+        if len(foreground):
+            # Columns are traced as the rows of the transposed strip
+            import cv2
+            padded = np.zeros((self.width + 2, len(foreground)), dtype=np.int8)
+            padded[1:-1] = cv2.transpose(foreground.view(np.uint8)).view(np.int8)
+            edges = padded[:-1] - padded[1:]
+            ys, ye, xs, values = find_runs(edges)
+            down = values > 0
+            starts.append(np.column_stack((xs, np.where(down, ys, ye + 1) + row)))
+            ends.append(np.column_stack((xs, np.where(down, ye + 1, ys) + row)))
+            directions.append(np.column_stack((np.zeros(len(xs), dtype=np.int64), np.where(down, 1, -1))))
+
+            # Polygons start at a horizontal segment, the vertical edge left of it tells
+            # which polygon encloses them, as the row scan of cv2.findContours does
+            edge_xs, edge_rows = np.divmod(np.flatnonzero(edges), len(foreground))
+            edge_keys = np.sort((edge_rows + row) * columns + edge_xs)
+            index = np.searchsorted(edge_keys, segment_keys - 1, 'right') - 1
+            found = index >= 0
+            found[found] = edge_keys[index[found]] // columns == segment_keys[found] // columns
+            left_edges = np.full(len(segment_keys), -1, dtype=np.int64)
+            left_edges[found] = edge_keys[index[found]] % columns
+            self.segment_keys.append(segment_keys)
+            self.left_edges.append(left_edges)
+
+        starts = np.concatenate(starts).astype(np.int64)
+        self.link(starts, np.concatenate(ends).astype(np.int64), np.concatenate(directions))
+
+    def link(self, starts, ends, directions):
+        # Segments and carried chains are linked together, segments are chains of one vertex
+        points = np.concatenate((self.points, starts))
+        point_counts = np.concatenate((np.diff(self.point_offsets), np.ones(len(starts), dtype=np.int64)))
+        point_starts = np.concatenate(([0], np.cumsum(point_counts)[:-1]))
+        starts = np.concatenate((self.starts, starts))
+        ends = np.concatenate((self.ends, ends))
+        first_directions = np.concatenate((self.first_directions, directions))
+        last_directions = np.concatenate((self.last_directions, directions))
+        n = len(starts)
+        if not n:
+            return
+
+        # Follow every chain to the one starting at its end, at corners where foreground
+        # pixels touch diagonally turn left to keep them connected
+        columns = self.width + 1
+        start_keys = starts[:, 1] * columns + starts[:, 0]
+        end_keys = ends[:, 1] * columns + ends[:, 0]
+        by_start = np.argsort(start_keys, kind='stable')
+        sorted_keys = start_keys[by_start]
+        low = np.searchsorted(sorted_keys, end_keys, 'left')
+        high = np.searchsorted(sorted_keys, end_keys, 'right')
+        following = np.full(n, -1, dtype=np.int64)
+        single = high - low == 1
+        following[single] = by_start[low[single]]
+        pinched = np.flatnonzero(high - low == 2)
+        if len(pinched):
+            left_turns = np.column_stack((last_directions[pinched, 1], -last_directions[pinched, 0]))
+            first = by_start[low[pinched]]
+            takes_first = (first_directions[first] == left_turns).all(axis=1)
+            following[pinched] = np.where(takes_first, first, by_start[low[pinched] + 1])
+
+        # Find closed chains by pointer jumping, the smallest chain every chain leads to, or -1
+        # past an open end, stops changing once each chain has seen all the chains it leads to
+        jumps = np.append(np.where(following >= 0, following, n), n)
+        smallest = np.append(np.arange(n), -1)
+        while True:
+            updated = np.minimum(smallest, smallest[jumps])
+            jumps = jumps[jumps]
+            if (updated == smallest).all():
+                break
+            smallest = updated
+        closed = smallest[:n] >= 0
+        # Closed chains start at their smallest chain
+        following[closed & (following == smallest[:n])] = -1
+
+        # Rank every chain by its distance to the last chain it is linked to
+        ranks = (following >= 0).astype(np.int64)
+        jumps = np.where(following >= 0, following, np.arange(n))
+        while True:
+            next_jumps = jumps[jumps]
+            if (next_jumps == jumps).all():
+                break
+            ranks += ranks[jumps]
+            jumps = next_jumps
+        lasts = jumps
+
+        # Gather the vertices of linked chains in order, grouped by their last chain
+        order = np.lexsort((-ranks, lasts))
+        groups = lasts[order]
+        group_starts = np.flatnonzero(np.concatenate(([True], groups[1:] != groups[:-1])))
+        group_ends = np.append(group_starts[1:], n)
+        counts = point_counts[order]
+        vertices = points[ranges_to_indices(point_starts[order], counts)]
+        vertex_offsets = np.concatenate(([0], np.cumsum(counts)))[np.append(group_starts, n)]
+
+        is_closed = closed[groups[group_starts]]
+        self.add_polygons(vertices, vertex_offsets, is_closed)
+
+        # Open chains are carried over to the next strip
+        heads = order[group_starts[~is_closed]]
+        tails = order[group_ends[~is_closed] - 1]
+        open_offsets = np.stack((vertex_offsets[:-1][~is_closed], vertex_offsets[1:][~is_closed]), axis=1)
+        self.points = vertices[ranges_to_indices(open_offsets[:, 0], open_offsets[:, 1] - open_offsets[:, 0])]
+        self.point_offsets = np.concatenate(([0], np.cumsum(open_offsets[:, 1] - open_offsets[:, 0])))
+        self.starts = starts[heads]
+        self.ends = ends[tails]
+        self.first_directions = first_directions[heads]
+        self.last_directions = last_directions[tails]
+
+    def add_polygons(self, vertices, vertex_offsets, is_closed):
+        # Drop vertices in the middle of straight edges, then start every polygon at its top-left corner
+        selected = np.flatnonzero(is_closed)
+        if not len(selected):
+            return
+        counts = np.diff(vertex_offsets)[selected]
+        indices = ranges_to_indices(vertex_offsets[selected], counts)
+        vertices = vertices[indices]
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        polygon_of = np.repeat(np.arange(len(selected)), counts)
+        positions = np.arange(len(vertices))
+        previous = np.where(positions == offsets[polygon_of], offsets[polygon_of + 1] - 1, positions - 1)
+        following = np.where(positions == offsets[polygon_of + 1] - 1, offsets[polygon_of], positions + 1)
+        incoming = np.sign(vertices - vertices[previous])
+        outgoing = np.sign(vertices[following] - vertices)
+        corners = (incoming != outgoing).any(axis=1)
+
+        vertices = vertices[corners]
+        polygon_of = polygon_of[corners]
+        counts = np.bincount(polygon_of, minlength=len(selected))
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+
+        # The top-left corner of a polygon, then the smaller next corner if it is visited twice
+        positions = np.arange(len(vertices))
+        following = np.where(positions == offsets[polygon_of + 1] - 1, offsets[polygon_of], positions + 1)
+        columns = self.width + 1
+        keys = vertices[:, 1] * columns + vertices[:, 0]
+        first = np.lexsort((keys[following], keys, polygon_of))[offsets[:-1]]
+        rotated = offsets[polygon_of] + (positions - offsets[polygon_of] + first[polygon_of] - offsets[polygon_of]) % counts[polygon_of]
+        self.polygon_vertices.append(vertices[rotated].astype(np.int32))
+        self.polygon_counts.append(counts)
+
+    def order_polygons(self, vertices, offsets):
+        # Outer polygons go right from their top-left corner and start at its pixel, holes go down
+        # and start at the pixel left of it, cv2.findContours finds them in row order of that pixel
+        n = len(offsets) - 1
+        columns = self.width + 1
+        first, second = vertices[offsets[:-1]], vertices[offsets[:-1] + 1]
+        holes = second[:, 0] == first[:, 0]
+        ranks = np.empty(n, dtype=np.int64)
+        ranks[np.argsort(first[:, 1] * columns + first[:, 0] - holes)] = np.arange(n)
+
+        # The polygon of the nearest vertical edge left of the start is the parent if it is of the
+        # other kind, else both have the same parent, outer polygons without such an edge have none
+        segment_keys = np.concatenate(self.segment_keys)
+        by_key = np.argsort(segment_keys)
+        left_edges = np.concatenate(self.left_edges)[
+            by_key[np.searchsorted(segment_keys, first[:, 1] * columns + first[:, 0], sorter=by_key)]]
+        polygon_of = np.repeat(np.arange(n), np.diff(offsets))
+        positions = np.arange(len(vertices))
+        following = np.where(positions == offsets[polygon_of + 1] - 1, offsets[polygon_of], positions + 1)
+        vertical = np.flatnonzero(vertices[:, 0] == vertices[following, 0])
+        rows = self.row + 1
+        edge_keys = vertices[vertical, 0] * rows + np.minimum(vertices[vertical, 1], vertices[following[vertical], 1])
+        by_edge = np.argsort(edge_keys)
+        index = np.searchsorted(edge_keys, left_edges * rows + first[:, 1], 'right', sorter=by_edge) - 1
+        lefts = np.where(left_edges >= 0, polygon_of[vertical[by_edge[index]]], -1)
+        same = (lefts >= 0) & (holes[lefts] == holes)
+        jumps = np.where(same, lefts, np.arange(n))
+        while True:
+            next_jumps = jumps[jumps]
+            if (next_jumps == jumps).all():
+                break
+            jumps = next_jumps
+        parents = lefts[jumps]
+
+        # Depth of every polygon by pointer jumping
+        depths = (parents >= 0).astype(np.int64)
+        jumps = np.where(parents >= 0, parents, np.arange(n))
+        while True:
+            next_jumps = jumps[jumps]
+            if (next_jumps == jumps).all():
+                break
+            depths += depths[jumps]
+            jumps = next_jumps
+
+        # Every polygon is followed by the polygons it encloses, the last found first
+        by_depth = np.argsort(depths, kind='stable')
+        levels = np.searchsorted(depths[by_depth], np.arange(depths.max() + 2))
+        sizes = np.ones(n, dtype=np.int64)
+        for depth in range(depths.max(), 0, -1):
+            level = by_depth[levels[depth]:levels[depth + 1]]
+            np.add.at(sizes, parents[level], sizes[level])
+        siblings = np.lexsort((-ranks, parents))
+        before = np.empty(n, dtype=np.int64)
+        before[siblings] = np.cumsum(sizes[siblings]) - sizes[siblings]
+        group_starts = np.flatnonzero(np.concatenate(([True], parents[siblings][1:] != parents[siblings][:-1])))
+        before[siblings] -= np.repeat(before[siblings[group_starts]], np.diff(np.append(group_starts, n)))
+        positions = before.copy()
+        for depth in range(1, depths.max() + 1):
+            level = by_depth[levels[depth]:levels[depth + 1]]
+            positions[level] += positions[parents[level]] + 1
+        return np.argsort(positions)
+
+def trace_boundary_pixels(vertices, offsets):
+    # Boundary pixels along outlines with the foreground on their right, reversed and from the
+    # start of every outline, keeping the pixels where they change direction as cv2.CHAIN_APPROX_SIMPLE
+    n = len(offsets) - 1
+    counts = np.diff(offsets)
+    polygon_of = np.repeat(np.arange(n), counts)
+    positions = np.arange(len(vertices))
+    following = np.where(positions == offsets[polygon_of + 1] - 1, offsets[polygon_of], positions + 1)
+    directions = np.sign(vertices[following] - vertices)
+    lengths = np.abs(vertices[following] - vertices).sum(axis=1)
+    next_directions = directions[following]
+
+    # The pixel right of the first unit edge of every edge, then pixels step straight along
+    # edges, stay at right turns, and step diagonally at left turns
+    pixels = vertices - np.column_stack(((directions[:, 1] > 0) | (directions[:, 0] < 0), directions.sum(axis=1) < 0))
+    left_turns = directions[:, 0] * next_directions[:, 1] < directions[:, 1] * next_directions[:, 0]
+    step_pixels = np.stack((pixels, pixels + (lengths - 1)[:, np.newaxis] * directions), axis=1).reshape(-1, 2)
+    step_directions = np.stack((directions, directions + next_directions), axis=1).reshape(-1, 2)
+    kept = np.column_stack((lengths > 1, left_turns)).ravel()
+    step_pixels = step_pixels[kept]
+    step_directions = step_directions[kept]
+    step_polygons = np.repeat(polygon_of, 2)[kept]
+    step_counts = np.bincount(step_polygons, minlength=n)
+    step_offsets = np.concatenate(([0], np.cumsum(step_counts)))
+
+    # Pixels where the direction changes, the first step then the others backwards
+    positions = np.arange(len(step_pixels))
+    steps = positions - step_offsets[step_polygons]
+    previous = np.where(steps == 0, step_offsets[step_polygons + 1] - 1, positions - 1)
+    turns = (step_directions != step_directions[previous]).any(axis=1)
+    keys = (step_counts[step_polygons] - steps) % step_counts[step_polygons]
+
+    # Outlines around a single pixel have no steps
+    single = np.flatnonzero(step_counts == 0)
+    polygons = np.concatenate((step_polygons[turns], single))
+    order = np.lexsort((np.concatenate((keys[turns], np.zeros(len(single), dtype=np.int64))), polygons))
+    vertices = np.concatenate((step_pixels[turns], pixels[offsets[single]]))[order]
+    return vertices, np.bincount(polygons, minlength=n)
+
+def find_tiled_contours(mask, tile_rows=TILE_ROWS):
+    """
+    Find the outlines of the foreground of a mask, reading it in strips
+
+    The mask is thresholded as find_contours does, with the Otsu threshold
+    of its grayscale values, from a histogram built in a first pass over the
+    strips. The contours are those extract_segmentations finds in the whole
+    mask, in the same order. Peak memory depends on the strip size and the
+    length of the outlines, not on the size of the mask.
+
+    Parameters
+    ----------
+    mask : Path
+        Path to the mask file
+    tile_rows : int, optional
+        Number of rows per strip, TILE_ROWS by default
+
+    Returns
+    -------
+    list
+        Flattened outline coordinates, one array per polygon
+
+    """
+    pixels, to_gray = open_mask(mask)
+    histogram = np.zeros(256, dtype=np.int64)
+    for _, strip in iter_mask_strips(pixels, to_gray, tile_rows):
+        histogram += get_histogram(strip)
+    threshold = otsu_threshold(histogram)
+
+    tracer = BoundaryTracer(pixels.shape[1])
+    for _, strip in iter_mask_strips(pixels, to_gray, tile_rows):
+        tracer.add_strip(strip > threshold)
+    return tracer.close()
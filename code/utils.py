@@ -1,5 +1,14 @@
 from typing import Union
 from pathlib import Path
+from shutil import rmtree
+from time import monotonic
+import os
+from manifest import get_manifest_path
+
+# Environment variable with the root path of the project
+ROOT_ENV_VAR = 'ANNOTATION_CONVERTER_ROOT'
+# Name of the project directory, only searched for when the search is enabled
+ROOT_DIR_NAME = 'annotation_converter'
 
 def get_user_input(prompt: str, valid_range: Union[tuple[float, float], list[str]]) -> Union[float, str]:
     """
@@ -60,44 +69,151 @@ def get_user_input(prompt: str, valid_range: Union[tuple[float, float], list[str
             else:
                 print(f"Invalid input. Please choose one of the following options: {', '.join(valid_range)}.")
 
-def get_root_path() -> Path:
+def get_root_path(root_path: Union[Path, str, None] = None, search: bool = False,
+                  max_depth: int = 3, timeout: float = 5.0) -> Path:
     """
     Find the root path of the project directory
 
+    The root is, in order, the given root_path, the ANNOTATION_CONVERTER_ROOT
+    environment variable, or the directory containing the code package. The
+    directory tree is never walked, unless search is True and the code package
+    is not in a project directory, in which case ROOT_DIR_NAME is searched for
+    up and down from the current directory within max_depth levels and timeout
+    seconds.
+
+    Parameters
+    ----------
+    root_path : Path or str, optional
+        Explicit root path of the project
+    search : bool, optional
+        Search the directory tree as a last resort, False by default
+    max_depth : int, optional
+        Number of directory levels searched up and down, 3 by default
+    timeout : float, optional
+        Seconds after which the search gives up, 5.0 by default
+
     Returns
     -------
     Path
         The path to the root directory of the project
 
     """
-    print("Searching for the root path...")
-    root_path = None
-    max_depth = 3  # Maximum depth to traverse up the directory tree
-    depth = 0
-    current_path = Path.cwd()  # Get the current working directory
-
-    # Traverse up to the root directory
-    while current_path != current_path.parent and depth < max_depth:
-        potential_root_path = current_path / 'annotation_converter'
-        print(f"\rChecking {potential_root_path} for 'annotation_converter' directory...", end="")
-        if potential_root_path.is_dir():
-            root_path = potential_root_path
-            print(f"\nFound 'annotation_converter' directory at {root_path}")
+    # An explicit setting or the environment variable must point to a directory
+    for source, path in [('root path', root_path), (ROOT_ENV_VAR, os.environ.get(ROOT_ENV_VAR))]:
+        if path:
+            path = Path(path).expanduser()
+            if not path.is_dir():
+                raise FileNotFoundError(f"The {source} {path} is not a directory.")
+            return path
+
+    # The project directory contains the code package
+    package_root = Path(__file__).resolve().parent.parent
+    if (package_root / 'datasets').is_dir() or not search:
+        return package_root
+
+    print(f"Searching for the '{ROOT_DIR_NAME}' directory...")
+    path = find_dir(Path.cwd(), ROOT_DIR_NAME, max_depth, timeout)
+    if path is None:
+        raise FileNotFoundError(f"{ROOT_DIR_NAME} directory not found within {max_depth} levels "
+                                f"of {Path.cwd()}, set {ROOT_ENV_VAR} to the project root.")
+    print(f"Found '{ROOT_DIR_NAME}' directory at {path}")
+    return path
+
+def find_dir(start_path: Path, name: str, max_depth: int, timeout: float) -> Union[Path, None]:
+    """
+    Find a directory by name up and then down from a start path, within a depth and time limit
+
+    The downward search is breadth first, so the closest match is found first,
+    and does not follow symbolic links.
+
+    Parameters
+    ----------
+    start_path : Path
+        The directory the search starts from
+    name : str
+        The name of the directory to find
+    max_depth : int
+        Number of directory levels searched up and down
+    timeout : float
+        Seconds after which the search gives up
+
+    Returns
+    -------
+    Path or None
+        The path to the directory, or None if it was not found in time
+
+    """
+    deadline = monotonic() + timeout
+
+    # Check the start path and its parents
+    current_path = start_path
+    for _ in range(max_depth + 1):
+        if (current_path / name).is_dir():
+            return current_path / name
+        if current_path == current_path.parent:
             break
-        current_path = current_path.parent  # Move up one directory level
-        depth += 1
-
-    # If not found, traverse down the directory tree
-    if root_path is None:
-        print("Traversing down the directory tree to find 'annotation_converter' directory...")
-        for path in Path.cwd().rglob('annotation_converter'):
-            if path.is_dir():
-                root_path = path
-                print(f"Found 'annotation_converter' directory at {root_path}")
-                break
-            
-    # Raise an error if the directory is not found
-    if root_path is None:
-        raise FileNotFoundError("annotation_converter directory not found in any parent directories.")
-    
-    return root_path
\ No newline at end of file
+        current_path = current_path.parent
+
+    # Check the subdirectories of the start path, one level at a time
+    level = [start_path]
+    for _ in range(max_depth):
+        next_level = []
+        for directory in level:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if monotonic() > deadline:
+                            print(f"Search for '{name}' timed out after {timeout} seconds.")
+                            return None
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name == name:
+                                return Path(entry.path)
+                            next_level.append(entry.path)
+            except OSError:
+                continue
+        level = next_level
+
+    return None
+
+def get_dst_name(src_dataset: str, task: str, mode: str, src_format: str, dst_format: str) -> str:
+    """
+    Name the output directory of a job from its dataset, task, mode, and formats
+
+    Returns
+    -------
+    str
+        The name of the output directory
+
+    """
+    return f'{src_dataset}_{task[0]}{mode[0]}{src_format[0]}{dst_format[2]}'
+
+def prepare_dst_path(dst_path: Path, incremental: bool, verbose: bool = True):
+    """
+    Create, update, or overwrite the destination directory
+
+    Parameters
+    ----------
+    dst_path : Path
+        The destination directory
+    incremental : bool
+        Keep the existing directory so only changed files are converted,
+        otherwise it is deleted along with its manifest
+    verbose : bool, optional
+        Print what is done with the directory, True by default
+
+    """
+    if not dst_path.exists():
+        dst_path.mkdir(parents=True)
+        if verbose:
+            print(f"Created new directory at {dst_path}")
+    elif incremental:
+        if verbose:
+            print(f"Directory {dst_path} already exists, only changed files will be converted.")
+    else:
+        if verbose:
+            print(f"Directory {dst_path} already exists, it will be overwritten.")
+        rmtree(dst_path)
+        get_manifest_path(dst_path).unlink(missing_ok=True)
+        dst_path.mkdir(parents=True)
+        if verbose:
+            print(f"Created new directory at {dst_path}")
@@ -0,0 +1,5 @@
+from pathlib import Path
+import sys
+
+# Modules of the converter are imported flat from the code directory, as main.py does
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'code'))
@@ -0,0 +1,52 @@
+import json
+
+from annotation_table import AnnotationTable, iter_annotation_batches
+from polygon_utils import simplify_table
+
+ANNOTATIONS = [
+    {'id': 1, 'image_id': 1, 'category_id': 2, 'bbox': [10, 20.5, 30, 40], 'area': 400, 'iscrowd': 0,
+     'segmentation': [[10, 20.5, 30, 40, 1, 2]]},
+    {'id': 2, 'image_id': 1, 'category_id': 2, 'area': 12.5, 'segmentation': [[1.5, 2, 3, 4, 5, 6]],
+     'iscrowd': 0, 'attributes': {'occluded': True}},
+    {'image_id': 2, 'id': 3, 'category_id': 1, 'bbox': [1, 2, 3, 4], 'area': 3, 'iscrowd': 0,
+     'segmentation': {'size': [2, 2], 'counts': [1, 2, 1]}},
+    {'id': 4, 'image_id': 2, 'category_id': 1, 'segmentation': [[0, 0, 4, 0, 4, 4]]},
+]
+
+def dumps(annotations):
+    # JSON text tells 10 from 10.0 and keeps the key order
+    return json.dumps(list(annotations))
+
+def test_round_trip_keeps_types_and_keys():
+    table = AnnotationTable.from_dicts(ANNOTATIONS)
+    assert dumps(table) == dumps(ANNOTATIONS)
+
+def test_slices_and_selections_keep_types_and_keys():
+    table = AnnotationTable.from_dicts(ANNOTATIONS)
+    assert dumps(AnnotationTable.concatenate([table[:1], table[1:3], table[3:]])) == dumps(ANNOTATIONS)
+    assert dumps(table.take([3, 0, 2])) == dumps([ANNOTATIONS[3], ANNOTATIONS[0], ANNOTATIONS[2]])
+
+def test_batches_of_integer_and_float_columns():
+    # A batch of integers joined to a batch of floats keeps its integers
+    batches = list(iter_annotation_batches(ANNOTATIONS, 1))
+    assert dumps(AnnotationTable.concatenate(batches)) == dumps(ANNOTATIONS)
+
+def test_simplification_without_changes_keeps_types_and_keys():
+    table = AnnotationTable.from_dicts(ANNOTATIONS)
+    assert dumps(simplify_table(table)) == dumps(ANNOTATIONS)
+
+def test_speckle_filtering_fits_boxes_to_the_polygons_left():
+    annotations = [
+        {'id': 1, 'image_id': 1, 'category_id': 1, 'bbox': [0, 0, 52, 52], 'area': 101, 'iscrowd': 0,
+         'segmentation': [[0, 0, 10, 0, 10, 10, 0, 10], [50, 50, 52, 50, 52, 52]]},
+        {'id': 2, 'image_id': 1, 'category_id': 1, 'bbox': [1.5, 0, 3, 3], 'area': 4.5, 'iscrowd': 0,
+         'segmentation': [[1.5, 0, 4.5, 0, 1.5, 3]]},
+        {'id': 3, 'image_id': 1, 'category_id': 1, 'bbox': [0, 0, 3, 3], 'area': 4.5, 'iscrowd': 0,
+         'segmentation': [[0, 0, 1, 0, 0, 1], [0, 0, 3, 0, 0, 3.5]]},
+    ]
+    simplified = list(simplify_table(AnnotationTable.from_dicts(annotations), min_area=4.0).iter_dicts())
+
+    assert [(ann['bbox'], ann['area']) for ann in simplified] == [
+        ([0, 0, 10, 10], 100), ([1.5, 0, 3, 3], 4.5), ([0, 0, 3, 3.5], 5.25)
+    ]
+    assert dumps(simplified[1:2]) == dumps(annotations[1:2])
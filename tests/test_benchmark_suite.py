@@ -0,0 +1,56 @@
+import json
+
+from benchmark_suite import compare_to_baseline, main
+
+# A tiny suite of the COCO paths, fast enough for every test run
+SUITE_ARGS = ['--formats', 'coco', '--images', '3', '--annotations', '2', '--vertices', '8',
+              '--categories', '2', '--repeat', '1']
+
+def make_result(**stages):
+    return {'seconds': sum(stages.values()), 'peak_rss_bytes': 0, 'stages': stages}
+
+def test_slower_paths_are_regressions():
+    baseline = {'coco->yolo detect': make_result(ingest=1.0, convert=0.5)}
+    results = {'coco->yolo detect': make_result(ingest=1.5, convert=0.55), 'coco->coco detect': make_result(ingest=9.0)}
+    assert compare_to_baseline(results, baseline) == [
+        ('coco->yolo detect', 'total', 1.5, 2.05), ('coco->yolo detect', 'ingest', 1.0, 1.5)
+    ]
+
+def test_small_slowdowns_are_noise():
+    # Far slower, but by less than MIN_REGRESSION_SECONDS
+    baseline = {'coco->yolo detect': make_result(convert=0.01)}
+    assert compare_to_baseline({'coco->yolo detect': make_result(convert=0.08)}, baseline) == []
+
+def test_slower_stages_of_a_steady_path_are_noise():
+    baseline = {'coco->yolo detect': make_result(ingest=1.0, write=0.2)}
+    assert compare_to_baseline({'coco->yolo detect': make_result(ingest=0.95, write=0.28)}, baseline) == []
+
+def test_missing_baseline_fails(tmp_path):
+    assert main(SUITE_ARGS + ['--baseline', str(tmp_path / 'baseline.json')]) == 1
+
+def test_suite_against_its_baseline(tmp_path):
+    baseline_path = tmp_path / 'baseline.json'
+    assert main(SUITE_ARGS + ['--baseline', str(baseline_path), '--save-baseline']) == 0
+    assert main(SUITE_ARGS + ['--baseline', str(baseline_path)]) == 0
+
+    # A baseline a second faster in every stage makes every path regress
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    for result in baseline['paths'].values():
+        result['seconds'] -= 1.0
+        result['stages'] = {stage: seconds - 1.0 for stage, seconds in result['stages'].items()}
+    with open(baseline_path, 'w') as f:
+        json.dump(baseline, f)
+    assert main(SUITE_ARGS + ['--baseline', str(baseline_path)]) == 1
+
+    # Unless it was recorded on another machine
+    baseline['machine'] = 'another-machine'
+    with open(baseline_path, 'w') as f:
+        json.dump(baseline, f)
+    assert main(SUITE_ARGS + ['--baseline', str(baseline_path)]) == 0
+
+def test_baseline_of_other_sizes_fails(tmp_path):
+    baseline_path = tmp_path / 'baseline.json'
+    assert main(SUITE_ARGS + ['--baseline', str(baseline_path), '--save-baseline']) == 0
+    # The last --images wins, as for any argparse option
+    assert main(SUITE_ARGS + ['--images', '4', '--baseline', str(baseline_path)]) == 1
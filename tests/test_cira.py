@@ -0,0 +1,53 @@
+from time import perf_counter
+
+from annotation_table import AnnotationTable
+from converter import convert_split_to_cira, convert_to_cira, group_cira_annotations
+
+def make_split(n_images, n_annotations):
+    # Every other pair of images shares a file name, as images of merged datasets can
+    images = [{'id': i, 'file_name': f'{i // 2 if i % 4 < 2 else i}.jpg'} for i in range(n_images)]
+    converted = [(i % n_images, {'id': i}) for i in range(n_annotations)]
+    return images, converted
+
+def group_by_scanning(images, converted):
+    # Reference grouping of the original to_cira, scanning every entry for every annotation
+    file_names = {image['id']: image['file_name'] for image in images}
+    cira_list = [{'filename': image['file_name'], 'obj_array': []} for image in images]
+    for image_id, cira_ann in converted:
+        for entry in cira_list:
+            if entry['filename'] == file_names[image_id]:
+                entry['obj_array'].append(cira_ann)
+    return cira_list
+
+def time_grouping(n_annotations, repeat=5):
+    images, converted = make_split(n_annotations // 10, n_annotations)
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        group_cira_annotations(images, converted)
+        best = min(best, perf_counter() - start)
+    return best
+
+def test_grouping_matches_scanning():
+    images, converted = make_split(40, 300)
+    assert group_cira_annotations(images, converted) == group_by_scanning(images, converted)
+
+def test_grouping_scales_linearly():
+    # Eight times the annotations and images, quadratic grouping would take 64 times longer
+    small, large = 4000, 32000
+    growth = (time_grouping(large) / large) / (time_grouping(small) / small)
+    assert growth < 3.0, f"CiRA grouping time per annotation grew {growth:.1f}x"
+
+def test_unpaired_coordinates_are_dropped_in_both_paths():
+    annotations = [
+        {'id': 1, 'image_id': 1, 'category_id': 1, 'bbox': [0, 0, 4, 4], 'area': 8, 'iscrowd': 0,
+         'segmentation': [[0, 0, 4, 0, 4, 4, 7]]},
+        {'id': 2, 'image_id': 1, 'category_id': 2, 'bbox': [1, 1, 2, 2], 'area': 2, 'iscrowd': 0,
+         'segmentation': [[1, 1, 3, 1, 3, 3]]},
+    ]
+    categories = [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}]
+    colors = [(255, 0, 0), (0, 255, 0)]
+
+    expected = [convert_to_cira(ann, categories, colors, 'segment') for ann in annotations]
+    assert [(ann['landmark'], ann['landmark_len']) for ann in expected] == [('0:0,4:0,4:4,', 3), ('1:1,3:1,3:3,', 3)]
+    assert convert_split_to_cira(AnnotationTable.from_dicts(annotations), categories, colors, 'segment') == expected
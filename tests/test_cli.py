@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from cli import build_options, load_jobs, run_jobs
+
+def write_config(tmp_path, jobs):
+    config_path = tmp_path / 'jobs.json'
+    config_path.write_text(json.dumps(jobs))
+    return config_path
+
+def test_invalid_config_values_are_rejected_before_writing(tmp_path):
+    (tmp_path / 'datasets' / 'shapes').mkdir(parents=True)
+    jobs = load_jobs(write_config(tmp_path, [
+        {'src_dataset': 'shapes', 'task': 'detect', 'src_format': 'coco', 'dst_format': 'voc'},
+        {'src_dataset': 'shapes', 'task': 'detect', 'src_format': 'coco', 'dst_format': 'yolo', 'workers': 'four'},
+        {'src_dataset': 'shapes', 'task': 'detect', 'src_format': 'coco', 'dst_format': 'yolo', 'incremental': 'yes'},
+    ]), {})
+
+    results = run_jobs(jobs, tmp_path)
+    assert [result['status'] for result in results] == ['invalid'] * 3
+    assert [result['exit_code'] for result in results] == [2] * 3
+    assert not (tmp_path / 'output').exists()
+
+def test_missing_source_is_rejected(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        build_options({'src_dataset': 'missing', 'task': 'detect', 'src_format': 'coco', 'dst_format': 'yolo'}, tmp_path)
+
+def test_config_values_are_checked_like_flags(tmp_path):
+    options = build_options({'src_path': str(tmp_path), 'dst_path': str(tmp_path / 'out'), 'mode': 'split',
+                             'task': 'detect', 'src_format': 'coco', 'test_train_ratio': 0}, tmp_path)
+    assert options['test_train_ratio'] == 0.0 and isinstance(options['test_train_ratio'], float)
+    with pytest.raises(ValueError, match='mask_type'):
+        build_options({'src_path': str(tmp_path), 'task': 'segment', 'src_format': 'bin', 'dst_format': 'coco',
+                       'mask_type': 'semantic'}, tmp_path)
+
+@pytest.mark.parametrize('setting', [{'workers': 0}, {'tile_rows': 0}, {'simplify_tolerance': -1.0}])
+def test_out_of_range_values_keep_the_destination(tmp_path, setting):
+    (tmp_path / 'datasets' / 'shapes').mkdir(parents=True)
+    dst_path = tmp_path / 'out'
+    dst_path.mkdir()
+    (dst_path / 'precious.txt').write_text('kept')
+    jobs = [{'src_dataset': 'shapes', 'dst_path': str(dst_path), 'task': 'segment', 'src_format': 'coco',
+             'dst_format': 'yolo', **setting}]
+
+    results = run_jobs(jobs, tmp_path)
+    assert [result['status'] for result in results] == ['invalid']
+    assert (dst_path / 'precious.txt').read_text() == 'kept'
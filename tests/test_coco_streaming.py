@@ -0,0 +1,56 @@
+from random import Random
+import tracemalloc
+import json
+
+from annotation_table import iter_annotation_batches
+from converter import convert_split_to_yolo
+from converter_utils import process_coco
+
+# Annotations converted at a time, small so the file is many batches
+BATCH_SIZE = 500
+
+def write_coco_file(json_path, n_annotations, n_images=200, n_vertices=32, seed=0):
+    # Written one annotation at a time, like the large files streaming is for
+    rng = Random(seed)
+    with open(json_path, 'w') as f:
+        f.write('{"categories": [{"id": 1, "name": "shape", "supercategory": "none"}], "images": [')
+        f.write(', '.join(json.dumps({'id': i, 'file_name': f'{i:08d}.jpg', 'width': 1920, 'height': 1080})
+                          for i in range(n_images)))
+        f.write('], "annotations": [')
+        for i in range(n_annotations):
+            f.write((', ' if i else '') + json.dumps({
+                'id': i + 1, 'image_id': i % n_images, 'category_id': 1, 'bbox': [10.0, 20.0, 300.5, 400.5],
+                'area': 120350.25, 'iscrowd': 0,
+                'segmentation': [[round(rng.uniform(0, 1080), 2) for _ in range(2 * n_vertices)]],
+            }))
+        f.write(']}')
+
+def convert_coco_file(json_path, stream):
+    # YOLO lines of every annotation, and the peak memory allocated while loading and converting them
+    tracemalloc.start()
+    try:
+        _, images, _, annotations = process_coco(None, '', json_path, False, stream)
+        image_dict = {image['id']: image for image in images}
+        lines = []
+        for batch in iter_annotation_batches(annotations, BATCH_SIZE):
+            lines += convert_split_to_yolo(batch, image_dict, 'detect')
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return lines, peak
+
+def test_streaming_converts_the_same_annotations(tmp_path):
+    json_path = tmp_path / '_annotations.coco.json'
+    write_coco_file(json_path, 1200)
+    loaded, _ = convert_coco_file(json_path, False)
+    streamed, _ = convert_coco_file(json_path, True)
+    assert len(loaded) == 1200
+    assert streamed == loaded
+
+def test_streaming_peak_memory_does_not_grow_with_the_file(tmp_path):
+    # The streamed peak is about one batch of annotations, however large the file is
+    json_path = tmp_path / '_annotations.coco.json'
+    write_coco_file(json_path, 10 * BATCH_SIZE)
+    _, loaded_peak = convert_coco_file(json_path, False)
+    _, streamed_peak = convert_coco_file(json_path, True)
+    assert streamed_peak < loaded_peak / 2, f"Streaming peaked at {streamed_peak} bytes, loading at {loaded_peak}"
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+import contour_cache
+from contour_cache import ContourCache, iter_cached_results
+
+def contours_of(mask):
+    return [np.arange(mask * 4, mask * 4 + 8, dtype=np.int32)]
+
+def test_entries_are_loaded_as_they_are_used(tmp_path):
+    cache = ContourCache(tmp_path / 'cache')
+    masks = [1, 2, 3]
+    keys = ['a', 'b', 'c']
+    for key, mask in zip(keys[:2], masks):
+        cache.put(key, contours_of(mask))
+
+    missing = cache.find_missing(keys)
+    assert missing == [False, False, True]
+    results = iter_cached_results(cache, keys, missing, masks, map(contours_of, [3]), contours_of)
+    assert np.array_equal(next(results)[0], contours_of(1)[0])
+    assert cache.stats.hits == 1
+
+    # An entry evicted by another job after the lookup is extracted again
+    (tmp_path / 'cache' / 'b.npy').unlink()
+    assert [result[0].tolist() for result in results] == [contours_of(2)[0].tolist(), contours_of(3)[0].tolist()]
+    assert (cache.stats.hits, cache.stats.misses) == (1, 2)
+    assert cache.find_missing(keys) == [False, False, False]
+
+def test_failed_writes_leave_no_temporary_file(tmp_path, monkeypatch):
+    cache = ContourCache(tmp_path / 'cache')
+    def fail(*args):
+        raise OSError("No space left on device")
+    monkeypatch.setattr(contour_cache.np, 'save', fail)
+
+    with pytest.raises(OSError):
+        cache.put('a', contours_of(1))
+    assert list((tmp_path / 'cache').iterdir()) == []
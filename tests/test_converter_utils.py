@@ -0,0 +1,52 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from converter_utils import find_masks, process_bin, process_yolo, read_yolo_yaml
+
+def write_masks(masks_path, categories, names, data=b''):
+    for category in categories:
+        (masks_path / category / 'train').mkdir(parents=True)
+        for name in names:
+            (masks_path / category / 'train' / name).write_bytes(data)
+
+def reverse_listings(monkeypatch):
+    # Lists directories backwards, as another file system could
+    iterdir = Path.iterdir
+    monkeypatch.setattr(Path, 'iterdir', lambda path: reversed(list(iterdir(path))))
+
+def test_mask_order_does_not_depend_on_listing(tmp_path, monkeypatch):
+    write_masks(tmp_path / 'masks', ['dog', 'cat', 'bird'], ['b.png', 'c.png', 'a.png'])
+    expected = find_masks(tmp_path / 'masks', 'train')
+    reverse_listings(monkeypatch)
+
+    assert find_masks(tmp_path / 'masks', 'train') == expected
+    categories, masks = expected
+    assert [category['name'] for category in categories] == ['bird', 'cat', 'dog']
+    assert [mask.name for _, mask in masks[:3]] == ['a.png', 'b.png', 'c.png']
+
+def test_image_ids_do_not_depend_on_listing(tmp_path, monkeypatch):
+    image = cv2.imencode('.png', np.zeros((8, 8), dtype=np.uint8))[1].tobytes()
+    (tmp_path / 'images' / 'train').mkdir(parents=True)
+    for name in ['b.png', 'c.png', 'a.png']:
+        (tmp_path / 'images' / 'train' / name).write_bytes(image)
+    write_masks(tmp_path / 'masks', ['cat'], ['b.png', 'c.png', 'a.png'], image)
+    reverse_listings(monkeypatch)
+
+    _, images, _, _ = process_bin(tmp_path / 'output', tmp_path / 'images', tmp_path / 'masks', tmp_path / 'images' / 'train', False)
+    assert [(image['id'], image['file_name']) for image in images] == [(0, 'a.png'), (1, 'b.png'), (2, 'c.png')]
+
+def test_sparse_yolo_names_keep_their_class_indices(tmp_path):
+    (tmp_path / 'images').mkdir()
+    (tmp_path / 'labels').mkdir()
+    cv2.imwrite(str(tmp_path / 'images' / 'a.png'), np.zeros((10, 20), dtype=np.uint8))
+    (tmp_path / 'labels' / 'a.txt').write_text('5 0.5 0.5 0.5 0.5\n2 0.5 0.5 0.2 0.2\n')
+    (tmp_path / 'data.yaml').write_text('names:\n  0: cat\n  2: bird\n  5: dog\n')
+
+    categories = read_yolo_yaml(tmp_path / 'data.yaml')
+    assert [(category['id'], category['name']) for category in categories] == [
+        (1, 'cat'), (2, 'class_1'), (3, 'bird'), (4, 'class_3'), (5, 'class_4'), (6, 'dog')
+    ]
+    _, _, _, annotations = process_yolo(tmp_path / 'output', tmp_path, categories, 'all', False)
+    assert [categories[category_id - 1]['name'] for category_id in annotations.category_ids.tolist()] == ['dog', 'bird']
@@ -0,0 +1,34 @@
+from pathlib import Path
+import subprocess
+import json
+import sys
+
+from benchmark import COCO_STARTUP_SCRIPT
+
+CODE_PATH = Path(__file__).resolve().parents[1] / 'code'
+# Largest allowed time to import the converter for a COCO-only conversion
+COCO_IMPORT_BUDGET = 0.5
+
+def run_coco_conversions(tmp_path):
+    src_path = tmp_path / 'dataset'
+    src_path.mkdir(exist_ok=True)
+    images = [{'id': i, 'file_name': f'{i}.jpg', 'width': 64, 'height': 48} for i in range(5)]
+    annotations = [{'id': i + 1, 'image_id': i % 5, 'category_id': 1, 'bbox': [1, 2, 10, 10], 'area': 100,
+                    'iscrowd': 0, 'segmentation': [[1, 2, 11, 2, 11, 12, 1, 12]]} for i in range(20)]
+    with open(src_path / '_annotations.coco.json', 'w') as f:
+        json.dump({'images': images, 'categories': [{'id': 1, 'name': 'shape'}], 'annotations': annotations}, f)
+
+    output = subprocess.run(
+        [sys.executable, '-c', COCO_STARTUP_SCRIPT, str(CODE_PATH), str(src_path), str(tmp_path / 'output')],
+        capture_output=True, text=True, check=True
+    ).stdout.split()
+    return float(output[0]), output[1].split(',') if len(output) > 1 else []
+
+def test_coco_conversions_do_not_import_opencv_or_yaml(tmp_path):
+    _, heavy_modules = run_coco_conversions(tmp_path)
+    assert heavy_modules == []
+
+def test_converter_import_is_within_budget(tmp_path):
+    # The fastest of a few fresh interpreters, so a busy machine does not fail the budget
+    best = min(run_coco_conversions(tmp_path)[0] for _ in range(3))
+    assert best < COCO_IMPORT_BUDGET, f"Importing the converter took {best:.3f}s, the budget is {COCO_IMPORT_BUDGET}s"
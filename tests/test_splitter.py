@@ -0,0 +1,63 @@
+import json
+
+from splitter import split
+
+def write_source(path, n_images, n_annotations, first_id=0):
+    path.mkdir(parents=True)
+    images = [{'id': first_id + i, 'file_name': f'{path.name}_{i}.jpg', 'width': 64, 'height': 48} for i in range(n_images)]
+    annotations = [{'id': i + 1, 'image_id': first_id + i % n_images, 'category_id': 1 + i % 3, 'bbox': [1, 2, 10, 10],
+                    'area': 100, 'iscrowd': 0, 'segmentation': [[1, 2, 11, 2, 11, 12]]} for i in range(n_annotations)]
+    categories = [{'id': i, 'name': f'class_{i}', 'supercategory': 'none'} for i in range(1, 4)]
+    with open(path / '_annotations.coco.json', 'w') as f:
+        json.dump({'images': images, 'categories': categories, 'annotations': annotations}, f)
+
+def run_split(tmp_path, name, **options):
+    dst_path = tmp_path / name
+    split({
+        'src_dataset': 'dataset', 'task': 'segment', 'mode': 'split', 'src_format': 'coco', 'dst_format': 'coco',
+        'src_path': tmp_path / 'dataset', 'dst_path': dst_path, 'root_path': tmp_path, 'transfer': 'skip',
+        'test_train_ratio': 0.3, 'val_ratio': 0.2, 'seed': 1, **options,
+    }, False)
+    splits = {}
+    for json_path in sorted(dst_path.glob('*/_annotations.coco.json')):
+        with open(json_path, 'r') as f:
+            splits[json_path.parent.name] = json.load(f)
+    return splits
+
+def test_annotations_follow_their_images(tmp_path):
+    write_source(tmp_path / 'dataset' / 'train', 30, 200)
+    write_source(tmp_path / 'dataset' / 'valid', 10, 50)
+    splits = run_split(tmp_path, 'split', stratify=True)
+
+    assert sorted(splits) == ['test', 'train', 'val']
+    image_ids = [image['id'] for data in splits.values() for image in data['images']]
+    ann_ids = [ann['id'] for data in splits.values() for ann in data['annotations']]
+    assert len(set(image_ids)) == len(image_ids) == 40
+    assert len(set(ann_ids)) == len(ann_ids) == 250
+    for data in splits.values():
+        split_image_ids = {image['id'] for image in data['images']}
+        assert all(ann['image_id'] in split_image_ids for ann in data['annotations'])
+
+def test_streamed_split_matches_loaded_split(tmp_path):
+    write_source(tmp_path / 'dataset' / 'train', 30, 200)
+    write_source(tmp_path / 'dataset' / 'valid', 10, 50)
+    assert run_split(tmp_path, 'streamed', stream=True) == run_split(tmp_path, 'loaded', stream=False)
+
+def test_yolo_labels_are_written_when_images_are_skipped(tmp_path):
+    src_path = tmp_path / 'dataset'
+    (src_path / 'images').mkdir(parents=True)
+    (src_path / 'labels').mkdir()
+    (src_path / 'dataset.yaml').write_text('names:\n  - cat\n')
+    for i in range(20):
+        (src_path / 'images' / f'{i}.jpg').write_bytes(b'')
+        (src_path / 'labels' / f'{i}.txt').write_text(f'0 0.5 0.5 0.{i % 9 + 1} 0.5\n')
+
+    split({
+        'src_dataset': 'dataset', 'task': 'detect', 'mode': 'split', 'src_format': 'yolo', 'dst_format': 'yolo',
+        'src_path': src_path, 'dst_path': tmp_path / 'split', 'root_path': tmp_path, 'transfer': 'skip',
+        'test_train_ratio': 0.3, 'val_ratio': 0.0, 'seed': 1,
+    }, False)
+    assert not list((tmp_path / 'split').glob('*/images/*'))
+    labels = sorted((tmp_path / 'split').glob('*/labels/*.txt'))
+    assert sorted(label.name for label in labels) == sorted(f'{i}.txt' for i in range(20))
+    assert all(label.read_text() == (src_path / 'labels' / label.name).read_text() for label in labels)
@@ -0,0 +1,68 @@
+import cv2
+import numpy as np
+import pytest
+
+from benchmark import make_tiled_mask
+from converter_utils import extract_segmentations
+from tile_utils import find_tiled_contours, iter_mask_strips, open_mask
+
+def read_strips(mask_path, tile_rows):
+    pixels, to_gray = open_mask(mask_path)
+    return np.concatenate([strip for _, strip in iter_mask_strips(pixels, to_gray, tile_rows)])
+
+@pytest.mark.parametrize('name, params', [
+    ('gray', []), ('gray16', []), ('bgr', []), ('bgra', []), ('bilevel', [cv2.IMWRITE_PNG_BILEVEL, 1]),
+])
+def test_png_strips_match_imread(tmp_path, name, params):
+    image = np.random.default_rng(0).integers(0, 256, (45, 37, 3), dtype=np.uint8)
+    image = {
+        'gray': image[..., 0],
+        'gray16': image[..., 0].astype(np.uint16) * 257 + image[..., 1],
+        'bgr': image,
+        'bgra': np.dstack((image, image[..., :1])),
+        'bilevel': (image[..., 0] > 127).astype(np.uint8) * 255,
+    }[name]
+    mask_path = tmp_path / f'{name}.png'
+    cv2.imwrite(str(mask_path), image, params)
+
+    expected = cv2.cvtColor(cv2.imread(str(mask_path)), cv2.COLOR_BGR2GRAY)
+    for tile_rows in [1, 7, 64]:
+        assert np.array_equal(read_strips(mask_path, tile_rows), expected)
+
+def test_png_contours_match_pgm(tmp_path):
+    pgm_path = tmp_path / 'mask.pgm'
+    n_contours = make_tiled_mask(pgm_path, 256)
+    png_path = tmp_path / 'mask.png'
+    cv2.imwrite(str(png_path), cv2.imread(str(pgm_path), cv2.IMREAD_UNCHANGED))
+
+    expected = find_tiled_contours(pgm_path, 50)
+    contours = find_tiled_contours(png_path, 50)
+    assert len(contours) == len(expected) == n_contours
+    assert all(np.array_equal(contour, other) for contour, other in zip(contours, expected))
+
+def test_tiled_contours_match_whole_masks(tmp_path):
+    # Nested rings, holes, diagonal pinches, lines, and single pixels
+    mask = np.zeros((60, 70), dtype=np.uint8)
+    for radius in [28, 20, 12, 4]:
+        cv2.circle(mask, (30, 30), radius, 255, 2)
+    mask[5:15, 55:65] = 255
+    mask[8:12, 58:62] = 0
+    mask[10, 60] = 255
+    mask[np.arange(20, 40), np.arange(45, 65)] = 255
+    mask[50, 40:69] = 255
+    mask[45:59, 5] = 255
+    mask[55, 60] = mask[56, 61] = mask[57, 60] = 255
+    mask_path = tmp_path / 'mask.png'
+    cv2.imwrite(str(mask_path), mask)
+
+    expected = extract_segmentations(mask_path)
+    for tile_rows in [1, 9, 64]:
+        contours = find_tiled_contours(mask_path, tile_rows)
+        assert len(contours) == len(expected)
+        assert all(np.array_equal(contour, other) for contour, other in zip(contours, expected))
+
+def test_undecodable_formats_are_rejected(tmp_path):
+    mask_path = tmp_path / 'mask.tiff'
+    cv2.imwrite(str(mask_path), np.zeros((8, 8), dtype=np.uint8))
+    with pytest.raises(ValueError, match='cannot be read in strips'):
+        open_mask(mask_path)